@@ -0,0 +1,734 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for galora.py
+
+Usage:
+    python benchmark.py --benchmark startup [--repeat 5] [--output startup.json]
+    python benchmark.py --benchmark silence [--duration 600] [--audio_file speech.wav] [--output silence.json]
+    python benchmark.py --benchmark transcription [--duration 600] [--latency 0.2] [--output transcription.json]
+    python benchmark.py --benchmark transfer --provider azure --container galora-benchmark [--files 200] [--file_size 256]
+    python benchmark.py --benchmark handlers [--docs 20] [--doc_size 64] [--formats .pdf .docx] [--corpus_dir corpus] [--output handlers.json] [--compare baseline.json]
+    python benchmark.py --benchmark cli [--docs 20] [--doc_size 64] [--formats .pdf .docx] [--workers 1 2]
+"""
+
+import argparse
+import csv
+import functools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Script run in a fresh interpreter: times the import of galora, then of the given modules
+IMPORT_PROBE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+import galora
+galora_time = time.perf_counter() - start
+modules = {}
+for name in sys.argv[1:]:
+    start = time.perf_counter()
+    try:
+        importlib.import_module(name)
+        modules[name] = time.perf_counter() - start
+    except Exception as e:
+        modules[name] = None
+print(json.dumps({"galora": galora_time, "modules": modules}))
+"""
+
+# 1. run_import_probe: Times imports in a fresh interpreter
+def run_import_probe(modules, work_dir):
+    """Times the import of galora and of the given modules in a fresh interpreter."""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    # galora creates its log/temp directories in the working directory
+    result = subprocess.run([sys.executable, '-c', IMPORT_PROBE] + list(modules),
+                            cwd=work_dir, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# 2. benchmark_startup: Measures the cold-start cost of galora and of each handler's imports
+def benchmark_startup(repeat=5):
+    """Measures the cold-start cost of galora and of each handler's imports."""
+    sys.path.insert(0, REPO_DIR)
+    with tempfile.TemporaryDirectory() as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            import galora
+        finally:
+            os.chdir(cwd)
+        galora_times = []
+        handlers = {}
+        for handler_name, modules in sorted(galora.HANDLER_MODULES.items()):
+            times = []
+            missing = []
+            for _ in range(repeat):
+                probe = run_import_probe(modules, work_dir)
+                galora_times.append(probe['galora'])
+                missing = [name for name, elapsed in probe['modules'].items() if elapsed is None]
+                times.append(sum(elapsed for elapsed in probe['modules'].values() if elapsed is not None))
+            handlers[handler_name] = {
+                'modules': modules,
+                'missing_modules': missing,
+                'import_seconds_median': statistics.median(times)
+            }
+    return {
+        'benchmark': 'startup',
+        'python': sys.version.split()[0],
+        'repeat': repeat,
+        'galora_import_seconds_median': statistics.median(galora_times),
+        'handlers': handlers
+    }
+
+# 3. print_startup_report: Prints the startup benchmark as a table
+def print_startup_report(results):
+    """Prints the startup benchmark as a table."""
+    print(f"import galora: {results['galora_import_seconds_median'] * 1000:.1f} ms (median of {results['repeat']})")
+    for handler_name, handler in results['handlers'].items():
+        missing = f" (missing: {', '.join(handler['missing_modules'])})" if handler['missing_modules'] else ""
+        print(f"  {handler_name:<20} +{handler['import_seconds_median'] * 1000:8.1f} ms  {', '.join(handler['modules']) or '-'}{missing}")
+
+# 4. write_results: Writes benchmark results to a JSON file
+def write_results(results, output_file):
+    """Writes benchmark results to a JSON file."""
+    with open(output_file, 'w', encoding='utf-8') as json_file:
+        json.dump(results, json_file, indent=4)
+
+# 5. make_speech_like_audio: Builds a deterministic audio track alternating noise bursts and pauses
+def make_speech_like_audio(duration, frame_rate=16000, seed=0):
+    """Builds a deterministic mono 16-bit track alternating noise bursts and pauses."""
+    import numpy as np
+    from pydub import AudioSegment
+    rng = np.random.default_rng(seed)
+    parts = []
+    total = 0
+    while total < duration * frame_rate:
+        speech = int(frame_rate * rng.uniform(0.5, 4.0))
+        pause = int(frame_rate * rng.uniform(0.2, 1.5))
+        parts.append(rng.normal(0, rng.uniform(2000, 8000), speech))
+        parts.append(rng.normal(0, 30, pause))
+        total += speech + pause
+    samples = np.clip(np.concatenate(parts)[:duration * frame_rate], -32768, 32767).astype(np.int16)
+    return AudioSegment(samples.tobytes(), frame_rate=frame_rate, sample_width=2, channels=1)
+
+# 6. benchmark_silence: Compares the NumPy silence detector with pydub split_on_silence
+def benchmark_silence(duration=600, audio_file=None, min_silence_len=500, silence_offset=14, keep_silence=500):
+    """Compares galora.detect_speech_ranges with pydub split_on_silence on the same audio."""
+    from pydub import AudioSegment
+    from pydub.silence import split_on_silence
+    sys.path.insert(0, REPO_DIR)
+    import galora
+    sound = AudioSegment.from_file(audio_file) if audio_file else make_speech_like_audio(duration)
+
+    start = time.perf_counter()
+    chunks = split_on_silence(sound, min_silence_len=min_silence_len, silence_thresh=sound.dBFS - silence_offset,
+                              keep_silence=keep_silence)
+    pydub_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ranges = galora.detect_speech_ranges(galora.audio_segment_to_samples(sound), sound.frame_rate, sound.channels,
+                                         min_silence_len, silence_offset=silence_offset, keep_silence=keep_silence)
+    numpy_seconds = time.perf_counter() - start
+
+    # pydub pads the last chunk with up to 2 ms of silence, so only the common part is compared
+    same_chunks = len(chunks) == len(ranges) and all(
+        chunk.raw_data.startswith(sound.get_sample_slice(begin, end).raw_data)
+        for chunk, (begin, end) in zip(chunks, ranges))
+    return {
+        'benchmark': 'silence',
+        'audio_seconds': len(sound) / 1000,
+        'audio_file': audio_file,
+        'chunks': len(ranges),
+        'same_chunks_as_pydub': same_chunks,
+        'pydub_seconds': pydub_seconds,
+        'numpy_seconds': numpy_seconds,
+        'speedup': pydub_seconds / numpy_seconds if numpy_seconds else None
+    }
+
+# 7. print_silence_report: Prints the silence benchmark
+def print_silence_report(results):
+    """Prints the silence benchmark."""
+    print(f"audio: {results['audio_seconds']:.0f} s, {results['chunks']} chunks, same chunks as pydub: {results['same_chunks_as_pydub']}")
+    print(f"  pydub split_on_silence: {results['pydub_seconds']:8.3f} s")
+    print(f"  detect_speech_ranges:   {results['numpy_seconds']:8.3f} s  (x{results['speedup']:.1f})")
+
+# 8. benchmark_transcription: Times generate_srt with the offline transcription backend
+def benchmark_transcription(duration=600, audio_file=None, latency=0.2, settings=((1, 1), (1, 4), (4, 1), (4, 4))):
+    """Times generate_srt with the fake transcription backend for each (workers, batch_size) setting."""
+    sys.path.insert(0, REPO_DIR)
+    import galora
+    runs = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_file = audio_file
+        if not source_file:
+            source_file = os.path.join(work_dir, 'speech.wav')
+            make_speech_like_audio(duration).export(source_file, format='wav')
+        for workers, batch_size in settings:
+            output_file = os.path.join(work_dir, f'speech_{workers}_{batch_size}.srt')
+            start = time.perf_counter()
+            galora.generate_srt(source_file, output_file, 'it-IT', workers, galora.FakeTranscriptionBackend(latency),
+                                batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            with open(output_file, encoding='utf-8') as srt_file:
+                cues = srt_file.read().count(' --> ')
+            runs.append({'workers': workers, 'batch_size': batch_size, 'cues': cues, 'seconds': elapsed})
+    return {
+        'benchmark': 'transcription',
+        'audio_file': audio_file,
+        'duration': None if audio_file else duration,
+        'latency': latency,
+        'runs': runs
+    }
+
+# 9. print_transcription_report: Prints the transcription benchmark
+def print_transcription_report(results):
+    """Prints the transcription benchmark."""
+    print(f"fake backend, {results['latency'] * 1000:.0f} ms per request")
+    for run in results['runs']:
+        print(f"  workers {run['workers']:>2}, batch {run['batch_size']:>2}: {run['seconds']:8.3f} s  ({run['cues']} cues)")
+
+# 10. make_file_tree: Writes a nested tree of random files
+def make_file_tree(directory, files, file_size):
+    """Writes files random files of file_size bytes, spread over nested directories."""
+    for index in range(files):
+        file_dir = os.path.join(directory, f"d{index % 10}", f"e{index % 3}")
+        os.makedirs(file_dir, exist_ok=True)
+        with open(os.path.join(file_dir, f"file_{index}.bin"), 'wb') as file:
+            file.write(os.urandom(file_size))
+
+# 11. benchmark_transfer: Times directory upload and download against S3, Aruba or Azure
+def benchmark_transfer(provider, container, files=200, file_size=256 * 1024, workers=(1, 16)):
+    """Times upload and download of a directory tree for each number of transfer workers.
+
+    Connection settings are read from config.json or from the provider environment
+    variables, so a local MinIO, moto server or Azurite can be used. The objects are left
+    under the galora-benchmark/ prefix.
+    """
+    sys.path.insert(0, REPO_DIR)
+    import galora
+    config = galora.load_config('cli_tool') if os.path.exists('config.json') else {}
+    galora.transfer_settings['workers'] = max(workers)
+    if provider == 'azure':
+        client = galora.get_azure_service_client(config)
+        galora.create_container_if_not_exists(container, client)
+        upload, download = galora.upload_directory_to_azure, galora.download_directory_from_azure
+    else:
+        client = galora.get_s3_client(config, provider)
+        upload = galora.upload_directory_to_s3 if provider == 's3' else galora.upload_directory_to_aruba
+        download = galora.download_directory_from_s3 if provider == 's3' else galora.download_directory_from_aruba
+    runs = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_dir = os.path.join(work_dir, 'source')
+        make_file_tree(source_dir, files, file_size)
+        for count in workers:
+            prefix = f"galora-benchmark/{count}/"
+            start = time.perf_counter()
+            _, upload_failed = upload(source_dir, container, client, prefix, count)
+            upload_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            _, download_failed = download(container, client, os.path.join(work_dir, f"download_{count}"), prefix, count)
+            download_seconds = time.perf_counter() - start
+            runs.append({'workers': count, 'upload_seconds': upload_seconds, 'download_seconds': download_seconds,
+                         'failed': upload_failed + download_failed})
+    return {
+        'benchmark': 'transfer',
+        'provider': provider,
+        'files': files,
+        'file_size': file_size,
+        'runs': runs
+    }
+
+# 12. print_transfer_report: Prints the transfer benchmark
+def print_transfer_report(results):
+    """Prints the transfer benchmark."""
+    size = results['files'] * results['file_size'] / 1024 ** 2
+    print(f"{results['provider']}: {results['files']} files, {size:.1f} MB")
+    for run in results['runs']:
+        print(f"  workers {run['workers']:>3}: upload {run['upload_seconds']:8.3f} s, "
+              f"download {run['download_seconds']:8.3f} s  ({run['failed']} failed)")
+
+# Words of the synthetic documents; the keywords open the sections found by process_text_with_keywords
+CORPUS_WORDS = (
+    "data model archive report contract invoice customer supplier payment delivery project budget review "
+    "analysis system network storage document record policy service request account product market energy "
+    "quality process control language training research value period meeting update summary table index"
+).split()
+CORPUS_KEYWORDS = ["Introduction", "Methods", "Results", "Discussion", "Conclusion"]
+
+# Script run in a fresh interpreter, one per target: times each document and reports the peak RSS of the process
+HANDLER_PROBE = """
+import json, os, sys, tempfile, time
+try:
+    import resource
+except ImportError:
+    resource = None
+import galora
+galora.lang.update(galora.load_translations('eng'))
+target, keywords, paths = json.load(sys.stdin)
+if target == 'process_text_with_keywords':
+    matcher = galora.compile_keywords(keywords)
+    def run(path):
+        with open(path, encoding='utf-8') as text_file:
+            return bool(galora.process_text_with_keywords(text_file.read(), matcher))
+elif target == 'generate_srt':
+    backend = galora.FakeTranscriptionBackend(0)
+    output_dir = tempfile.mkdtemp()
+    def run(path):
+        return galora.generate_srt(path, os.path.join(output_dir, 'output.srt'), 'it-IT', 1, backend)
+else:
+    def run(path):
+        content, original_path = galora.handle_file(path)
+        return original_path is not None
+def run_safely(path):
+    try:
+        return run(path)
+    except Exception:
+        return False
+# The first document also loads the libraries of the handler: it is not timed
+run_safely(paths[0])
+latencies = []
+errors = 0
+for path in paths:
+    start = time.perf_counter()
+    ok = run_safely(path)
+    latencies.append(time.perf_counter() - start)
+    errors += not ok
+peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if resource else None
+print(json.dumps({"latencies": latencies, "errors": errors, "peak_rss": peak_rss}))
+"""
+
+# 13. make_paragraphs: Builds the deterministic text of a synthetic document
+def make_paragraphs(rng, size):
+    """Builds about size bytes of paragraphs from CORPUS_WORDS, with a keyword section heading every few paragraphs."""
+    paragraphs = []
+    total = 0
+    while total < size:
+        if len(paragraphs) % 4 == 0:
+            paragraphs.append(CORPUS_KEYWORDS[len(paragraphs) // 4 % len(CORPUS_KEYWORDS)])
+        words = rng.choices(CORPUS_WORDS, k=rng.randint(40, 120))
+        paragraphs.append(' '.join(words).capitalize() + '.')
+        total += len(paragraphs[-1]) + 1
+    return paragraphs
+
+# 14. write_txt_document: Writes a synthetic text document
+def write_txt_document(path, paragraphs, rng):
+    """Writes a synthetic text document."""
+    with open(path, 'w', encoding='utf-8') as text_file:
+        text_file.write('\n'.join(paragraphs) + '\n')
+
+# 15. write_pdf_document: Writes a synthetic PDF document
+def write_pdf_document(path, paragraphs, rng):
+    """Writes a synthetic PDF document, a few paragraphs per page."""
+    import fitz
+    doc = fitz.open()
+    for start in range(0, len(paragraphs), 6):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), '\n'.join(paragraphs[start:start + 6]), fontsize=8)
+    doc.save(path)
+    doc.close()
+
+# 16. write_docx_document: Writes a synthetic Word document
+def write_docx_document(path, paragraphs, rng):
+    """Writes a synthetic Word document."""
+    from docx import Document
+    doc = Document()
+    for paragraph in paragraphs:
+        doc.add_paragraph(paragraph)
+    doc.save(path)
+
+# 17. write_pptx_document: Writes a synthetic PowerPoint document
+def write_pptx_document(path, paragraphs, rng):
+    """Writes a synthetic PowerPoint document, one slide per section."""
+    from pptx import Presentation
+    ppt = Presentation()
+    for start in range(0, len(paragraphs), 4):
+        slide = ppt.slides.add_slide(ppt.slide_layouts[1])
+        slide.shapes.title.text = paragraphs[start]
+        slide.placeholders[1].text = '\n'.join(paragraphs[start + 1:start + 4])
+    ppt.save(path)
+
+# 18. make_table: Builds the deterministic rows of a synthetic table
+def make_table(paragraphs, rng):
+    """Builds a header and rows of words and numbers, about as large as the paragraphs."""
+    rows = [["id", "name", "category", "amount", "notes"]]
+    size = sum(len(paragraph) for paragraph in paragraphs)
+    while size > 0:
+        row = [str(len(rows)), rng.choice(CORPUS_WORDS), rng.choice(CORPUS_KEYWORDS), f"{rng.uniform(0, 10000):.2f}",
+               ' '.join(rng.choices(CORPUS_WORDS, k=8))]
+        rows.append(row)
+        size -= sum(len(cell) for cell in row)
+    return rows
+
+# 19. write_xlsx_document: Writes a synthetic Excel document
+def write_xlsx_document(path, paragraphs, rng):
+    """Writes a synthetic Excel document (needs openpyxl or xlsxwriter)."""
+    import pandas as pd
+    rows = make_table(paragraphs, rng)
+    pd.DataFrame(rows[1:], columns=rows[0]).to_excel(path, index=False)
+
+# 20. write_csv_document: Writes a synthetic CSV document
+def write_csv_document(path, paragraphs, rng):
+    """Writes a synthetic CSV document."""
+    with open(path, 'w', encoding='utf-8', newline='') as csv_file:
+        csv.writer(csv_file).writerows(make_table(paragraphs, rng))
+
+# 21. write_epub_document: Writes a synthetic EPUB document
+def write_epub_document(path, paragraphs, rng):
+    """Writes a synthetic EPUB document, one chapter per section."""
+    from ebooklib import epub
+    book = epub.EpubBook()
+    book.set_identifier(os.path.basename(path))
+    book.set_title(os.path.basename(path))
+    book.set_language('en')
+    chapters = []
+    for start in range(0, len(paragraphs), 4):
+        chapter = epub.EpubHtml(title=paragraphs[start], file_name=f'chapter_{start // 4}.xhtml', lang='en')
+        chapter.content = f"<h1>{paragraphs[start]}</h1>" + ''.join(f"<p>{paragraph}</p>" for paragraph in paragraphs[start + 1:start + 4])
+        book.add_item(chapter)
+        chapters.append(chapter)
+    book.toc = chapters
+    book.spine = ['nav'] + chapters
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(path, book)
+
+# 22. write_xml_document: Writes a synthetic XML document
+def write_xml_document(path, paragraphs, rng):
+    """Writes a synthetic XML document, one element per section."""
+    root = ET.Element('document')
+    for start in range(0, len(paragraphs), 4):
+        section = ET.SubElement(root, 'section', title=paragraphs[start])
+        for paragraph in paragraphs[start + 1:start + 4]:
+            ET.SubElement(section, 'p').text = paragraph
+    ET.ElementTree(root).write(path, encoding='utf-8', xml_declaration=True)
+
+# 23. write_zip_document: Writes a synthetic ZIP archive of text, CSV and XML members
+def write_zip_document(path, paragraphs, rng):
+    """Writes a synthetic ZIP archive with a text, a CSV and an XML member sharing the paragraphs."""
+    with tempfile.TemporaryDirectory() as member_dir, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        third = len(paragraphs) // 3 + 1
+        for index, (extension, writer) in enumerate((('.txt', write_txt_document), ('.csv', write_csv_document),
+                                                     ('.xml', write_xml_document))):
+            member_path = os.path.join(member_dir, f'member{extension}')
+            writer(member_path, paragraphs[index * third:(index + 1) * third] or paragraphs, rng)
+            archive.write(member_path, f'member{extension}')
+
+# 24. write_wav_document: Writes a synthetic speech-like WAV file
+def write_wav_document(path, paragraphs, rng, duration=30):
+    """Writes duration seconds of speech-like audio (noise bursts and pauses)."""
+    make_speech_like_audio(duration, seed=rng.randrange(2 ** 32)).export(path, format='wav')
+
+CORPUS_WRITERS = {
+    '.txt': write_txt_document,
+    '.pdf': write_pdf_document,
+    '.docx': write_docx_document,
+    '.pptx': write_pptx_document,
+    '.xlsx': write_xlsx_document,
+    '.csv': write_csv_document,
+    '.epub': write_epub_document,
+    '.xml': write_xml_document,
+    '.zip': write_zip_document,
+    '.wav': write_wav_document
+}
+
+# 25. make_corpus: Builds a deterministic multi-format corpus
+def make_corpus(corpus_dir, docs=20, doc_size=64 * 1024, formats=None, seed=0, audio_seconds=30):
+    """Writes docs documents of about doc_size bytes of text for each format and returns (files, skipped).
+
+    The content depends only on the seed, the format and the document number. files maps each
+    format to its paths; skipped maps the formats whose writer library is missing to the error.
+    """
+    files = {}
+    skipped = {}
+    for extension in formats or CORPUS_WRITERS:
+        writer = CORPUS_WRITERS[extension]
+        if extension == '.wav':
+            writer = functools.partial(write_wav_document, duration=audio_seconds)
+        format_dir = os.path.join(corpus_dir, extension.lstrip('.'))
+        os.makedirs(format_dir, exist_ok=True)
+        paths = []
+        try:
+            for index in range(docs):
+                rng = random.Random(f'{seed}-{extension}-{index}')
+                path = os.path.join(format_dir, f'doc_{index:04d}{extension}')
+                if not os.path.exists(path):
+                    writer(path, make_paragraphs(rng, doc_size), rng)
+                paths.append(path)
+        except ImportError as e:
+            skipped[extension] = str(e)
+            continue
+        files[extension] = paths
+    return files, skipped
+
+# 26. percentile: Returns a percentile of a list of values
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of values (fraction between 0 and 1)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+# 27. run_handler_probe: Times one benchmark target on a list of files in a fresh interpreter
+def run_handler_probe(target, paths, work_dir):
+    """Runs HANDLER_PROBE for target on paths and returns its latencies, errors and peak RSS."""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    result = subprocess.run([sys.executable, '-c', HANDLER_PROBE], input=json.dumps([target, CORPUS_KEYWORDS, paths]),
+                            cwd=work_dir, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# 28. benchmark_handlers: Measures the throughput of each file handler on a synthetic corpus
+def benchmark_handlers(docs=20, doc_size=64 * 1024, formats=None, repeat=1, corpus_dir=None, seed=0, audio_seconds=30):
+    """Measures docs/s, MB/s, p50/p99 latency and peak RSS of each handler, of process_text_with_keywords and of generate_srt.
+
+    Each target runs in its own interpreter, so that the peak RSS is its own. The corpus is
+    written to corpus_dir (kept and reused across runs) or to a temporary directory.
+    """
+    sys.path.insert(0, REPO_DIR)
+    with tempfile.TemporaryDirectory() as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            import galora
+        finally:
+            os.chdir(cwd)
+        files, skipped = make_corpus(os.path.abspath(corpus_dir or os.path.join(work_dir, 'corpus')), docs, doc_size,
+                                     formats, seed, audio_seconds)
+        targets = [(galora.get_handler_name(paths[0]), extension, paths) for extension, paths in files.items()]
+        if '.txt' in files:
+            targets.append(('process_text_with_keywords', '.txt', files['.txt']))
+        if '.wav' in files:
+            targets.append(('generate_srt', '.wav', files['.wav']))
+        handlers = {}
+        for target, extension, paths in targets:
+            probe_target = target if target in ('process_text_with_keywords', 'generate_srt') else 'handle_file'
+            probe = run_handler_probe(probe_target, paths * repeat, work_dir)
+            latencies = probe['latencies']
+            seconds = sum(latencies)
+            size = sum(os.path.getsize(path) for path in paths) * repeat
+            handlers[target] = {
+                'format': extension,
+                'docs': len(latencies),
+                'bytes': size,
+                'errors': probe['errors'],
+                'seconds': seconds,
+                'docs_per_second': len(latencies) / seconds if seconds else None,
+                'mb_per_second': size / 1024 ** 2 / seconds if seconds else None,
+                'p50_ms': percentile(latencies, 0.5) * 1000,
+                'p99_ms': percentile(latencies, 0.99) * 1000,
+                'peak_rss_mb': probe['peak_rss'] / 1024 ** 2 if probe['peak_rss'] else None
+            }
+    return {
+        'benchmark': 'handlers',
+        'python': sys.version.split()[0],
+        'docs': docs,
+        'doc_size': doc_size,
+        'repeat': repeat,
+        'seed': seed,
+        'skipped_formats': skipped,
+        'handlers': handlers
+    }
+
+# 29. print_handlers_report: Prints the handler benchmark as a table
+def print_handlers_report(results):
+    """Prints the handler benchmark as a table."""
+    print(f"{results['docs']} documents of {results['doc_size'] // 1024} KB per format, seed {results['seed']}")
+    print(f"  {'target':<28}{'docs/s':>10}{'MB/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak RSS MB':>13}{'errors':>8}")
+    for target, handler in results['handlers'].items():
+        values = [handler['docs_per_second'], handler['mb_per_second'], handler['p50_ms'], handler['p99_ms']]
+        cells = ''.join(f"{value:10.2f}" if value is not None else f"{'-':>10}" for value in values)
+        rss = f"{handler['peak_rss_mb']:13.1f}" if handler['peak_rss_mb'] is not None else f"{'-':>13}"
+        print(f"  {target:<28}{cells}{rss}{handler['errors']:>8}")
+    for extension, error in results['skipped_formats'].items():
+        print(f"  {extension} skipped: {error}")
+
+# Metrics compared with the baseline: True if higher is better
+COMPARED_METRICS = {'docs_per_second': True, 'mb_per_second': True, 'p50_ms': False, 'p99_ms': False, 'peak_rss_mb': False}
+
+# 30. compare_results: Finds the regressions of a handler benchmark against a baseline
+def compare_results(results, baseline, threshold=10):
+    """Returns the metrics of results that are worse than in baseline by more than threshold percent."""
+    regressions = []
+    for target, handler in results['handlers'].items():
+        base = baseline.get('handlers', {}).get(target)
+        if not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            value, base_value = handler.get(metric), base.get(metric)
+            if not value or not base_value:
+                continue
+            change = (value - base_value) / base_value * 100
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append({'target': target, 'metric': metric, 'baseline': base_value, 'value': value,
+                                    'change_percent': change})
+    return regressions
+
+# 31. print_comparison_report: Prints the regressions found against a baseline
+def print_comparison_report(regressions, baseline_file, threshold):
+    """Prints the regressions found against a baseline."""
+    if not regressions:
+        print(f"no regressions over {threshold}% against {baseline_file}")
+        return
+    print(f"{len(regressions)} regressions over {threshold}% against {baseline_file}:")
+    for regression in regressions:
+        print(f"  {regression['target']:<28}{regression['metric']:<18}{regression['baseline']:10.2f} -> "
+              f"{regression['value']:10.2f}  ({regression['change_percent']:+.1f}%)")
+
+# 32. read_record_paths: Reads the source paths of the JSONL records written by handle_directory
+def read_record_paths(output_dir):
+    """Returns the path field of every record of the JSONL shards in output_dir."""
+    paths = []
+    for name in sorted(os.listdir(output_dir)):
+        if name.endswith('.jsonl'):
+            with open(os.path.join(output_dir, name), encoding='utf-8') as shard_file:
+                paths.extend(json.loads(line)['path'] for line in shard_file if line.strip())
+    return paths
+
+# Script run in a fresh interpreter: runs the galora command line with worker processes started by the given method
+CLI_DRIVER = """
+import multiprocessing, sys
+import galora
+multiprocessing.set_start_method(sys.argv[1])
+sys.argv = ['galora.py'] + sys.argv[2:]
+galora.main()
+"""
+
+# 33. benchmark_cli: Times handle_directory through the command line on a corpus with corrupt files
+def benchmark_cli(docs=20, doc_size=64 * 1024, formats=None, workers=(1, 16), corpus_dir=None, seed=0):
+    """Runs galora.py --operation handle_directory on a synthetic corpus plus a corrupt PDF and MP3, once per number of workers.
+
+    With more than one worker the run is repeated with spawned workers, which get the translations and
+    settings of the run only through init_worker, as on Windows and macOS. A run passes when the command exits with status 0 and writes a record for every document but the
+    corrupt ones, which must be reported and skipped. WAV files are left out: the CLI transcribes them online.
+    """
+    formats = [extension for extension in formats or CORPUS_WRITERS if extension != '.wav']
+    with tempfile.TemporaryDirectory() as work_dir:
+        corpus = os.path.abspath(corpus_dir or os.path.join(work_dir, 'corpus'))
+        files, skipped = make_corpus(corpus, docs, doc_size, formats, seed)
+        os.makedirs(os.path.join(corpus, 'corrupt'), exist_ok=True)
+        corrupt_paths = [os.path.join(corpus, 'corrupt', 'corrupt.pdf'), os.path.join(corpus, 'corrupt', 'corrupt.mp3')]
+        for path, header in zip(corrupt_paths, (b'%PDF-1.4\n', b'ID3')):
+            with open(path, 'wb') as corrupt_file:
+                corrupt_file.write(header + random.Random(f'{seed}-{path}').randbytes(4096))
+        expected = [path for paths in files.values() for path in paths]
+        env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        runs = []
+        for count, start_method in [(count, method) for count in workers for method in ['default'] + ['spawn'] * (count > 1)]:
+            output_dir = os.path.join(work_dir, f'output_{count}_{start_method}')
+            os.makedirs(output_dir)
+            arguments = ['--operation', 'handle_directory', '--directory_path', corpus, '--output_dir', output_dir,
+                         '--output_format', 'jsonl', '--workers', str(count), '--no_console']
+            if start_method == 'default':
+                command = [sys.executable, os.path.join(REPO_DIR, 'galora.py')] + arguments
+            else:
+                command = [sys.executable, '-c', CLI_DRIVER, start_method] + arguments
+            start = time.perf_counter()
+            result = subprocess.run(command, cwd=work_dir, env=env, capture_output=True, text=True)
+            seconds = time.perf_counter() - start
+            written = set(read_record_paths(output_dir))
+            corrupt_written = None in written or any(path in written for path in corrupt_paths)
+            sources = {path.split('.zip/')[0] + '.zip' if '.zip/' in path else path for path in written if path}
+            missing = [path for path in expected if path not in sources]
+            runs.append({
+                'workers': count,
+                'start_method': start_method,
+                'exit_status': result.returncode,
+                'seconds': seconds,
+                'docs_per_second': len(expected) / seconds if seconds else None,
+                'records': len(written),
+                'missing': missing,
+                'corrupt_written': corrupt_written,
+                'passed': result.returncode == 0 and not missing and not corrupt_written,
+                'stderr': result.stderr.strip().splitlines()[-5:] if result.returncode else []
+            })
+    return {
+        'benchmark': 'cli',
+        'python': sys.version.split()[0],
+        'docs': len(expected),
+        'doc_size': doc_size,
+        'seed': seed,
+        'skipped_formats': skipped,
+        'runs': runs
+    }
+
+# 34. print_cli_report: Prints the command line benchmark
+def print_cli_report(results):
+    """Prints the command line benchmark and the failures of each run."""
+    print(f"handle_directory: {results['docs']} documents and a corrupt PDF and MP3, seed {results['seed']}")
+    for run in results['runs']:
+        status = 'ok' if run['passed'] else 'FAILED'
+        print(f"  workers {run['workers']:>3} ({run['start_method']:<7}): {run['seconds']:8.3f} s, {run['docs_per_second']:8.2f} docs/s, "
+              f"{run['records']} records, exit status {run['exit_status']}  {status}")
+        for path in run['missing'][:5]:
+            print(f"    missing record: {path}")
+        if run['corrupt_written']:
+            print("    a corrupt file was written as a record")
+        for line in run['stderr']:
+            print(f"    {line}")
+    for extension, error in results['skipped_formats'].items():
+        print(f"  {extension} skipped: {error}")
+
+# 35. main: Parses arguments and runs the requested benchmark
+def main():
+    parser = argparse.ArgumentParser(description="Galora benchmarks")
+    parser.add_argument("--benchmark", type=str, required=True, choices=["startup", "silence", "transcription", "transfer", "handlers", "cli"], help="Benchmark to run")
+    parser.add_argument("--repeat", type=int, help="Number of repetitions (default: 5 for startup, 1 for handlers)")
+    parser.add_argument("--output", type=str, help="JSON file for the results")
+    parser.add_argument("--duration", type=int, default=600, help="Length in seconds of the synthetic audio for the silence and transcription benchmarks")
+    parser.add_argument("--audio_file", type=str, help="Audio file to use instead of synthetic audio for the silence and transcription benchmarks")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated request latency in seconds for the transcription benchmark")
+    parser.add_argument("--provider", type=str, default="s3", choices=["s3", "aruba", "azure"], help="Storage provider for the transfer benchmark")
+    parser.add_argument("--container", type=str, help="Bucket or container for the transfer benchmark")
+    parser.add_argument("--files", type=int, default=200, help="Number of files for the transfer benchmark")
+    parser.add_argument("--file_size", type=int, default=256, help="File size in KB for the transfer benchmark")
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 16], help="Numbers of transfer workers (or of handle_directory workers for the cli benchmark) to compare")
+    parser.add_argument("--docs", type=int, default=20, help="Number of documents per format for the handlers benchmark")
+    parser.add_argument("--doc_size", type=int, default=64, help="Text size in KB of each document for the handlers benchmark")
+    parser.add_argument("--formats", type=str, nargs='+', choices=sorted(CORPUS_WRITERS), help="Formats of the handlers benchmark (default: all)")
+    parser.add_argument("--corpus_dir", type=str, help="Directory where the corpus of the handlers benchmark is generated and kept")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus")
+    parser.add_argument("--audio_seconds", type=int, default=30, help="Length in seconds of each WAV file of the corpus")
+    parser.add_argument("--compare", type=str, help="Baseline JSON of a previous handlers benchmark: regressions are reported and make the exit status 1")
+    parser.add_argument("--threshold", type=float, default=10, help="Change in percent over which a metric is a regression")
+    args = parser.parse_args()
+    if args.compare and args.benchmark != "handlers":
+        parser.error('--compare is only available for the handlers benchmark')
+
+    if args.benchmark == "startup":
+        results = benchmark_startup(args.repeat or 5)
+        print_startup_report(results)
+    elif args.benchmark == "silence":
+        results = benchmark_silence(args.duration, args.audio_file)
+        print_silence_report(results)
+    elif args.benchmark == "transcription":
+        results = benchmark_transcription(args.duration, args.audio_file, args.latency)
+        print_transcription_report(results)
+    elif args.benchmark == "transfer":
+        if not args.container:
+            parser.error('--container is required for the transfer benchmark')
+        results = benchmark_transfer(args.provider, args.container, args.files, args.file_size * 1024, args.workers)
+        print_transfer_report(results)
+    elif args.benchmark == "handlers":
+        results = benchmark_handlers(args.docs, args.doc_size * 1024, args.formats, args.repeat or 1, args.corpus_dir,
+                                     args.seed, args.audio_seconds)
+        print_handlers_report(results)
+    elif args.benchmark == "cli":
+        results = benchmark_cli(args.docs, args.doc_size * 1024, args.formats, args.workers, args.corpus_dir, args.seed)
+        print_cli_report(results)
+    if args.output:
+        write_results(results, args.output)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            regressions = compare_results(results, json.load(baseline_file), args.threshold)
+        print_comparison_report(regressions, args.compare, args.threshold)
+        if regressions:
+            sys.exit(1)
+    if args.benchmark == "cli" and not all(run['passed'] for run in results['runs']):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
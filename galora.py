@@ -15,59 +15,188 @@ Author: piret
 
 import json
 import os
+import sys
 import logging
+import logging.handlers
 import argparse
 from datetime import datetime
-import fitz  # PyMuPDF
-from pptx import Presentation
-from moviepy.editor import VideoFileClip
-import speech_recognition as sr
-from pydub import AudioSegment
-import pandas as pd
 import csv
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
-from pydub.silence import split_on_silence
-from pytube import YouTube
-from docx import Document
 import zipfile
 import re
 from difflib import SequenceMatcher
-import requests
 import shutil
-import vlc
 import xml.etree.ElementTree as ET
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
 import subprocess
+import hashlib
+import sqlite3
+import functools
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import threading
+import itertools
+import time
+import io
+import queue
+import tempfile
+import contextlib
+import inspect
+import asyncio
+import atexit
 
 # Global variable for language
 lang = {}
 
+# Cloud clients, created on first use and reused for the rest of the process
+cloud_clients = {}
+
+# Speech recognizers, one per thread
+recognizers = threading.local()
+
+# Transcription options set from the command line, used by the audio and video handlers
+transcription_settings = {}
+
+# Cloud transfer options set from the command line
+transfer_settings = {}
+
+# Google Drive HTTP connections, one per thread (httplib2 is not thread-safe)
+gdrive_connections = threading.local()
+
+# Storage backends by (scheme, container), created on first use and reused for the rest of the process
+storage_backends = {}
+
+# Logging options set by configure_logger: queue listener, handlers and level
+log_settings = {}
+
+# Forked worker processes must not reuse the connections of the parent: they reconnect on first use
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=lambda: (cloud_clients.clear(), storage_backends.clear()))
+    # The listener thread of the log queue does not exist in forked workers: they write to the handlers directly
+    os.register_at_fork(after_in_child=lambda: use_direct_logging())
+
 # Configure logging
 log_dir = "log"
 temp_dir = "temp"
+jobs_dir = "jobs"
+
+# Extraction cache settings
+DEFAULT_CACHE_MAX_SIZE = 10 * 1024 ** 3  # 10 GB
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# JSONL dataset output settings
+DEFAULT_SHARD_SIZE = 256 * 1024 ** 2  # 256 MB
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Streaming keyword segmentation settings (in characters)
+DEFAULT_STREAM_CHUNK_SIZE = 1024 * 1024
+KEYWORD_WINDOW = 4096
+MAX_SECTION_CONTENT_SIZE = 64 * 1024 ** 2
+
+# Transcript cache settings
+DEFAULT_TRANSCRIPT_CACHE_MAX_SIZE = 1024 ** 3  # 1 GB
+
+# Transcription defaults, overridden by --transcription_lang and --transcription_backend
+DEFAULT_TRANSCRIPTION_LANGUAGE = 'it-IT'
+DEFAULT_TRANSCRIPTION_BACKEND = 'google'
+
+# Cloud transfer settings: objects transferred at once, and multipart chunk size and parts in flight per object
+DEFAULT_TRANSFER_WORKERS = 16
+DEFAULT_MULTIPART_CHUNK_SIZE = 8 * 1024 ** 2  # 8 MB
+DEFAULT_MULTIPART_CONCURRENCY = 4
+
+# Google Drive listing: files per page and calls per batch request (the API accepts at most 100)
+GDRIVE_PAGE_SIZE = 1000
+GDRIVE_BATCH_SIZE = 100
+GDRIVE_FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+TRANSFER_RETRIES = 3
+
+# Seconds between two progress messages of a transfer
+PROGRESS_LOG_INTERVAL = 5
+
+# Streaming transfers between storage backends: read/write block size and blocks buffered per upload
+STREAM_BUFFER_SIZE = 1024 * 1024
+STREAM_QUEUE_SIZE = 8
+
+# Bytes of remote documents (or archive members) held in memory at once by handle_remote_prefix and handle_zip_file
+DEFAULT_MAX_IN_FLIGHT = 256 * 1024 ** 2  # 256 MB
+
+# Asyncio pipeline: documents waiting between two stages, and shards uploaded at once
+DEFAULT_PIPELINE_QUEUE_SIZE = 64
+DEFAULT_PIPELINE_UPLOAD_WORKERS = 4
+
+# ZIP archives: members processed at once, and limits against zip bombs (uncompressed sizes)
+DEFAULT_ZIP_WORKERS = 4
+ZIP_MAX_MEMBER_SIZE = 1024 ** 3  # 1 GB
+ZIP_MAX_TOTAL_SIZE = 10 * 1024 ** 3  # 10 GB
+ZIP_MAX_RATIO = 100
+ZIP_RATIO_MIN_SIZE = 1024 ** 2  # 1 MB
+ZIP_MAX_DEPTH = 3
+
+# Samples processed at once by the silence detector
+SILENCE_BLOCK_SIZE = 10 * 1024 * 1024
+
+# Audio decoded by ffmpeg for transcription: 16 kHz mono 16-bit PCM, read in 1 MB blocks
+AUDIO_FRAME_RATE = 16000
+AUDIO_SAMPLE_WIDTH = 2
+PCM_BLOCK_SIZE = 1024 * 1024
+
+# Number of manifest records written between two commits
+MANIFEST_COMMIT_INTERVAL = 500
+# Maximum seconds between two commits of a job journal
+JOURNAL_FLUSH_INTERVAL = 10
+# Minimum seconds between two messages of the same progress key (0 logs them all)
+DEFAULT_LOG_SAMPLE_INTERVAL = 1.0
+# Per-file and per-chunk progress messages, rate limited by LogSampler
+SAMPLED_LOG_KEYS = {'text_file_processed', 'pdf_file_processed', 'word_file_processed', 'ppt_file_processed',
+                    'excel_file_processed', 'csv_file_processed', 'epub_file_processed', 'xml_file_processed',
+                    'audio_file_processed', 'video_file_processed', 'zip_file_processed', 'output_written',
+                    'info_generated_srt_segment', 'success_download_gdrive', 'success_download_azure',
+                    'success_upload_azure', 'success_copy_storage', 'success_delete_storage'}
+LOG_LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warning': logging.WARNING, 'error': logging.ERROR}
+# Keywords: leading inline global flags, and references to groups (backreferences, conditionals) among escapes
+KEYWORD_GLOBAL_FLAGS = re.compile(r'\(\?([aiLmsux]+)\)')
+KEYWORD_TOKENS = re.compile(r'(\\[1-9]|\(\?P=|\(\?\()|\\.', re.DOTALL)
+# Memory page size, used to read the RSS from /proc/self/statm
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+# Operations run as batch jobs, resumable with --resume JOB_ID
+JOURNALED_OPERATIONS = {'handle_directory', 'generate_srt', 'copy', 'sync', 'download_all_gdrive',
+                        'download_s3_directory', 'upload_s3_directory', 'download_azure_directory',
+                        'download_aruba_directory', 'upload_aruba_directory'}
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 if not os.path.exists(temp_dir):
     os.makedirs(temp_dir)
 
 # 1. configure_logger: Configures the logger for the specified module
-def configure_logger(module_name):
-    """Configures the logger for the specified module."""
+def configure_logger(module_name, log_level='debug', log_format='json', console=True,
+                     sample_interval=DEFAULT_LOG_SAMPLE_INTERVAL):
+    """Configures the logger for the specified module.
+
+    Records go through a queue to a listener thread, which writes them to the log file (as JSON
+    lines, or as text) and, unless console is False, echoes them on the console.
+    """
     timestamp = datetime.now().strftime("%Y%m%d")
     log_dir = "log"
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
     log_file = os.path.join(log_dir, f'{module_name}_{timestamp}.log')
     try:
+        handlers = get_log_handlers(log_file, log_format, console)
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *handlers)
+        # The queue handler only renders the message: the listener handlers format the record
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.setFormatter(logging.Formatter('%(message)s'))
         logging.basicConfig(
-            filename=log_file,
-            level=logging.DEBUG,
-            format='%(asctime)s - %(levelname)s - %(message)s'
+            handlers=[queue_handler],
+            level=LOG_LEVELS.get(log_level, logging.DEBUG)
         )
+        listener.start()
+        log_settings.update(listener=listener, handlers=handlers,
+                            options={'log_file': log_file, 'log_level': log_level, 'log_format': log_format,
+                                     'console': console, 'sample_interval': sample_interval})
+        log_sampler.interval = sample_interval
+        atexit.register(stop_logging)
         logging.info("Logger has been configured successfully.")
         print(f"Logger configured: {log_file}")
     except Exception as e:
@@ -76,12 +205,29 @@ def configure_logger(module_name):
 
 # 2. log_message: Logs messages using translation keys
 def log_message(key, level="info", *args):
-    """Logs messages using translation keys."""
+    """Logs messages using translation keys.
+
+    Once configure_logger has run, messages below the log level are dropped before being
+    translated and progress messages are rate limited by log_sampler.
+    """
+    configured = 'handlers' in log_settings
+    if configured:
+        levelno = LOG_LEVELS.get(level, logging.INFO)
+        if not logging.root.isEnabledFor(levelno):
+            return
+        suppressed = log_sampler.allow(key)
+        if suppressed is None:
+            return
+
     try:
         message = lang.get(key, key).format(*args)
     except KeyError:
         message = f"Logging key error: {key} with args {args}"
 
+    if configured:
+        logging.log(levelno, message, extra={'key': key, 'params': args, 'suppressed': suppressed})
+        return
+
     if level == "info":
         logging.info(message)
     elif level == "warning":
@@ -113,7 +259,7 @@ def load_config(module_name, config_path='config.json'):
 def load_translations(language_code):
     """Loads the translation file based on the language code."""
     try:
-        with open(f'language/cli_{language_code}.json', 'r', encoding='utf-8') as lang_file:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'language', f'cli_{language_code}.json'), 'r', encoding='utf-8') as lang_file:
             return json.load(lang_file)
     except FileNotFoundError:
         log_message('language_file_not_found', 'error', language_code)
@@ -134,82 +280,99 @@ def remove_headers_footers(text):
     return text
 
 # 6. handle_text_file: Processes text files
-def handle_text_file(file_path):
+def handle_text_file(file_path, data=None):
     """Processes text files."""
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        with open_file_data(file_path, data) as raw:
+            file = io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
             text = file.read()
+            file.detach()
         log_message('text_file_processed', 'info', file_path)
         return remove_headers_footers(text), file_path
     except Exception as e:
         log_message('error_process_text_file', 'error', file_path, str(e))
-        return lang.get('error_process_text_file').format(str(e)), None
+        return lang.get('error_process_text_file', 'error_process_text_file').format(str(e)), None
 
 # 7. handle_pdf_file: Processes PDF files
-def handle_pdf_file(file_path):
+def handle_pdf_file(file_path, data=None):
     """Processes PDF files."""
     try:
-        doc = fitz.open(file_path)
+        import fitz  # PyMuPDF
+        if data is None:
+            doc = fitz.open(file_path)
+        else:
+            with open_file_data(file_path, data) as file:
+                doc = fitz.open(stream=file.read(), filetype='pdf')
         text = [page.get_text("text") for page in doc]
         doc.close()
         log_message('pdf_file_processed', 'info', file_path)
         return remove_headers_footers('\n'.join(text)), file_path
     except Exception as e:
         log_message('error_process_pdf_file', 'error', file_path, str(e))
-        return lang.get('error_process_pdf_file').format(file_path, str(e)), None
+        return lang.get('error_process_pdf_file', 'error_process_pdf_file').format(file_path, str(e)), None
 
 # 8. handle_word_file: Processes Word files
-def handle_word_file(file_path):
+def handle_word_file(file_path, data=None):
     """Processes Word files."""
     try:
-        doc = Document(file_path)
+        from docx import Document
+        with open_file_data(file_path, data) as file:
+            doc = Document(file)
         text = '\n'.join([para.text for para in doc.paragraphs])
         log_message('word_file_processed', 'info', file_path)
         return remove_headers_footers(text), file_path
     except Exception as e:
         log_message('error_process_word_file', 'error', file_path, str(e))
-        return lang.get('error_process_word_file').format(file_path, str(e)), None
+        return lang.get('error_process_word_file', 'error_process_word_file').format(file_path, str(e)), None
 
 # 9. handle_ppt_file: Processes PowerPoint files
-def handle_ppt_file(file_path):
+def handle_ppt_file(file_path, data=None):
     """Processes PowerPoint files."""
     try:
-        ppt = Presentation(file_path)
+        from pptx import Presentation
+        with open_file_data(file_path, data) as file:
+            ppt = Presentation(file)
         text = [shape.text for slide in ppt.slides for shape in slide.shapes if hasattr(shape, "text")]
         log_message('ppt_file_processed', 'info', file_path)
         return remove_headers_footers('\n'.join(text)), file_path
     except Exception as e:
         log_message('error_process_ppt_file', 'error', file_path, str(e))
-        return lang.get('error_process_ppt_file').format(file_path, str(e)), None
+        return lang.get('error_process_ppt_file', 'error_process_ppt_file').format(file_path, str(e)), None
 
 # 10. handle_excel_file: Processes Excel files
-def handle_excel_file(file_path):
+def handle_excel_file(file_path, data=None):
     """Processes Excel files."""
     try:
-        df = pd.read_excel(file_path)
+        import pandas as pd
+        with open_file_data(file_path, data) as file:
+            df = pd.read_excel(file)
         log_message('excel_file_processed', 'info', file_path)
         return df.to_csv(index=False), file_path
     except Exception as e:
         log_message('error_process_excel_file', 'error', file_path, str(e))
-        return lang.get('error_process_excel_file').format(file_path, str(e)), None
+        return lang.get('error_process_excel_file', 'error_process_excel_file').format(file_path, str(e)), None
 
 # 11. handle_csv_file: Processes CSV files
-def handle_csv_file(file_path):
+def handle_csv_file(file_path, data=None):
     """Processes CSV files."""
     try:
-        with open(file_path, mode='r', encoding='utf-8', newline='') as f:
-            reader = csv.reader(f)
-            data = list(reader)
+        with open_file_data(file_path, data) as raw:
+            f = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            rows = list(csv.reader(f))
+            f.detach()
         log_message('csv_file_processed', 'info', file_path)
-        return '\n'.join([','.join(row) for row in data]), file_path
+        return '\n'.join([','.join(row) for row in rows]), file_path
     except Exception as e:
         log_message('error_process_csv_file', 'error', file_path, str(e))
-        return lang.get('error_process_csv_file').format(file_path, str(e)), None
+        return lang.get('error_process_csv_file', 'error_process_csv_file').format(file_path, str(e)), None
 
 # 12. handle_epub_file: Processes EPUB files
 def handle_epub_file(file_path):
     """Processes EPUB files."""
     try:
+        import ebooklib
+        from ebooklib import epub
+        from bs4 import BeautifulSoup
         book = epub.read_epub(file_path)
         text = []
         for item in book.get_items():
@@ -220,78 +383,64 @@ def handle_epub_file(file_path):
         return remove_headers_footers('\n'.join(text)), file_path
     except Exception as e:
         log_message('error_process_epub_file', 'error', file_path, str(e))
-        return lang.get('error_process_epub_file').format(file_path, str(e)), None
+        return lang.get('error_process_epub_file', 'error_process_epub_file').format(file_path, str(e)), None
 
 # 13. handle_xml_file: Processes XML files
-def handle_xml_file(file_path):
+def handle_xml_file(file_path, data=None):
     """Processes XML files."""
     try:
-        tree = ET.parse(file_path)
+        with open_file_data(file_path, data) as file:
+            tree = ET.parse(file)
         root = tree.getroot()
         texts = [elem.text for elem in root.iter() if elem.text is not None]
         log_message('xml_file_processed', 'info', file_path)
         return remove_headers_footers('\n'.join(texts)), file_path
     except Exception as e:
         log_message('error_process_xml_file', 'error', file_path, str(e))
-        return lang.get('error_process_xml_file').format(file_path, str(e)), None
+        return lang.get('error_process_xml_file', 'error_process_xml_file').format(file_path, str(e)), None
 
 # 14. handle_audio_file: Processes audio files
-def handle_audio_file(file_path):
+def handle_audio_file(file_path, language=None):
     """Processes audio files."""
-    if file_path.lower().endswith('.m4a'):
-        sound = AudioSegment.from_file(file_path, format='m4a')
-        wav_path = file_path.replace('.m4a', '.wav')
-        sound.export(wav_path, format='wav')
-        file_path = wav_path
-
-    recognizer = sr.Recognizer()
-    with sr.AudioFile(file_path) as source:
-        audio_data = recognizer.record(source)
-        try:
-            text = recognizer.recognize_google(audio_data, language='it-IT')
-            log_message('audio_file_processed', 'info', file_path)
-            return text, file_path
-        except sr.UnknownValueError:
-            log_message('error_speech_not_understood', 'error', file_path)
-            return lang.get('error_speech_not_understood').format(file_path), file_path
-        except sr.RequestError as e:
-            log_message('error_speech_recognition', 'error', file_path, str(e))
-            return lang.get('error_speech_recognition').format(file_path, str(e)), file_path
+    try:
+        text = transcribe_media(file_path, language)
+    except TranscriptionError as e:
+        log_message('error_speech_recognition', 'error', file_path, str(e))
+        return lang.get('error_speech_recognition', 'error_speech_recognition').format(file_path, str(e)), None
+    except Exception as e:
+        # A corrupt or truncated file, or no ffmpeg to decode it
+        log_message('error_process_audio_file', 'error', file_path, str(e))
+        return lang.get('error_process_audio_file', 'error_process_audio_file').format(file_path, str(e)), None
+    if text is None:
+        log_message('error_speech_not_understood', 'error', file_path)
+        return lang.get('error_speech_not_understood', 'error_speech_not_understood').format(file_path), None
+    log_message('audio_file_processed', 'info', file_path)
+    return text, file_path
 
 # 15. handle_video_file: Processes video files
-def handle_video_file(file_path):
+def handle_video_file(file_path, language=None):
     """Processes video files."""
     try:
-        audio_path = extract_audio_from_video(file_path)
-        text = transcribe_audio(audio_path)
-        os.remove(audio_path)
+        text = transcribe_media(file_path, language)
+        if text is None:
+            log_message('error_speech_not_understood', 'error', file_path)
+            return lang.get('error_speech_not_understood', 'error_speech_not_understood').format(file_path), None
         log_message('video_file_processed', 'info', file_path)
         return text, file_path
     except Exception as e:
         log_message('error_process_video_file', 'error', file_path, str(e))
-        return lang.get('error_process_video_file').format(file_path, str(e)), None
-
-# 16. extract_audio_from_video: Extracts audio from video
-def extract_audio_from_video(video_path):
-    """Extracts audio from video."""
-    video = VideoFileClip(video_path)
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    audio_path = os.path.join(temp_dir, f"temp_audio_{timestamp}.wav")
-    video.audio.write_audiofile(audio_path)
-    return audio_path
+        return lang.get('error_process_video_file', 'error_process_video_file').format(file_path, str(e)), None
 
 # 17. transcribe_audio: Transcribes audio using Google Speech Recognition
-def transcribe_audio(audio_path, language='it-IT'):
-    """Transcribes audio using Google Speech Recognition."""
-    recognizer = sr.Recognizer()
-    with sr.AudioFile(audio_path) as source:
-        audio_data = recognizer.record(source)
-        try:
-            return recognizer.recognize_google(audio_data, language=language)
-        except sr.UnknownValueError:
-            return lang.get('error_speech_not_understood').format(audio_path)
-        except sr.RequestError as e:
-            return lang.get('error_speech_recognition').format(audio_path, str(e))
+def transcribe_audio(audio_path, language=None, transcript_cache=None, backend=None):
+    """Transcribes audio using the configured transcription backend (Google Speech Recognition by default)."""
+    try:
+        text = transcribe_media(audio_path, language, backend, transcript_cache=transcript_cache)
+    except TranscriptionError as e:
+        return lang.get('error_speech_recognition', 'error_speech_recognition').format(audio_path, str(e))
+    if text is None:
+        return lang.get('error_speech_not_understood', 'error_speech_not_understood').format(audio_path)
+    return text
 
 # 18. write_to_output: Writes content to output directory
 def write_to_output(content, output_dir, file_index, original_path):
@@ -303,94 +452,238 @@ def write_to_output(content, output_dir, file_index, original_path):
     return file_index + 1
 
 # 19. handle_zip_file: Processes files within a ZIP archive
-def handle_zip_file(zip_path):
-    """Processes files within a ZIP archive."""
+def handle_zip_file(zip_path, data=None, workers=None, depth=0):
+    """Processes every supported member of a ZIP archive and returns ([{'path', 'handler', 'text'}, ...], zip_path).
+
+    Members are read with ZipFile.open, without extracting the archive to disk, and processed
+    on a thread pool; nested archives are processed recursively. data, if given, must be
+    bytes or a seekable file-like object.
+    """
     try:
-        with zipfile.ZipFile(zip_path, 'r') as z:
-            z.extractall(temp_dir)
-            extracted_files = z.namelist()
-            for file_name in extracted_files:
-                internal_path = os.path.join(temp_dir, file_name)
-                if os.path.isfile(internal_path):
-                    content, _ = handle_file(internal_path)
-                    if content and not content.startswith("Unsupported"):
-                        log_message('zip_file_processed', 'info', zip_path)
-                        return f"{content} (from {file_name} in {zip_path})", zip_path
-                    os.remove(internal_path)
+        with open_file_data(zip_path, data) as file, zipfile.ZipFile(file, 'r') as z:
+            members = list(iter_zip_members(z, zip_path))
+            # Nested archives run in the thread of their parent member
+            workers = 1 if depth else workers or DEFAULT_ZIP_WORKERS
+            extract = functools.partial(extract_zip_member, z, zip_path, ByteBudget(DEFAULT_MAX_IN_FLIGHT), depth)
+            records = [record for member_records in map_in_order(extract, members, workers, ThreadPoolExecutor)
+                       for record in member_records]
+        if records:
+            log_message('zip_file_processed', 'info', zip_path)
+            return records, zip_path
         log_message('no_supported_files_found', 'warning', zip_path)
-        return lang.get('no_supported_files_found').format(zip_path), None
+        return lang.get('no_supported_files_found', 'no_supported_files_found').format(zip_path), None
     except Exception as e:
         log_message('error_process_file', 'error', zip_path, str(e))
-        return lang.get('error_process_file').format(zip_path, str(e)), None
+        return lang.get('error_process_file', 'error_process_file').format(zip_path, str(e)), None
+
+# Handler registry: maps each supported file extension to its handler.
+# Handlers import their third-party libraries on first use, so that a run only pays
+# the import cost of the formats it actually meets (see benchmark.py startup).
+FILE_HANDLERS = {
+    '.txt': handle_text_file,
+    '.htm': handle_text_file,
+    '.html': handle_text_file,
+    '.srt': handle_text_file,
+    '.pdf': handle_pdf_file,
+    '.docx': handle_word_file,
+    '.doc': handle_word_file,
+    '.pptx': handle_ppt_file,
+    '.ppt': handle_ppt_file,
+    '.xls': handle_excel_file,
+    '.xlsx': handle_excel_file,
+    '.xml': handle_xml_file,
+    '.gan': handle_xml_file,
+    '.xsd': handle_xml_file,
+    '.wav': handle_audio_file,
+    '.mp3': handle_audio_file,
+    '.m4a': handle_audio_file,
+    '.mp4': handle_video_file,
+    '.avi': handle_video_file,
+    '.mov': handle_video_file,
+    '.mkv': handle_video_file,
+    '.mpeg': handle_video_file,
+    '.mpg': handle_video_file,
+    '.3gp': handle_video_file,
+    '.csv': handle_csv_file,
+    '.epub': handle_epub_file,
+    '.zip': handle_zip_file
+}
+
+# Optional libraries imported by each handler on first use
+HANDLER_MODULES = {
+    'handle_text_file': [],
+    'handle_pdf_file': ['fitz'],
+    'handle_word_file': ['docx'],
+    'handle_ppt_file': ['pptx'],
+    'handle_excel_file': ['pandas'],
+    'handle_xml_file': [],
+    'handle_audio_file': ['speech_recognition', 'numpy'],
+    'handle_video_file': ['speech_recognition', 'numpy'],
+    'handle_csv_file': [],
+    'handle_epub_file': ['ebooklib', 'bs4'],
+    'handle_zip_file': []
+}
+
+# Version of each handler's output: bump it when a handler changes what it extracts,
+# so that the extraction cache does not serve text produced by the old implementation
+HANDLER_VERSIONS = {
+    'handle_text_file': 1,
+    'handle_pdf_file': 1,
+    'handle_word_file': 1,
+    'handle_ppt_file': 1,
+    'handle_excel_file': 1,
+    'handle_xml_file': 1,
+    'handle_audio_file': 2,
+    'handle_video_file': 2,
+    'handle_csv_file': 1,
+    'handle_epub_file': 1,
+    'handle_zip_file': 2
+}
 
 # 20. handle_file: Processes various file types
-def handle_file(file_path):
-    """Processes various file types."""
-    extension = os.path.splitext(file_path)[1].lower()
-    handler = {
-        '.txt': handle_text_file,
-        '.htm': handle_text_file,
-        '.html': handle_text_file,
-        '.srt': handle_text_file,
-        '.pdf': handle_pdf_file,
-        '.docx': handle_word_file,
-        '.doc': handle_word_file,
-        '.pptx': handle_ppt_file,
-        '.ppt': handle_ppt_file,
-        '.xls': handle_excel_file,
-        '.xlsx': handle_excel_file,
-        '.xml': handle_xml_file,
-        '.gan': handle_xml_file,
-        '.xsd': handle_xml_file,
-        '.wav': handle_audio_file,
-        '.mp3': handle_audio_file,
-        '.m4a': handle_audio_file,
-        '.mp4': handle_video_file,
-        '.avi': handle_video_file,
-        '.mov': handle_video_file,
-        '.mkv': handle_video_file,
-        '.mpeg': handle_video_file,
-        '.mpg': handle_video_file,
-        '.3gp': handle_video_file,
-        '.csv': handle_csv_file,
-        '.epub': handle_epub_file,
-        '.zip': handle_zip_file
-    }.get(extension)
-    if handler:
-        return handler(file_path)
-    return lang.get('error_unknown_file_format').format(file_path), None
+def handle_file(file_path, data=None):
+    """Processes various file types.
+
+    data, when given, is the content of the file as bytes or a binary file-like object, and
+    file_path (a path, key or URL) only selects the handler and names the file; handlers
+    that only read paths get the data through a temporary file.
+    """
+    handler = get_handler(file_path)
+    if handler is None:
+        run_metrics.add('handle_file', errors=1)
+        return lang.get('error_unknown_file_format', 'error_unknown_file_format').format(file_path), None
+    with run_metrics.measure('handle_file', handler.__name__, bytes_in=get_data_size(file_path, data)) as stage:
+        if data is None:
+            content, original_path = handler(file_path)
+        elif handler_accepts_data(handler):
+            content, original_path = handler(file_path, data=data)
+        else:
+            content, original_path = handle_spooled_data(handler, file_path, data)
+        stage.failed = original_path is None
+        stage.bytes_out = get_content_size(content)
+    return content, original_path
 
 # 21. handle_directory: Processes all files in a directory
-def handle_directory(directory_path, output_dir):
-    """Processes all files in a directory."""
-    file_index = 1
-    for root, _, files in os.walk(directory_path):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            content, original_path = handle_file(file_path)
-            if content and not content.startswith("Unsupported"):
-                file_index = write_to_output(content, output_dir, file_index, original_path)
+def handle_directory(directory_path, output_dir, workers=1, cache_dir=None, cache_max_size=None, manifest_path=None,
+                     output_format='txt', shard_size=None, journal=None):
+    """Processes all files in a directory, optionally with a pool of worker processes.
+
+    With a job journal, the files it lists as completed are skipped and the outputs written
+    after its last commit are discarded, so a resumed run writes every record once. Returns
+    True if every file was processed, False if some failed and must be retried.
+    """
+    writer = ShardedJsonlWriter(output_dir, shard_size) if output_format == 'jsonl' else None
+    last_record = None
+    resumed = journal is not None and journal.get('next_index') is not None
+    manifest = DirectoryManifest(manifest_path) if manifest_path else None
+    if manifest and writer:
+        if manifest.get('first_shard') is None:
+            manifest.set('first_shard', len(writer.index['shards']))
+        elif not resumed:
+            # The last run was interrupted: drop the records written after the last commit of the manifest
+            writer.rollback(manifest.get('first_shard'), manifest.get('last_record'))
+        manifest.before_commit.append(lambda: sync_output_file(writer.file))
+    if journal and writer:
+        if journal.get('first_shard') is None:
+            journal.set('first_shard', len(writer.index['shards']))
+            journal.flush()
+        else:
+            last_record = journal.get('last_record')
+            writer.rollback(journal.get('first_shard'), last_record)
+        journal.before_flush.append(lambda: sync_output_file(writer.file))
+    if manifest:
+        # Incremental run: only new or modified files are processed
+        changed, _ = manifest.sync(directory_path, writer.retire if writer else None)
+        file_paths = list(changed)
+        file_index = manifest.next_index
+    else:
+        file_paths = list(iter_directory_files(directory_path))
+        file_index = 1
+    if journal:
+        if not resumed:
+            journal.set('next_index', file_index)
+            journal.flush()
+        else:
+            file_index = journal.get('next_index')
+    if not writer and (manifest or resumed):
+        # write_to_output appends: drop the files written after the last commit of the manifest or of the journal
+        for index in itertools.count(file_index):
+            output_file = os.path.join(output_dir, f'model_{index}.txt')
+            if not os.path.exists(output_file):
+                break
+            os.remove(output_file)
+    if journal:
+        if manifest:
+            # Files completed by the interrupted run but not committed to the manifest yet
+            for file_path in file_paths:
+                if os.path.abspath(file_path) in journal:
+                    manifest.record(file_path, changed[file_path], journal.completed[os.path.abspath(file_path)])
+            manifest.next_index = file_index
+        file_paths = list(journal.iter_pending(file_paths, os.path.abspath))
+    extract = get_file_extractor(cache_dir)
+    results = map_in_order(extract, file_paths, workers)
+    failed = 0
+    for file_path, (content, original_path) in zip(file_paths, results):
+        if extraction_failed(content, original_path):
+            # The error is logged; nothing is written, journaled or recorded, so that the next run retries the file
+            failed += 1
+            continue
+        outputs = []
+        # Archives produce one record per member
+        for record_path, handler_name, text in iter_extracted_records(file_path, content, original_path):
+            if text and not text.startswith("Unsupported"):
+                if writer:
+                    last_record = writer.write(record_path, handler_name, text)
+                    outputs.append(last_record)
+                else:
+                    outputs.append(os.path.join(output_dir, f'model_{file_index}.txt'))
+                    file_index = write_to_output(text, output_dir, file_index, record_path)
+        if manifest:
+            # The state after this file is committed together with its record
+            if writer:
+                manifest.set('last_record', last_record)
+            manifest.next_index = file_index
+            manifest.record(file_path, changed[file_path], '\n'.join(outputs) or None)
+        if journal:
+            journal.record(os.path.abspath(file_path), '\n'.join(outputs) or None, next_index=file_index,
+                           last_record=last_record)
+    if writer:
+        writer.close()
+    if journal:
+        journal.flush()
+    if manifest:
+        if writer:
+            # The run is complete: the next one starts from new shards
+            manifest.set('first_shard', None)
+            manifest.set('last_record', None)
+        manifest.close()
+    if cache_dir:
+        ExtractionCache(cache_dir, cache_max_size).prune()
+    return not failed
 
 # 22. limit_files_search: Limits the search of files based on specific criteria
-def limit_files_search(files, limit_search):
+def limit_files_search(files, limit_search, mtimes=None):
     """Limits the search of files based on specific criteria."""
     if limit_search == 'noLimit':
         return files
+    # Stat every file once; callers holding a manifest scan can pass the mtimes they already have
+    if mtimes is None:
+        mtimes = {file: os.path.getmtime(file) for file in files}
     if limit_search == 'lastProducedPerType':
         file_types = {}
         for file in files:
             file_type = os.path.splitext(file)[1]
-            if (file_type not in file_types) or (os.path.getmtime(file) > os.path.getmtime(file_types[file_type])):
+            if (file_type not in file_types) or (mtimes[file] > mtimes[file_types[file_type]]):
                 file_types[file_type] = file
         return list(file_types.values())
     elif limit_search == 'lastProducedInFolder':
         if files:
-            return [max(files, key=os.path.getmtime)]
+            return [max(files, key=mtimes.get)]
     elif limit_search == 'lastProducedSimilarTitle':
         similar_titles = {}
         for file in files:
             base_name = os.path.splitext(file)[0]
-            if base_name not in similar_titles or os.path.getmtime(file) > os.path.getmtime(similar_titles[base_name]):
+            if base_name not in similar_titles or mtimes[file] > mtimes[similar_titles[base_name]]:
                 similarity = SequenceMatcher(None, base_name, os.path.splitext(similar_titles.get(base_name, ""))[0]).ratio()
                 if similarity > 0.9:
                     similar_titles[base_name] = file
@@ -401,25 +694,18 @@ def limit_files_search(files, limit_search):
 def process_text_with_keywords(text, keywords):
     """Processes text with keywords and creates JSON data."""
     json_data = []
-    keyword_positions = []
-
-    # Find all keyword positions in text
-    for keyword in keywords:
-        pattern = re.compile(keyword, re.IGNORECASE)
-        matches = list(pattern.finditer(text))
-        for match in matches:
-            keyword_positions.append((match.start(), match.end(), match.group()))
-
-    # Sort keyword positions by their position in text
-    keyword_positions.sort()
+    # keywords is either a list of keywords or a matcher built once by compile_keywords
+    matcher = keywords if isinstance(keywords, re.Pattern) else compile_keywords(keywords)
 
-    # Add contents between keywords to JSON
-    for i in range(len(keyword_positions)):
-        start, end, matched_keyword = keyword_positions[i]
-        next_start = keyword_positions[i + 1][0] if i + 1 < len(keyword_positions) else len(text)
-
-        content = text[end:next_start].strip()
-        json_data.append({"title": matched_keyword, "content": content})
+    # Single pass over the text: each section runs from a keyword to the next one
+    if matcher is not None:
+        previous = None
+        for match in matcher.finditer(text):
+            if previous is not None:
+                json_data.append({"title": previous.group(), "content": text[previous.end():match.start()].strip()})
+            previous = match
+        if previous is not None:
+            json_data.append({"title": previous.group(), "content": text[previous.end():].strip()})
 
     log_message('json_data_created', 'info')
     return json_data
@@ -443,6 +729,7 @@ def download_youtube_video(url, download_audio_only=False):
         log_message('error_download_url_empty', 'error')
         return None
     try:
+        from pytube import YouTube
         yt = YouTube(url)
         title = ''.join([c for c in yt.title if c.isalpha() or c.isdigit() or c == ' ']).rstrip()
         if download_audio_only:
@@ -464,6 +751,7 @@ def download_vimeo_video(url):
         log_message('error_download_url_empty', 'error')
         return None
     try:
+        import requests
         response = requests.get(url, stream=True)
         title = url.split("/")[-1]
         title = ''.join([c for c in title if c.isalpha() or c.isdigit() or c == ' ']).rstrip()
@@ -476,59 +764,27 @@ def download_vimeo_video(url):
         log_message('error_download_vimeo', 'error', str(e))
         return None
 
-# 27. extract_audio: Extracts audio from video
-def extract_audio(video_file):
-    """Extracts audio from video."""
-    try:
-        video = VideoFileClip(video_file)
-        audio = video.audio
-        audio_file = os.path.join(temp_dir, "temp_audio.wav")
-        audio.write_audiofile(audio_file, codec='pcm_s16le')
-        video.close()
-        log_message('audio_file_extracted', 'info', audio_file)
-        return audio_file
-    except Exception as e:
-        log_message('error_extract_audio', 'error', str(e))
-        return None
-
 # 28. generate_srt: Generates SRT file from video
-def generate_srt(video_file, output_file, language='it-IT'):
-    """Generates SRT file from video."""
+def generate_srt(video_file, output_file, language=None, workers=1, backend=None,
+                 min_silence_len=500, silence_offset=14, keep_silence=500, transcript_cache=None, batch_size=None,
+                 journal=None):
+    """Generates SRT file from video and returns True if every chunk was transcribed."""
+    cache = None
     try:
-        # Extract audio from the video file
-        audio_file = extract_audio(video_file)
-        if not audio_file:
-            raise FileNotFoundError(lang.get('error_extract_audio').format("Audio extraction failed."))
-
-        sound = AudioSegment.from_wav(audio_file)
-        chunks = split_on_silence(sound, min_silence_len=500, silence_thresh=sound.dBFS-14, keep_silence=500)
-        
-        with open(output_file, 'w') as file:
-            start = 0
-            for i, chunk in enumerate(chunks):
-                chunk_filename = os.path.join(temp_dir, f"chunk_{i}.wav")
-                chunk.export(chunk_filename, format="wav")
-                with sr.AudioFile(chunk_filename) as source:
-                    audio = sr.Recognizer().record(source)
-                try:
-                    text = sr.Recognizer().recognize_google(audio, language=language)
-                    duration = len(chunk) / 1000
-                    start_time = start
-                    end_time = start + duration
-                    file.write(f"{i+1}\n")
-                    file.write(f"{format_time(start_time)} --> {format_time(end_time)}\n")
-                    file.write(f"{text}\n\n")
-                    start += duration
-                    log_message('info_generated_srt_segment', 'info', i + 1)
-                except sr.UnknownValueError:
-                    log_message('warning_audio_not_understood', 'warning', i + 1)
-                except sr.RequestError as e:
-                    log_message('error_service_srt', 'error', i + 1, str(e))
-                finally:
-                    os.remove(chunk_filename)
-        os.remove(audio_file)
+        cache = open_transcript_cache(transcript_cache)
+        # The audio is streamed from ffmpeg and each chunk is sliced only when it is transcribed
+        audio_chunks = iter_media_chunks(video_file, min_silence_len, silence_offset, keep_silence)
+        _, failed = write_srt_from_chunks(audio_chunks, output_file, language, workers,
+                                          with_transcript_cache(backend or get_transcription_backend(), cache),
+                                          batch_size, journal)
+        # With failed chunks the job is not completed: its journal is kept for --resume
+        return not failed
     except Exception as e:
         log_message('error_generate_srt', 'error', str(e))
+        return False
+    finally:
+        if cache:
+            cache.close()
 
 # 29. format_time: Formats time in SRT format
 def format_time(seconds):
@@ -541,6 +797,7 @@ def format_time(seconds):
 # 30. upload_to_gdrive: Uploads a file to Google Drive
 def upload_to_gdrive(file_path, folder_id, service):
     """Uploads a file to Google Drive."""
+    from googleapiclient.http import MediaFileUpload
     file_metadata = {'name': os.path.basename(file_path), 'parents': [folder_id]}
     media = MediaFileUpload(file_path, resumable=True)
     file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
@@ -554,71 +811,49 @@ def create_folder_on_gdrive(folder_name, parent_id, service):
     return folder.get('id')
 
 # 32. upload_json_to_gdrive: Uploads JSON data to Google Drive
-def upload_json_to_gdrive(json_data, file_name, folder_id, service):
-    """Uploads JSON data to Google Drive."""
-    json_path = os.path.join(temp_dir, file_name)
-    with open(json_path, 'w', encoding='utf-8') as json_file:
-        json.dump(json_data, json_file, indent=4, ensure_ascii=False)
-    upload_to_gdrive(json_path, folder_id, service)
-    os.remove(json_path)
+def upload_json_to_gdrive(json_data, file_name, folder_id, service, jsonl=False):
+    """Uploads JSON data (or JSONL with jsonl) to Google Drive, serialized into an anonymous spooled buffer."""
+    from googleapiclient.http import MediaIoBaseUpload
+    chunk_size = get_gdrive_chunk_size()
+    # Resumable uploads need a seekable source: kept in memory up to one chunk, then in an unnamed temporary file
+    with tempfile.SpooledTemporaryFile(max_size=chunk_size) as spool:
+        for chunk in iter_json_chunks(json_data, jsonl):
+            spool.write(chunk)
+        spool.seek(0)
+        media = MediaIoBaseUpload(spool, mimetype='application/x-ndjson' if jsonl else 'application/json',
+                                  chunksize=chunk_size, resumable=True)
+        file = service.files().create(body={'name': file_name, 'parents': [folder_id]}, media_body=media,
+                                      fields='id').execute()
+    log_message('success_upload_gdrive', 'info', file.get('id'))
 
 # 33. download_files_from_folder: Downloads all files from a Google Drive folder
-def download_files_from_folder(folder_id, service, output_dir):
-    """Downloads all files from a Google Drive folder."""
-    results = service.files().list(q=f"'{folder_id}' in parents", spaces='drive', fields='files(id, name)').execute()
-    items = results.get('files', [])
-    for item in items:
-        file_id = item['id']
-        file_name = item['name']
-        request = service.files().get_media(fileId=file_id)
-        file_path = os.path.join(output_dir, file_name)
-        with open(file_path, 'wb') as file:
-            downloader = MediaIoBaseDownload(file, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                log_message('download_progress', 'info', int(status.progress() * 100))
-        log_message('success_download_gdrive', 'info', file_id, file_path)
+def download_files_from_folder(folder_id, service, output_dir, workers=None):
+    """Downloads all files from a Google Drive folder, several files at a time."""
+    paths = iter_gdrive_download_paths(service, folder_id, output_dir, recursive=False)
+    return download_gdrive_files(service, paths, folder_id, workers)
 
 # 34. download_from_gdrive: Downloads a file from Google Drive
 def download_from_gdrive(file_id, service, output_path):
     """Downloads a file from Google Drive."""
-    request = service.files().get_media(fileId=file_id)
-    with open(output_path, 'wb') as file:
-        downloader = MediaIoBaseDownload(file, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            log_message('download_progress', 'info', int(status.progress() * 100))
-    log_message('success_download_gdrive', 'info', file_id, output_path)
+    if download_gdrive_file(service, get_gdrive_chunk_size(), TransferProgress(file_id), (file_id, output_path)):
+        log_message('success_download_gdrive', 'info', file_id, output_path)
 
 # 35. download_all_files_from_gdrive: Downloads all files from a Google Drive folder and its subfolders
-def download_all_files_from_gdrive(folder_id, service, output_dir):
-    """Downloads all files from a Google Drive folder and its subfolders."""
-    results = service.files().list(q=f"'{folder_id}' in parents", spaces='drive', fields='files(id, name, mimeType)').execute()
-    items = results.get('files', [])
-    for item in items:
-        file_id = item['id']
-        file_name = item['name']
-        mime_type = item['mimeType']
-        if mime_type == 'application/vnd.google-apps.folder':
-            subfolder_path = os.path.join(output_dir, file_name)
-            if not os.path.exists(subfolder_path):
-                os.makedirs(subfolder_path)
-            download_all_files_from_gdrive(file_id, service, subfolder_path)
-        else:
-            download_from_gdrive(file_id, service, os.path.join(output_dir, file_name))
+def download_all_files_from_gdrive(folder_id, service, output_dir, workers=None):
+    """Downloads all files from a Google Drive folder and its subfolders, several files at a time."""
+    paths = iter_gdrive_download_paths(service, folder_id, output_dir)
+    return download_gdrive_files(service, paths, folder_id, workers)
 
 # 36. upload_to_s3: Uploads a file to S3
 def upload_to_s3(file_path, bucket_name, s3_client):
     """Uploads a file to S3."""
-    s3_client.upload_file(file_path, bucket_name, os.path.basename(file_path))
+    s3_client.upload_file(file_path, bucket_name, os.path.basename(file_path), Config=get_transfer_config())
     log_message('success_upload_s3', 'info', file_path, bucket_name)
 
 # 37. download_from_s3: Downloads a file from S3
 def download_from_s3(file_key, bucket_name, output_path, s3_client):
     """Downloads a file from S3."""
-    s3_client.download_file(bucket_name, file_key, output_path)
+    s3_client.download_file(bucket_name, file_key, output_path, Config=get_transfer_config())
     log_message('success_download_s3', 'info', file_key, bucket_name, output_path)
 
 # 38. create_folder_on_s3: Creates a folder on S3
@@ -628,26 +863,18 @@ def create_folder_on_s3(folder_name, bucket_name, s3_client):
     log_message('success_create_s3_folder', 'info', folder_name, bucket_name)
 
 # 39. upload_json_to_s3: Uploads JSON data to S3
-def upload_json_to_s3(json_data, file_name, bucket_name, s3_client):
-    """Uploads JSON data to S3."""
-    json_path = os.path.join(temp_dir, file_name)
-    with open(json_path, 'w', encoding='utf-8') as json_file:
-        json.dump(json_data, json_file, indent=4, ensure_ascii=False)
-    upload_to_s3(json_path, bucket_name, s3_client)
-    os.remove(json_path)
+def upload_json_to_s3(json_data, file_name, bucket_name, s3_client, jsonl=False):
+    """Uploads JSON data (or JSONL with jsonl) to S3, streamed into a multipart upload as it is serialized."""
+    s3_client.upload_fileobj(ChunkReader(iter_json_chunks(json_data, jsonl)), bucket_name, file_name,
+                             ExtraArgs={'ContentType': 'application/x-ndjson' if jsonl else 'application/json'},
+                             Config=get_transfer_config())
+    log_message('success_upload_s3', 'info', file_name, bucket_name)
 
 # 40. download_directory_from_s3: Downloads a directory from S3
-def download_directory_from_s3(bucket_name, s3_client, output_dir):
-    """Downloads a directory from S3."""
-    paginator = s3_client.get_paginator('list_objects_v2')
-    for page in paginator.paginate(Bucket=bucket_name, Prefix=''):
-        for obj in page.get('Contents', []):
-            file_key = obj['Key']
-            file_path = os.path.join(output_dir, file_key)
-            if not os.path.exists(os.path.dirname(file_path)):
-                os.makedirs(os.path.dirname(file_path))
-            s3_client.download_file(bucket_name, file_key, file_path)
-            log_message('success_download_s3', 'info', file_key, bucket_name, file_path)
+def download_directory_from_s3(bucket_name, s3_client, output_dir, prefix='', workers=None):
+    """Downloads a directory from S3, several objects at a time."""
+    paths = ((obj['Key'], os.path.join(output_dir, obj['Key'])) for obj in iter_s3_objects(s3_client, bucket_name, prefix))
+    return transfer_s3_objects(s3_client, bucket_name, 'download', paths, 's3', workers)
 
 # 41. upload_to_azure: Uploads a file to Azure Blob Storage
 def upload_to_azure(file_path, container_name, blob_service_client):
@@ -674,24 +901,25 @@ def create_folder_on_azure(folder_name, container_name, blob_service_client):
     log_message('success_create_azure_folder', 'info', folder_name, container_name)
 
 # 44. upload_json_to_azure: Uploads JSON data to Azure Blob Storage
-def upload_json_to_azure(json_data, file_name, container_name, blob_service_client):
-    """Uploads JSON data to Azure Blob Storage."""
-    json_path = os.path.join(temp_dir, file_name)
-    with open(json_path, 'w', encoding='utf-8') as json_file:
-        json.dump(json_data, json_file, indent=4, ensure_ascii=False)
-    upload_to_azure(json_path, container_name, blob_service_client)
-    os.remove(json_path)
+def upload_json_to_azure(json_data, file_name, container_name, blob_service_client, jsonl=False):
+    """Uploads JSON data (or JSONL with jsonl) to Azure Blob Storage, streamed into a block upload as it is serialized."""
+    from azure.storage.blob import ContentSettings
+    blob_client = blob_service_client.get_blob_client(container=container_name, blob=file_name)
+    blob_client.upload_blob(ChunkReader(iter_json_chunks(json_data, jsonl)), overwrite=True,
+                            content_settings=ContentSettings(content_type='application/x-ndjson' if jsonl else 'application/json'),
+                            max_concurrency=transfer_settings.get('multipart_concurrency', DEFAULT_MULTIPART_CONCURRENCY))
+    log_message('success_upload_azure', 'info', file_name, container_name)
 
 # 45. upload_to_aruba: Uploads a file to Aruba Cloud Object Storage
 def upload_to_aruba(file_path, bucket_name, aruba_client):
     """Uploads a file to Aruba Cloud Object Storage."""
-    aruba_client.upload_file(file_path, bucket_name, os.path.basename(file_path))
+    aruba_client.upload_file(file_path, bucket_name, os.path.basename(file_path), Config=get_transfer_config())
     log_message('success_upload_aruba', 'info', file_path, bucket_name)
 
 # 46. download_from_aruba: Downloads a file from Aruba Cloud Object Storage
 def download_from_aruba(file_key, bucket_name, output_path, aruba_client):
     """Downloads a file from Aruba Cloud Object Storage."""
-    aruba_client.download_file(bucket_name, file_key, output_path)
+    aruba_client.download_file(bucket_name, file_key, output_path, Config=get_transfer_config())
     log_message('success_download_aruba', 'info', file_key, bucket_name, output_path)
 
 # 47. create_folder_on_aruba: Creates a folder on Aruba Cloud Object Storage
@@ -701,17 +929,17 @@ def create_folder_on_aruba(folder_name, bucket_name, aruba_client):
     log_message('success_create_aruba_folder', 'info', folder_name, bucket_name)
 
 # 48. upload_json_to_aruba: Uploads JSON data to Aruba Cloud Object Storage
-def upload_json_to_aruba(json_data, file_name, bucket_name, aruba_client):
-    """Uploads JSON data to Aruba Cloud Object Storage."""
-    json_path = os.path.join(temp_dir, file_name)
-    with open(json_path, 'w', encoding='utf-8') as json_file:
-        json.dump(json_data, json_file, indent=4, ensure_ascii=False)
-    upload_to_aruba(json_path, bucket_name, aruba_client)
-    os.remove(json_path)
+def upload_json_to_aruba(json_data, file_name, bucket_name, aruba_client, jsonl=False):
+    """Uploads JSON data (or JSONL with jsonl) to Aruba Cloud Object Storage, streamed into a multipart upload as it is serialized."""
+    aruba_client.upload_fileobj(ChunkReader(iter_json_chunks(json_data, jsonl)), bucket_name, file_name,
+                                ExtraArgs={'ContentType': 'application/x-ndjson' if jsonl else 'application/json'},
+                                Config=get_transfer_config())
+    log_message('success_upload_aruba', 'info', file_name, bucket_name)
 
 # 49. play_video_with_srt: Plays video with SRT subtitles
 def play_video_with_srt(video_path, srt_path):
     """Plays video with SRT subtitles."""
+    import vlc
     player = vlc.MediaPlayer()
     media = vlc.Media(video_path)
     media.add_option(f":sub-file={srt_path}")
@@ -726,28 +954,17 @@ def play_video_from_command_line(video_path):
     log_message('play_video_from_command_line', 'info', video_path)
 
 # 51. download_directory_from_azure: Downloads a directory from Azure Blob Storage
-def download_directory_from_azure(container_name, blob_service_client, output_dir):
-    """Downloads a directory from Azure Blob Storage."""
+def download_directory_from_azure(container_name, blob_service_client, output_dir, prefix='', workers=None):
+    """Downloads a directory from Azure Blob Storage, several blobs at a time."""
     container_client = blob_service_client.get_container_client(container_name)
-    blobs = container_client.list_blobs()
-    for blob in blobs:
-        file_path = os.path.join(output_dir, blob.name)
-        if not os.path.exists(os.path.dirname(file_path)):
-            os.makedirs(os.path.dirname(file_path))
-        download_from_azure(blob.name, container_name, file_path, blob_service_client)
+    paths = ((blob.name, os.path.join(output_dir, blob.name)) for blob in iter_azure_blobs(container_client, prefix))
+    return transfer_azure_blobs(container_client, 'download', paths, workers)
 
 # 52. download_directory_from_aruba: Downloads a directory from Aruba Cloud Object Storage
-def download_directory_from_aruba(bucket_name, aruba_client, output_dir):
-    """Downloads a directory from Aruba Cloud Object Storage."""
-    paginator = aruba_client.get_paginator('list_objects_v2')
-    for page in paginator.paginate(Bucket=bucket_name, Prefix=''):
-        for obj in page.get('Contents', []):
-            file_key = obj['Key']
-            file_path = os.path.join(output_dir, file_key)
-            if not os.path.exists(os.path.dirname(file_path)):
-                os.makedirs(os.path.dirname(file_path))
-            aruba_client.download_file(bucket_name, file_key, file_path)
-            log_message('success_download_aruba', 'info', file_key, bucket_name, file_path)
+def download_directory_from_aruba(bucket_name, aruba_client, output_dir, prefix='', workers=None):
+    """Downloads a directory from Aruba Cloud Object Storage, several objects at a time."""
+    paths = ((obj['Key'], os.path.join(output_dir, obj['Key'])) for obj in iter_s3_objects(aruba_client, bucket_name, prefix))
+    return transfer_s3_objects(aruba_client, bucket_name, 'download', paths, 'aruba', workers)
 
 # 53. read_file_from_gdrive: Reads a file from Google Drive
 def read_file_from_gdrive(file_id, service):
@@ -786,13 +1003,10 @@ def create_container_if_not_exists(container_name, blob_service_client):
     log_message('success_create_azure_container', 'info', container_name)
 
 # 58. upload_directory_to_azure: Uploads a directory to Azure Blob Storage
-def upload_directory_to_azure(directory_path, container_name, blob_service_client):
-    """Uploads a directory to Azure Blob Storage."""
-    for root, _, files in os.walk(directory_path):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            blob_name = os.path.relpath(file_path, directory_path)
-            upload_to_azure(file_path, container_name, blob_service_client)
+def upload_directory_to_azure(directory_path, container_name, blob_service_client, prefix='', workers=None):
+    """Uploads a directory to Azure Blob Storage, several files at a time, keeping relative paths in the blob names."""
+    container_client = blob_service_client.get_container_client(container_name)
+    return transfer_azure_blobs(container_client, 'upload', iter_upload_paths(directory_path, prefix), workers)
 
 # 59. launch_gui: Launches the GUI for the application
 def launch_gui():
@@ -804,242 +1018,3374 @@ def launch_gui():
     window.show()
     app.exec_()
 
-# 60. extract_audio: Extracts audio from video (duplicata)
-def extract_audio(video_file):
-    """Extracts audio from video."""
-    try:
-        video = VideoFileClip(video_file)
-        audio = video.audio
-        audio_file = os.path.join(temp_dir, "temp_audio.wav")
-        audio.write_audiofile(audio_file, codec='pcm_s16le')
-        video.close()
-        log_message('audio_file_extracted', 'info', audio_file)
-        return audio_file
-    except Exception as e:
-        log_message('error_extract_audio', 'error', str(e))
-        return None
-
 # 61. process_video: Processes video files
 def process_video(video_path, output_path):
     """Processes video files."""
-    audio_path = extract_audio(video_path)
     srt_path = os.path.splitext(output_path)[0] + ".srt"
-    generate_srt(audio_path, srt_path)
+    generate_srt(video_path, srt_path)
     play_video_with_srt(video_path, srt_path)
 
-# 62. main: Main function to parse arguments and initiate processing
-def main():
-    print("Starting main function...")  # Stampa di debug
-    parser = argparse.ArgumentParser(description="CLI Tool")
-    parser.add_argument("--language", type=str, default="eng", help="Language code for localization")  # Funzione 4: load_translations
-    parser.add_argument("--operation", type=str, help="Operation to perform")  # Funzioni varie, specificate sotto
-    parser.add_argument("--file_path", type=str, help="Path to the file")  # Funzioni 6-15, 25-28
-    parser.add_argument("--directory_path", type=str, help="Path to the directory")  # Funzioni 21, 22, 40, 51-53, 58
-    parser.add_argument("--bucket_name", type=str, help="Bucket name for cloud storage")  # Funzioni 36-39, 45-48, 52
-    parser.add_argument("--folder_id", type=str, help="Folder ID for Google Drive")  # Funzioni 30-35
-    parser.add_argument("--file_id", type=str, help="File ID for Google Drive")  # Funzione 34
-    parser.add_argument("--blob_name", type=str, help="Blob name for Azure Blob storage")  # Funzioni 42, 44
-    parser.add_argument("--file_key", type=str, help="File key for S3/Aruba")  # Funzioni 37, 46
-    parser.add_argument("--download_path", type=str, help="Path to download the file")  # Funzioni 34, 37, 42, 46
-    parser.add_argument("--output_dir", type=str, help="Output directory")  # Funzioni 18, 21, 23, 58
-    parser.add_argument("--keywords", nargs='*', help="Keywords for processing text files")  # Funzione 23
-    parser.add_argument("--limit_search", type=str, default="noLimit", help="Limit file search criteria")  # Funzione 22
-    parser.add_argument("--download_audio_only", action='store_true', help="Download audio only from video")  # Funzione 25
-    parser.add_argument("--gui", action='store_true', help="Launch GUI interface")  # Funzione 59
-    parser.add_argument("--play_video", action='store_true', help="Play video with SRT")  # Funzioni 49, 50
-    parser.add_argument("--video_path", type=str, help="Path to the video file")  # Funzioni 15, 27, 49, 50
-    parser.add_argument("--srt_path", type=str, help="Path to the SRT file")  # Funzione 49
-    parser.add_argument("--file_name", type=str, help="Name of the file to read")  # Funzioni 53-56
-    parser.add_argument("--upload_directory_to_azure", action="store_true", help="Upload directory to Azure Blob Storage")  # Funzione 58
-    parser.add_argument("--download_directory_from_azure", action="store_true", help="Download directory from Azure Blob Storage")  # Funzione 51
-    parser.add_argument("--container_name", type=str, help="Container name for Azure Blob storage")  # Funzioni 41, 43, 44, 51, 58
-    parser.add_argument("--azure_directory", type=str, help="Directory path in Azure Blob storage")  # Funzione 51
-    parser.add_argument("--url", type=str, help="URL of the video to download")  # Funzioni 25, 26
-    parser.add_argument("--transcription_lang", type=str, default="en", help="Language for transcription")  # Funzioni 14, 17
+# 62. iter_directory_files: Yields the files of a directory tree in walk order
+def iter_directory_files(directory_path):
+    """Yields the files of a directory tree in walk order."""
+    for root, _, files in os.walk(directory_path):
+        for file_name in files:
+            yield os.path.join(root, file_name)
 
-    args = parser.parse_args()
-    
-    global translations
-    translations = load_translations(args.language)  # Funzione 4
-    print("Translations loaded.")  # Stampa di debug
+# 63. map_in_order: Maps a function over items with a bounded worker pool, keeping input order
+def map_in_order(func, items, workers=1, executor_class=ProcessPoolExecutor, max_pending=None):
+    """Maps a function over items with a bounded worker pool, yielding results in input order."""
+    if not workers or workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+    # Keep only a few tasks per worker in flight so memory stays bounded on large trees
+    max_pending = max_pending or workers * 4
+    pending = deque()
+    # Worker processes have their own metrics: each task sends back what it recorded
+    in_processes = issubclass(executor_class, ProcessPoolExecutor)
+    with new_process_pool(workers) if in_processes else executor_class(max_workers=workers) as executor:
+        for item in items:
+            pending.append(executor.submit(run_with_metrics, func, item) if in_processes else executor.submit(func, item))
+            if len(pending) >= max_pending:
+                result = pending.popleft().result()
+                yield merge_worker_metrics(result) if in_processes else result
+        while pending:
+            result = pending.popleft().result()
+            yield merge_worker_metrics(result) if in_processes else result
 
-    global config
-    config = load_config("cli_tool")  # Funzione 3
-    print("Config loaded.")  # Stampa di debug
+# 64. ExtractionCache: Persistent content-addressed cache of extracted text
+class ExtractionCache:
+    """Persistent content-addressed cache of the text returned by handle_file."""
 
-    # Set the GOOGLE_APPLICATION_CREDENTIALS environment variable
-    if config and 'google_application_credentials' in config:  # Funzioni 32-35
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config['google_application_credentials']
-        log_message('Google application credentials set: {}', 'info', config['google_application_credentials'])  # Funzione 2
-        print("Google application credentials set.")  # Stampa di debug
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size or DEFAULT_CACHE_MAX_SIZE
+        os.makedirs(cache_dir, exist_ok=True)
 
-    credentials = service_account.Credentials.from_service_account_file(  # Funzioni 32-35
-        config['google_application_credentials'],
-        scopes=config['gdrive_scopes']
-    )
-    print("Credentials loaded.")  # Stampa di debug
+    def key_for(self, file_path):
+        """Returns the cache key of a file: content hash plus handler name and version."""
+        handler = get_handler(file_path)
+        if handler is None:
+            return None
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        version = HANDLER_VERSIONS.get(handler.__name__, 1)
+        key = f"{digest.hexdigest()}-{handler.__name__}-v{version}"
+        if handler.__name__ in ('handle_audio_file', 'handle_video_file'):
+            # Transcripts depend on the language and on the speech recognition engine
+            key += f"-{get_transcription_language()}-{transcription_settings.get('backend', DEFAULT_TRANSCRIPTION_BACKEND)}"
+        return key
 
-    configure_logger("cli_tool")  # Funzione 1
-    print("Logger configured in main.")  # Stampa di debug
-    # Launch GUI if --gui argument is passed
-    if args.gui:
-        launch_gui()  # Funzione 59
-        return
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
 
-    if args.operation == "process_video":  # Funzione 61
-        process_video(
-            url=args.url,
-            file_path=args.file_path,
-            download_audio_only=args.download_audio_only,
-            transcription_lang=args.transcription_lang
+    def get(self, key):
+        """Returns the cached text for a key, or None on a miss."""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as entry:
+                content = json.load(entry)['content']
+            os.utime(entry_path)  # Mark the entry as recently used for LRU eviction
+            return content
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def put(self, key, content):
+        """Stores the text for a key, replacing the entry atomically."""
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        # Unique per call: threads of one process (remote prefixes, ZIP members) may store the same key at once
+        fd, tmp_path = tempfile.mkstemp(prefix=f'{os.path.basename(entry_path)}.', suffix='.tmp',
+                                        dir=os.path.dirname(entry_path))
+        try:
+            with open(fd, 'w', encoding='utf-8') as entry:
+                json.dump({'content': content}, entry, ensure_ascii=False)
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def prune(self):
+        """Evicts the least recently used entries until the cache fits in max_size bytes."""
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                entry_path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(entry_path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+                total_size += stat.st_size
+        entries.sort()
+        removed = 0
+        for _, size, entry_path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            removed += 1
+        if removed:
+            log_message('cache_pruned', 'info', removed, self.cache_dir)
+        return removed
+
+# 65. handle_file_cached: Processes a file through the extraction cache
+def handle_file_cached(file_path, cache_dir):
+    """Processes a file through the extraction cache."""
+    cache = ExtractionCache(cache_dir)
+    try:
+        key = cache.key_for(file_path)
+    except OSError as e:
+        log_message('error_cache_key', 'warning', file_path, str(e))
+        key = None
+    if key is None:
+        return handle_file(file_path)
+    content = cache.get(key)
+    if content is not None:
+        log_message('cache_hit', 'debug', file_path)
+        return content, file_path
+    content, original_path = handle_file(file_path)
+    # Failed extractions return no original path and must not be cached
+    if content and original_path is not None:
+        cache.put(key, content)
+    return content, original_path
+
+# 66. get_file_extractor: Returns the extraction function to use, with or without cache
+def get_file_extractor(cache_dir=None):
+    """Returns the extraction function to use, with or without cache."""
+    if cache_dir:
+        return functools.partial(handle_file_cached, cache_dir=cache_dir)
+    return handle_file
+
+# 67. DirectoryManifest: SQLite index of the processed files of a directory tree
+class DirectoryManifest:
+    """SQLite index of the processed files of a directory tree, used for incremental runs."""
+
+    def __init__(self, manifest_path):
+        manifest_dir = os.path.dirname(manifest_path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        self.connection = sqlite3.connect(manifest_path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, output TEXT)"
+        )
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+        self.pending = 0
+        self.before_commit = []
+
+    def get(self, key, default=None):
+        """Returns a value of the run state."""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        """Stores a value of the run state, committed with the next records."""
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    @property
+    def next_index(self):
+        """Next free model_{index}.txt index for handle_directory."""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'next_index'").fetchone()
+        return int(row[0]) if row else 1
+
+    @next_index.setter
+    def next_index(self, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('next_index', ?)", (str(value),))
+
+    def scan(self, directory_path, retire=None):
+        """Stats the tree and returns the changed files (path -> stat) and the deleted entries (path -> output)."""
+        retire = retire or self.retire_output
+        known = {row[0]: row[1:] for row in self.connection.execute("SELECT path, size, mtime_ns, inode, output FROM files")}
+        changed = {}
+        for file_path in iter_directory_files(directory_path):
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            previous = known.pop(os.path.abspath(file_path), None)
+            if previous is None or previous[:3] != (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+                changed[file_path] = stat
+                if previous is not None and previous[3]:
+                    # The file will be processed again: its old outputs are retired
+                    for output in previous[3].split('\n'):
+                        retire(output)
+        deleted = {path: values[3] for path, values in known.items()}
+        return changed, deleted
+
+    def sync(self, directory_path, retire=None):
+        """Scans the tree, retires the outputs of deleted files and returns (changed, deleted)."""
+        retire = retire or self.retire_output
+        changed, deleted = self.scan(directory_path, retire)
+        for path, outputs in deleted.items():
+            for output in (outputs or '').split('\n'):
+                if output:
+                    retire(output)
+            self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.connection.commit()
+        log_message('manifest_scanned', 'info', directory_path, len(changed), len(deleted))
+        return changed, deleted
+
+    def retire_output(self, output):
+        """Removes an output produced by a previous run."""
+        try:
+            os.remove(output)
+            log_message('manifest_output_retired', 'info', output)
+        except FileNotFoundError:
+            pass
+
+    def record(self, file_path, stat, output):
+        """Records a processed file and the outputs it produced (one per line, None if nothing was written)."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, output) VALUES (?, ?, ?, ?, ?)",
+            (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino, output)
         )
+        self.pending += 1
+        if self.pending >= MANIFEST_COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        """Makes the outputs durable (before_commit callbacks) and commits the pending records."""
+        for callback in self.before_commit:
+            callback()
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        """Commits the pending records and closes the manifest."""
+        self.commit()
+        self.connection.close()
+
+# 68. process_keywords: Creates a keyword-segmented JSON file for each file in a directory
+def process_keywords(directory_path, output_dir, keywords, workers=1, cache_dir=None, cache_max_size=None, manifest_path=None,
+                     stream=False, chunk_size=None):
+    """Creates a keyword-segmented JSON file for each file in a directory."""
+    if manifest_path:
+        manifest = DirectoryManifest(manifest_path)
+        changed, _ = manifest.sync(directory_path)
+        file_paths = list(changed)
     else:
-        print(f"Unknown operation: {args.operation}")
-        logging.error(f"Unknown operation: {args.operation}")
+        manifest = None
+        file_paths = list(iter_directory_files(directory_path))
+    matcher = compile_keywords(keywords)  # Compiled once and reused for every file
+    if stream:
+        # Each file is read in chunks and segmented straight into its JSON file (the cache is not used)
+        segment = functools.partial(segment_file_to_json, output_dir=output_dir, matcher=matcher, chunk_size=chunk_size)
+        output_files = map_in_order(segment, file_paths, workers)
+    else:
+        extract = get_file_extractor(cache_dir)
+        output_files = (False if extraction_failed(content, original_path)
+                        else segment_text_to_json(file_path, content, output_dir, matcher)
+                        for file_path, (content, original_path) in zip(file_paths, map_in_order(extract, file_paths, workers)))
+    for file_path, output_file in zip(file_paths, output_files):
+        # Failed files are not recorded, so that the next run processes them again
+        if manifest and output_file is not False:
+            manifest.record(file_path, changed[file_path], output_file)
+    if manifest:
+        manifest.close()
+    if cache_dir:
+        ExtractionCache(cache_dir, cache_max_size).prune()
 
-    # Handle the play video operation
-    if args.play_video:  # Funzioni 49, 50
-        if args.video_path and args.srt_path:
-            play_video_from_command_line(args.video_path, args.srt_path)  # Funzione 50
-        else:
-            log_message('Video or SRT path missing', 'error')  # Funzione 2
-        return
+# 69. get_handler_name: Returns the name of the handler used for a file
+def get_handler_name(file_path):
+    """Returns the name of the handler used for a file."""
+    handler = get_handler(file_path)
+    return handler.__name__ if handler else None
 
-    # Check that --operation is provided if --play_video is not specified
-    if not args.operation and not args.upload_directory_to_azure and not args.download_directory_from_azure:
-        parser.error('--operation is required unless --play_video is specified or --upload_directory_to_azure or --download_directory_from_azure is used')
+# 70. ShardedJsonlWriter: Streams extracted documents into size-rotated JSONL shards
+class ShardedJsonlWriter:
+    """Streams extracted documents into size-rotated JSONL shards with an index file."""
 
-    print(f"Operation: {args.operation}")  # Stampa di debug
-    print(f"Upload to Azure: {args.upload_directory_to_azure}")  # Stampa di debug
-    print(f"Download from Azure: {args.download_directory_from_azure}")  # Stampa di debug
+    def __init__(self, output_dir, shard_size=None, prefix='shard'):
+        self.output_dir = output_dir
+        self.shard_size = shard_size or DEFAULT_SHARD_SIZE
+        self.prefix = prefix
+        self.index_path = os.path.join(output_dir, f'{prefix}_index.json')
+        os.makedirs(output_dir, exist_ok=True)
+        # Continue the numbering of a previous run: new records always go to new shards
+        self.index = {'shards': [], 'retired': []}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                self.index = json.load(index_file)
+        self.file = None
+        self.shard = None
 
-    if args.upload_directory_to_azure:  # Funzione 58
-        if config.get('use_azure', False):
-            print(f"Uploading directory {args.directory_path} to Azure container {args.container_name}")  # Stampa di debug
-            upload_directory_to_azure(args.directory_path, args.container_name)  # Funzione 58
-        else:
-            log_message('Azure integration is disabled', 'error')  # Funzione 2
-    elif args.download_directory_from_azure:  # Funzione 51
-        if config.get('use_azure', False):
-            print(f"Downloading directory {args.azure_directory} from Azure container {args.container_name} to {args.download_path}")  # Stampa di debug
-            download_directory_from_azure(args.container_name, args.azure_directory, args.download_path)  # Funzione 51
-        else:
-            log_message('Azure integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "upload_gdrive":  # Funzione 30
-        if config.get('use_gdrive', False):
-            upload_to_gdrive(credentials, args.file_path, args.folder_id)  # Funzione 30
-        else:
-            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "download_gdrive":  # Funzione 34
-        if config.get('use_gdrive', False):
-            download_from_gdrive(credentials, args.file_id, args.download_path)  # Funzione 34
-        else:
-            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "download_all_gdrive":  # Funzione 35
-        if config.get('use_gdrive', False):
-            download_all_files_from_gdrive(credentials, args.output_dir)  # Funzione 35
-        else:
-            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "create_gdrive_folder":  # Funzione 31
-        if config.get('use_gdrive', False):
-            folder_id = create_folder_on_gdrive(credentials, args.folder_id)  # Funzione 31
-            if folder_id:
-                print(f"{folder_id}")
+    def _open_shard(self):
+        shard_name = f'{self.prefix}_{len(self.index["shards"]):05d}.jsonl'
+        self.shard = {'file': shard_name, 'records': 0, 'bytes': 0}
+        self.index['shards'].append(self.shard)
+        self.file = open(os.path.join(self.output_dir, shard_name), 'wb', buffering=WRITE_BUFFER_SIZE)
+
+    def write(self, path, handler, text):
+        """Appends a record and returns its location as 'shard_file#line'."""
+        encoded_text = text.encode('utf-8')
+        record = {'path': path, 'handler': handler, 'bytes': len(encoded_text), 'text': text}
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        if self.file is None or (self.shard['records'] and self.shard['bytes'] + len(line) > self.shard_size):
+            self._rotate()
+        self.file.write(line)
+        self.shard['records'] += 1
+        self.shard['bytes'] += len(line)
+        return f"{self.shard['file']}#{self.shard['records']}"
+
+    def retire(self, location):
+        """Marks a record written by a previous run as superseded."""
+        self.index['retired'].append(location)
+
+    def rollback(self, first_shard, last_record=None):
+        """Drops the records written after last_record ('shard_file#line') by a run that started at shard first_shard.
+
+        Used when resuming a job: the shards of the interrupted run are cut after the last record
+        of its journal and the index is rebuilt from what is left on disk.
+        """
+        last_file, last_line = last_record.split('#') if last_record else (None, 0)
+        shards = self.index['shards'][:first_shard]
+        for number in itertools.count(first_shard):
+            shard_name = f'{self.prefix}_{number:05d}.jsonl'
+            shard_path = os.path.join(self.output_dir, shard_name)
+            if not os.path.exists(shard_path):
+                break
+            records = 0
+            size = 0
+            if last_file is not None:
+                with open(shard_path, 'r+b') as shard_file:
+                    for line in shard_file:
+                        # A line without its newline was cut by the crash
+                        if (shard_name == last_file and records == int(last_line)) or not line.endswith(b'\n'):
+                            break
+                        records += 1
+                        size += len(line)
+                    shard_file.truncate(size)
+                if shard_name == last_file:
+                    last_file = None
+            if records:
+                shards.append({'file': shard_name, 'records': records, 'bytes': size})
             else:
-                log_message('Failed to create folder on Google Drive', 'error')  # Funzione 2
-        else:
-            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "upload_json_to_gdrive":  # Funzione 32
-        if config.get('use_gdrive', False):
-            upload_json_to_gdrive(credentials, args.directory_path, args.folder_id)  # Funzione 32
-        else:
-            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "upload_s3":  # Funzione 36
-        if config.get('use_s3', False):
-            upload_to_s3(args.file_path, args.bucket_name)  # Funzione 36
-        else:
-            log_message('S3 integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "download_s3":  # Funzione 37
-        if config.get('use_s3', False):
-            download_from_s3(args.file_key, args.bucket_name, args.download_path)  # Funzione 37
-        else:
-            log_message('S3 integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "create_s3_folder":  # Funzione 38
-        if config.get('use_s3', False):
-            create_folder_on_s3(args.bucket_name, args.folder_id)  # Funzione 38
-        else:
-            log_message('S3 integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "upload_json_to_s3":  # Funzione 39
-        if config.get('use_s3', False):
-            upload_json_to_s3(args.directory_path, args.bucket_name, args.folder_id)  # Funzione 39
-        else:
-            log_message('S3 integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "upload_azure":  # Funzione 41
-        if config.get('use_azure', False):
-            upload_to_azure(args.file_path, args.container_name)  # Funzione 41
-        else:
-            log_message('Azure integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "download_azure":  # Funzione 42
-        if config.get('use_azure', False):
-            download_from_azure(args.blob_name, args.container_name, args.download_path)  # Funzione 42
+                os.remove(shard_path)
+        self.index['shards'] = shards
+        self._write_index()
+
+    def _rotate(self):
+        if self.file is not None:
+            self.file.close()
+            log_message('output_written', 'info', os.path.join(self.output_dir, self.shard['file']))
+            self._write_index()
+        self._open_shard()
+
+    def _write_index(self):
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as index_file:
+            json.dump(self.index, index_file, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def close(self):
+        """Flushes the current shard and writes the shard index."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            log_message('output_written', 'info', os.path.join(self.output_dir, self.shard['file']))
+        self._write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# 71. register_handler: Registers a handler for one or more file extensions
+def register_handler(extensions, handler, modules=(), version=1):
+    """Registers a handler for one or more file extensions."""
+    for extension in extensions:
+        FILE_HANDLERS[extension.lower()] = handler
+    HANDLER_MODULES[handler.__name__] = list(modules)
+    HANDLER_VERSIONS[handler.__name__] = version
+
+# 72. get_handler: Returns the registered handler for a file, if any
+def get_handler(file_path):
+    """Returns the registered handler for a file, if any."""
+    return FILE_HANDLERS.get(os.path.splitext(file_path)[1].lower())
+
+# 73. get_gdrive_service: Returns the Google Drive service, building it on first use
+def get_gdrive_service(config):
+    """Returns the Google Drive service, building it on first use."""
+    if 'gdrive' not in cloud_clients:
+        from google.oauth2 import service_account
+        from googleapiclient.discovery import build
+        credentials = service_account.Credentials.from_service_account_file(
+            config['google_application_credentials'],
+            scopes=config['gdrive_scopes']
+        )
+        cloud_clients['gdrive'] = build('drive', 'v3', credentials=credentials)
+        log_message('gdrive_service_created', 'info')
+    return cloud_clients['gdrive']
+
+# 74. compile_keywords: Compiles all keywords into a single case-insensitive matcher
+def compile_keywords(keywords):
+    """Compiles all keywords into a single case-insensitive matcher.
+
+    Keywords are regular expressions. The matcher finds every keyword in one left-to-right
+    pass and its matches never overlap: scanning resumes after the end of each match. At a
+    given position the alternatives are tried from the longest keyword to the shortest, so
+    with plain-text keywords the leftmost match is also the longest one ("Articolo" wins
+    over "Art"). Returns None when there are no keywords.
+
+    Since the keywords share one pattern, a keyword cannot refer to its own groups
+    (backreferences such as \\1 or (?P=name), conditionals): such keywords raise ValueError.
+    Inline flags at the start of a keyword, such as (?s), only apply to that keyword.
+    """
+    keywords = [keyword for keyword in dict.fromkeys(keywords or []) if keyword]
+    if not keywords:
+        return None
+    alternatives = {}
+    for keyword in keywords:
+        re.compile(keyword)  # An invalid keyword is reported on its own, not as part of the alternation
+        if any(token.group(1) for token in KEYWORD_TOKENS.finditer(keyword)):
+            log_message('error_keyword_group_reference', 'error', keyword)
+            raise ValueError(lang.get('error_keyword_group_reference', 'error_keyword_group_reference').format(keyword))
+        # Global flags are only allowed at the start of a whole pattern: they become flags of the keyword group
+        flags = ''
+        pattern = keyword
+        while (leading := KEYWORD_GLOBAL_FLAGS.match(pattern)):
+            flags += leading.group(1)
+            pattern = pattern[leading.end():]
+        alternatives[keyword] = f'(?{flags}:{pattern})' if flags else f'(?:{pattern})'
+    ordered = sorted(keywords, key=len, reverse=True)
+    return re.compile('|'.join(alternatives[keyword] for keyword in ordered), re.IGNORECASE)
+
+# 75. segment_text_to_json: Segments an extracted text by keywords and writes its JSON file
+def segment_text_to_json(file_path, content, output_dir, matcher):
+    """Segments an extracted text by keywords and writes its JSON file."""
+    content = get_extracted_text(content)
+    if not content or content.startswith("Unsupported"):
+        return None
+    json_data = process_text_with_keywords(content, matcher)
+    output_file = get_keywords_output_file(file_path, output_dir)
+    write_json(json_data, output_file)
+    return output_file
+
+# 76. get_keywords_output_file: Returns the JSON output path of a file for process_keywords
+def get_keywords_output_file(file_path, output_dir):
+    """Returns the JSON output path of a file for process_keywords."""
+    return os.path.join(output_dir, f'{os.path.splitext(os.path.basename(file_path))[0]}.json')
+
+# 77. iter_text_file_chunks: Reads a text file in chunks, with the same header/footer removal as handle_text_file
+def iter_text_file_chunks(file_path, chunk_size=None):
+    """Reads a text file in chunks, with the same header/footer removal as handle_text_file."""
+    chunk_size = chunk_size or DEFAULT_STREAM_CHUNK_SIZE
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        # remove_headers_footers only applies to texts with more than three lines
+        head = ''
+        while head.count('\n') < 3:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                yield head
+                return
+            head += chunk
+        # Drop the first line, then always hold back the last (possibly final) line
+        pending = head[head.index('\n') + 1:]
+        while True:
+            last_newline = pending.rfind('\n')
+            if last_newline > 0:
+                yield pending[:last_newline]
+                pending = pending[last_newline:]
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            pending += chunk
+
+# 78. iter_csv_file_chunks: Reads a CSV file in chunks, with the same output as handle_csv_file
+def iter_csv_file_chunks(file_path, chunk_size=None):
+    """Reads a CSV file in chunks, with the same output as handle_csv_file."""
+    chunk_size = chunk_size or DEFAULT_STREAM_CHUNK_SIZE
+    with open(file_path, mode='r', encoding='utf-8', newline='') as f:
+        parts = []
+        size = 0
+        separator = ''
+        for row in csv.reader(f):
+            line = separator + ','.join(row)
+            separator = '\n'
+            parts.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                yield ''.join(parts)
+                parts = []
+                size = 0
+        if parts:
+            yield ''.join(parts)
+
+# Readers able to stream a file without loading its whole text, by handler
+STREAMING_READERS = {
+    'handle_text_file': iter_text_file_chunks,
+    'handle_csv_file': iter_csv_file_chunks
+}
+
+# 79. iter_document_chunks: Returns the text of a document as an iterator of chunks
+def iter_document_chunks(file_path, chunk_size=None):
+    """Returns the text of a document as an iterator of chunks, or None if it cannot be processed."""
+    chunk_size = chunk_size or DEFAULT_STREAM_CHUNK_SIZE
+    reader = STREAMING_READERS.get(get_handler_name(file_path))
+    if reader:
+        return reader(file_path, chunk_size)
+    # Formats without a streaming reader are extracted as a whole and then chunked
+    content = get_extracted_text(handle_file(file_path)[0])
+    if not content or content.startswith("Unsupported"):
+        return None
+    return (content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+
+# 80. iter_keyword_sections: Segments a stream of text chunks by keywords
+def iter_keyword_sections(chunks, keywords, window=None, max_content_size=None):
+    """Segments a stream of text chunks by keywords, yielding {"title", "content"} records.
+
+    Gives the same records as process_text_with_keywords on the whole text, as long as no
+    keyword match is longer than window characters: the last window characters of each
+    chunk are carried over and scanned again with the next one, so matches that span a chunk
+    boundary are not lost. Memory is bounded by the chunk size plus the content of one
+    section; sections longer than max_content_size are split into consecutive records with
+    the same title.
+    """
+    matcher = keywords if isinstance(keywords, re.Pattern) else compile_keywords(keywords)
+    if matcher is None:
+        return
+    window = window or KEYWORD_WINDOW
+    max_content_size = max_content_size or MAX_SECTION_CONTENT_SIZE
+    title = None
+    content = []
+    content_size = 0
+    buffer = ''
+    chunks = iter(chunks)
+    done = False
+    while not done:
+        chunk = next(chunks, None)
+        if chunk is None:
+            done = True
         else:
-            log_message('Azure integration is disabled', 'error')  # Funzione 2
-    elif args.operation == "create_azure_folder":  # Funzione 43
+            buffer += chunk
+        # Matches ending inside the carry-over window may still grow or span into the next chunk
+        limit = len(buffer) if done else len(buffer) - window
+        position = 0
+        safe = limit
+        for match in matcher.finditer(buffer):
+            if match.end() > limit:
+                safe = match.start()
+                break
+            if title is not None:
+                content.append(buffer[position:match.start()])
+                yield {"title": title, "content": ''.join(content).strip()}
+            title = match.group()
+            content = []
+            content_size = 0
+            position = match.end()
+        safe = max(safe, position)
+        if title is not None and safe > position:
+            content.append(buffer[position:safe])
+            content_size += safe - position
+            if content_size > max_content_size:
+                yield {"title": title, "content": ''.join(content).strip()}
+                content = []
+                content_size = 0
+        buffer = buffer[safe:]
+    if title is not None:
+        yield {"title": title, "content": ''.join(content).strip()}
+
+# 81. write_json_stream: Writes JSON records to file one at a time
+def write_json_stream(records, output_file):
+    """Writes JSON records to file one at a time, in the same layout as write_json."""
+    tmp_path = f'{output_file}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as json_file:
+        json_file.write('[')
+        count = 0
+        for record in records:
+            serialized = json.dumps(record, indent=4, ensure_ascii=False).replace('\n', '\n    ')
+            json_file.write(('\n    ' if count == 0 else ',\n    ') + serialized)
+            count += 1
+        json_file.write('\n]' if count else ']')
+    os.replace(tmp_path, output_file)
+    log_message('json_file_written', 'info', output_file)
+    return count
+
+# 82. segment_file_to_json: Streams a file through keyword segmentation into its JSON file
+def segment_file_to_json(file_path, output_dir, matcher, chunk_size=None):
+    """Streams a file through keyword segmentation into its JSON file.
+
+    Returns the JSON file, None if the file has nothing to segment, or False if it failed.
+    """
+    output_file = get_keywords_output_file(file_path, output_dir)
+    try:
+        chunks = iter_document_chunks(file_path, chunk_size)
+        if chunks is None:
+            return None
+        write_json_stream(iter_keyword_sections(chunks, matcher), output_file)
+        log_message('json_data_created', 'info')
+        return output_file
+    except PermissionError:
+        log_message('error_permission_denied', 'error', output_file)
+    except Exception as e:
+        log_message('error_write_json', 'error', output_file, str(e))
+    if os.path.exists(f'{output_file}.tmp'):
+        os.remove(f'{output_file}.tmp')
+    return False
+
+# 83. TranscriptionError: Raised when a speech recognition request fails
+class TranscriptionError(Exception):
+    """Raised when a speech recognition request fails."""
+
+# 84. get_recognizer: Returns the speech recognizer of the current thread
+def get_recognizer():
+    """Returns the speech recognizer of the current thread, creating it on first use."""
+    if not hasattr(recognizers, 'recognizer'):
+        import speech_recognition as sr
+        recognizers.recognizer = sr.Recognizer()
+    return recognizers.recognizer
+
+# 85. recognize_google_audio: Transcribes an AudioData with Google Speech Recognition
+def recognize_google_audio(audio_data, language):
+    """Transcribes an AudioData with Google Speech Recognition, returning None if speech is not understood."""
+    import speech_recognition as sr
+    try:
+        return get_recognizer().recognize_google(audio_data, language=language)
+    except sr.UnknownValueError:
+        return None
+    except sr.RequestError as e:
+        raise TranscriptionError(str(e))
+
+# 86. audio_segment_to_audio_data: Converts a pydub AudioSegment to an in-memory AudioData
+def audio_segment_to_audio_data(segment):
+    """Converts a pydub AudioSegment to an in-memory mono AudioData."""
+    import speech_recognition as sr
+    segment = segment.set_channels(1)
+    return sr.AudioData(segment.raw_data, segment.frame_rate, segment.sample_width)
+
+# 87. transcribe_chunks: Transcribes a batch of audio chunks, reporting failures instead of raising
+def transcribe_chunks(backend, language, audio_chunks):
+    """Transcribes a batch of (start, end, audio) chunks and returns a (start, end, text, error) tuple per chunk."""
+    results = run_transcription_batch(backend, [audio for _, _, audio in audio_chunks], language)
+    return [(start, end, text, error) for (start, end, _), (text, error) in zip(audio_chunks, results)]
+
+# 88. write_srt_from_chunks: Transcribes audio chunks on a bounded thread pool and writes the SRT cues in order
+def write_srt_from_chunks(audio_chunks, output_file, language=None, workers=1, backend=None, batch_size=None,
+                          journal=None):
+    """Transcribes (start, end, audio) chunks on a bounded thread pool and writes the SRT cues in order.
+
+    start and end are the position of the chunk in the media, in seconds, and are the times of its cue.
+
+    Chunks are sent to the transcription backend (default: the one set with
+    --transcription_backend) in batches of batch_size, and up to workers batches are in
+    flight at the same time. With a job journal, the chunks it lists as completed are not
+    transcribed again and the SRT file goes on from the last committed cue. Returns the
+    number of cues written and the number of chunks whose transcription failed.
+    """
+    backend = backend or get_transcription_backend()
+    language = get_transcription_language(language)
+    batch_size = batch_size or transcription_settings.get('batch_size', 1)
+    state = journal.get('srt', {}) if journal else {}
+    chunks, cue, offset = (state.get(key, 0) for key in ('chunks', 'cues', 'offset'))
+    if chunks:
+        # Chunks are cut the same way on every run: the completed ones are decoded but not transcribed
+        audio_chunks = itertools.islice(audio_chunks, chunks, None)
+    transcribe = functools.partial(transcribe_chunks, backend, language)
+    batches = map_in_order(transcribe, iter_batches(audio_chunks, batch_size), workers, ThreadPoolExecutor)
+    results = itertools.chain.from_iterable(batches)
+    with open(output_file, 'r+' if offset else 'w') as file:
+        if offset:
+            file.seek(offset)
+            file.truncate()
+        flush_srt = functools.partial(sync_output_file, file)
+        if journal:
+            journal.before_flush.append(flush_srt)
+        failed = 0
+        for i, (start, end, text, error) in enumerate(results, chunks):
+            if error is not None:
+                log_message('error_service_srt', 'error', i + 1, error)
+                failed += 1
+            elif not text:
+                log_message('warning_audio_not_understood', 'warning', i + 1)
+            else:
+                cue += 1
+                file.write(f"{cue}\n")
+                file.write(f"{format_time(start)} --> {format_time(end)}\n")
+                file.write(f"{text}\n\n")
+                log_message('info_generated_srt_segment', 'info', i + 1)
+            # The journal only goes as far as the first failed chunk: --resume transcribes again from there
+            if journal and not failed:
+                journal.record(f'chunk {i + 1}', srt={'chunks': i + 1, 'cues': cue, 'offset': file.tell()})
+        if journal:
+            journal.flush()
+            journal.before_flush.remove(flush_srt)
+    return cue, failed
+
+# 89. audio_segment_to_samples: Returns the PCM samples of an AudioSegment as a NumPy array
+def audio_segment_to_samples(sound):
+    """Returns the interleaved PCM samples of an AudioSegment as a NumPy array, without copying."""
+    import numpy as np
+    dtypes = {1: np.int8, 2: np.int16, 4: np.int32}
+    return np.frombuffer(sound.raw_data, dtype=dtypes[sound.sample_width])
+
+# 90. detect_nonsilent_ms: Finds the non-silent ranges of PCM audio with NumPy
+def detect_nonsilent_ms(samples, frame_rate, channels=1, min_silence_len=500, silence_thresh=None, silence_offset=14):
+    """Finds the non-silent ranges of PCM audio, in milliseconds.
+
+    Same rules as pydub's detect_nonsilent with a 1 ms seek step: a window of min_silence_len
+    ms is silent when its RMS is at or below silence_thresh dBFS (default: the dBFS of the
+    whole audio minus silence_offset). The energy of every millisecond is computed once on
+    the raw sample array, so each window costs two lookups in a cumulative sum.
+    """
+    max_amplitude = float(2 ** (8 * samples.dtype.itemsize - 1))
+    samples = samples[:len(samples) // channels * channels]
+    blocks = (samples[start:start + SILENCE_BLOCK_SIZE] for start in range(0, len(samples), SILENCE_BLOCK_SIZE))
+    energy = cumulative_ms_energy(blocks, frame_rate, channels)
+    return detect_nonsilent_from_energy(energy, channels, max_amplitude, min_silence_len, silence_thresh, silence_offset)
+
+# 91. detect_speech_ranges: Returns the chunks to transcribe as frame offsets
+def detect_speech_ranges(samples, frame_rate, channels=1, min_silence_len=500, silence_thresh=None,
+                         silence_offset=14, keep_silence=500):
+    """Returns the chunks split on silence as (start, end) frame offsets, like pydub's split_on_silence."""
+    nonsilent = detect_nonsilent_ms(samples, frame_rate, channels, min_silence_len, silence_thresh, silence_offset)
+    return pad_speech_ranges(nonsilent, len(samples) // channels, frame_rate, keep_silence)
+
+# 92. cumulative_ms_energy: Computes the cumulative energy of PCM audio at each millisecond boundary
+def cumulative_ms_energy(blocks, frame_rate, channels=1):
+    """Computes the cumulative energy of PCM sample blocks at each millisecond boundary.
+
+    The blocks are read one at a time, so the audio never has to be in memory as a whole.
+    Returns (cumulative, frame_bounds, total, frame_count), with the millisecond boundaries
+    placed on frames the way pydub slices them.
+    """
+    import numpy as np
+    frames_per_ms = frame_rate / 1000.0
+    parts = [np.zeros(1)]
+    total = 0.0
+    position = 0
+    next_ms = 1
+    for block in blocks:
+        if not len(block):
+            continue
+        block = block.astype(np.float64)
+        block_cumsum = np.cumsum(block * block)
+        end = position + len(block)
+        # Millisecond boundaries falling inside this block
+        last_ms = int((end / channels + 1) / frames_per_ms) + 1
+        bounds = (np.arange(next_ms, last_ms + 1) * frames_per_ms).astype(np.int64) * channels
+        bounds = bounds[:np.searchsorted(bounds, end, side='right')]
+        parts.append(total + block_cumsum[bounds - position - 1])
+        next_ms += len(bounds)
+        total += block_cumsum[-1]
+        position = end
+
+    frame_count = position // channels
+    length_ms = int(round(1000 * frame_count / frame_rate))
+    frame_bounds = np.minimum((np.arange(length_ms + 1) * frames_per_ms).astype(np.int64), frame_count)
+    cumulative = np.concatenate(parts)[:length_ms + 1]
+    # Boundaries past the last frame hold the energy of the whole audio
+    cumulative = np.concatenate((cumulative, np.full(length_ms + 1 - len(cumulative), total)))
+    return cumulative, frame_bounds, total, frame_count
+
+# 93. detect_nonsilent_from_energy: Finds the non-silent ranges of audio from its cumulative energy
+def detect_nonsilent_from_energy(energy, channels=1, max_amplitude=2.0 ** 15, min_silence_len=500, silence_thresh=None,
+                                 silence_offset=14):
+    """Finds the non-silent ranges, in milliseconds, of audio measured by cumulative_ms_energy."""
+    import numpy as np
+    cumulative, frame_bounds, total, frame_count = energy
+    length_ms = len(cumulative) - 1
+    if silence_thresh is None:
+        rms = np.floor(np.sqrt(total / max(frame_count * channels, 1)))
+        dbfs = 20 * np.log10(rms / max_amplitude) if rms > 0 else -np.inf
+        silence_thresh = dbfs - silence_offset
+    # pydub compares the integer RMS of a window (rounded down) with the threshold amplitude
+    threshold = (np.floor(10 ** (silence_thresh / 20.0) * max_amplitude) + 1) ** 2
+
+    if length_ms < min_silence_len:
+        return [[0, length_ms]]
+    window_energy = cumulative[min_silence_len:] - cumulative[:-min_silence_len]
+    window_samples = (frame_bounds[min_silence_len:] - frame_bounds[:-min_silence_len]) * channels
+    silent_starts = np.flatnonzero(window_energy < threshold * window_samples)
+    if len(silent_starts) == 0:
+        return [[0, length_ms]]
+
+    # A millisecond is silent when any silent window covers it
+    coverage = np.zeros(length_ms + 1, dtype=np.int64)
+    np.add.at(coverage, silent_starts, 1)
+    np.add.at(coverage, silent_starts + min_silence_len, -1)
+    silent = np.cumsum(coverage)[:length_ms] > 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([True], silent, [True])).astype(np.int8)))
+    return [[int(start), int(end)] for start, end in zip(edges[::2], edges[1::2])]
+
+# 94. pad_speech_ranges: Pads non-silent ranges with silence and converts them to frame offsets
+def pad_speech_ranges(nonsilent, frame_count, frame_rate, keep_silence=500):
+    """Pads non-silent ranges (in ms) with keep_silence ms and returns them as (start, end) frame offsets."""
+    length_ms = int(round(1000 * frame_count / frame_rate))
+    ranges = [[start - keep_silence, end + keep_silence] for start, end in nonsilent]
+    # Overlapping padding is split half and half between neighbouring chunks
+    for previous, current in zip(ranges, ranges[1:]):
+        if current[0] < previous[1]:
+            previous[1] = (previous[1] + current[0]) // 2
+            current[0] = previous[1]
+    frames_per_ms = frame_rate / 1000.0
+    return [(min(int(max(start, 0) * frames_per_ms), frame_count), min(int(min(end, length_ms) * frames_per_ms), frame_count))
+            for start, end in ranges]
+
+# 95. get_ffmpeg_path: Returns the ffmpeg executable
+def get_ffmpeg_path():
+    """Returns the ffmpeg executable on the PATH, or the one bundled with imageio-ffmpeg."""
+    ffmpeg_path = shutil.which('ffmpeg')
+    if ffmpeg_path:
+        return ffmpeg_path
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+# 96. iter_ffmpeg_pcm: Streams the audio track of a media file from ffmpeg as PCM blocks
+def iter_ffmpeg_pcm(file_path, frame_rate=AUDIO_FRAME_RATE, block_size=PCM_BLOCK_SIZE):
+    """Streams the audio track of a media file from ffmpeg as blocks of mono 16-bit PCM bytes.
+
+    Only the audio stream is decoded and it is read from a pipe, so no WAV file is written
+    and the audio is never in memory as a whole.
+    """
+    command = [get_ffmpeg_path(), '-nostdin', '-v', 'error', '-i', file_path, '-vn', '-sn', '-dn',
+               '-ac', '1', '-ar', str(frame_rate), '-acodec', 'pcm_s16le', '-f', 's16le', '-']
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # Only the time spent waiting for ffmpeg is the extraction: the consumer runs between two blocks
+    waited = 0.0
+    produced = 0
+    failed = False
+    try:
+        pending = b''
+        while True:
+            start = time.perf_counter()
+            data = process.stdout.read(block_size)
+            waited += time.perf_counter() - start
+            produced += len(data)
+            if not data:
+                break
+            if pending:
+                data = pending + data
+            usable = len(data) - len(data) % AUDIO_SAMPLE_WIDTH
+            pending = data[usable:]
+            if usable:
+                yield data[:usable]
+        error = process.stderr.read().decode(errors='replace').strip()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg: {error}")
+    except Exception:
+        failed = True
+        raise
+    finally:
+        run_metrics.add('extract_audio', errors=int(failed), seconds=waited,
+                        bytes_in=get_data_size(file_path), bytes_out=produced)
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+# 97. iter_pcm_ranges: Slices frame ranges out of a stream of PCM blocks
+def iter_pcm_ranges(blocks, ranges, frame_size=AUDIO_SAMPLE_WIDTH):
+    """Yields the PCM bytes of each (start, end) frame range, sorted by start, from a stream of PCM blocks.
+
+    Only the frames from the start of the current range to the end of the last block read
+    are kept in memory.
+    """
+    blocks = iter(blocks)
+    buffer = bytearray()
+    buffer_start = 0
+    for start, end in ranges:
+        while True:
+            if start > buffer_start:
+                drop = min((start - buffer_start) * frame_size, len(buffer))
+                del buffer[:drop]
+                buffer_start += drop // frame_size
+            if (end - buffer_start) * frame_size <= len(buffer):
+                break
+            block = next(blocks, None)
+            if block is None:
+                break
+            buffer += block
+        yield bytes(buffer[(start - buffer_start) * frame_size:(end - buffer_start) * frame_size])
+
+# 98. iter_media_chunks: Streams the speech chunks of an audio or video file
+def iter_media_chunks(file_path, min_silence_len=500, silence_offset=14, keep_silence=500):
+    """Yields the chunks of an audio or video file split on silence, as (start, end, AudioData).
+
+    start and end are the offsets of the chunk in the media, in seconds: the silences dropped
+    between chunks are not part of any chunk, so the sum of the chunk lengths falls behind.
+
+    ffmpeg decodes the audio twice: the first pass measures its loudness, which sets the
+    silence threshold, the second one slices the chunks as they are consumed.
+    """
+    import numpy as np
+    import speech_recognition as sr
+    blocks = (np.frombuffer(data, dtype=np.int16) for data in iter_ffmpeg_pcm(file_path))
+    energy = cumulative_ms_energy(blocks, AUDIO_FRAME_RATE)
+    nonsilent = detect_nonsilent_from_energy(energy, 1, 2.0 ** (8 * AUDIO_SAMPLE_WIDTH - 1), min_silence_len,
+                                             silence_offset=silence_offset)
+    ranges = pad_speech_ranges(nonsilent, energy[3], AUDIO_FRAME_RATE, keep_silence)
+    del energy
+
+    pcm = iter_ffmpeg_pcm(file_path)
+    try:
+        for (start, end), data in zip(ranges, iter_pcm_ranges(pcm, ranges)):
+            yield start / AUDIO_FRAME_RATE, end / AUDIO_FRAME_RATE, sr.AudioData(data, AUDIO_FRAME_RATE, AUDIO_SAMPLE_WIDTH)
+    finally:
+        pcm.close()
+
+# 99. transcribe_media: Transcribes an audio or video file chunk by chunk
+def transcribe_media(file_path, language=None, backend=None, min_silence_len=500, silence_offset=14, keep_silence=500,
+                     transcript_cache=None, batch_size=None):
+    """Transcribes an audio or video file chunk by chunk, returning None if no speech was understood."""
+    language = get_transcription_language(language)
+    batch_size = batch_size or transcription_settings.get('batch_size', 1)
+    cache = open_transcript_cache(transcript_cache)
+    texts = []
+    try:
+        backend = with_transcript_cache(backend or get_transcription_backend(), cache)
+        audio_chunks = (audio for _, _, audio in iter_media_chunks(file_path, min_silence_len, silence_offset, keep_silence))
+        for batch in iter_batches(audio_chunks, batch_size):
+            for text, error in run_transcription_batch(backend, batch, language):
+                if error is not None:
+                    raise TranscriptionError(error)
+                texts.append(text)
+    finally:
+        if cache:
+            cache.close()
+    return ' '.join(text for text in texts if text) or None
+
+# 100. TranscriptCache: Persistent cache of chunk transcripts keyed by audio fingerprint
+class TranscriptCache:
+    """Persistent SQLite cache of chunk transcripts, keyed by audio fingerprint, language and backend."""
+
+    def __init__(self, cache_path, max_size=None):
+        self.cache_path = cache_path
+        self.max_size = max_size or DEFAULT_TRANSCRIPT_CACHE_MAX_SIZE
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        # Chunks are transcribed on a thread pool, so the connection is shared under the lock
+        self.connection = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS transcripts "
+                                "(key TEXT PRIMARY KEY, text TEXT, size INTEGER, last_used REAL)")
+        self.connection.commit()
+
+    def key_for(self, audio, language, backend):
+        """Returns the cache key of an AudioData chunk: PCM hash plus language and backend."""
+        digest = hashlib.sha256(f"{audio.sample_rate}:{audio.sample_width}:".encode())
+        digest.update(audio.frame_data)
+        return f"{digest.hexdigest()}-{language}-{backend}"
+
+    def get(self, key):
+        """Returns (found, text) for a key; text is None for chunks whose speech was not understood."""
+        with self.lock:
+            row = self.connection.execute("SELECT text FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            # Mark the transcript as recently used for LRU eviction
+            self.connection.execute("UPDATE transcripts SET last_used = ? WHERE key = ?", (datetime.now().timestamp(), key))
+            self.connection.commit()
+            return True, row[0]
+
+    def put(self, key, text):
+        """Stores the transcript of a chunk."""
+        size = len(key) + len((text or '').encode('utf-8'))
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?)",
+                                    (key, text, size, datetime.now().timestamp()))
+            self.connection.commit()
+
+    def prune(self):
+        """Evicts the least recently used transcripts until the cache fits in max_size bytes."""
+        with self.lock:
+            total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+            evicted = []
+            if total_size > self.max_size:
+                for key, size in self.connection.execute("SELECT key, size FROM transcripts ORDER BY last_used"):
+                    if total_size <= self.max_size:
+                        break
+                    evicted.append((key,))
+                    total_size -= size
+                self.connection.executemany("DELETE FROM transcripts WHERE key = ?", evicted)
+                self.connection.commit()
+        if evicted:
+            log_message('transcript_cache_pruned', 'info', len(evicted), self.cache_path)
+        return len(evicted)
+
+    def close(self):
+        """Evicts the oldest transcripts if needed, logs the hit/miss counters and closes the database."""
+        self.prune()
+        log_message('transcript_cache_stats', 'info', self.hits, self.misses, self.cache_path)
+        self.connection.close()
+
+# 101. TranscriptionBackend: Base class of the speech recognition engines
+class TranscriptionBackend(ABC):
+    """Base class of the speech recognition engines used to transcribe audio chunks."""
+
+    name = None
+
+    @abstractmethod
+    def transcribe(self, audio, language):
+        """Returns the text of an AudioData chunk, or None if the speech was not understood.
+
+        Raises TranscriptionError when the request fails.
+        """
+
+    def transcribe_batch(self, chunks, language):
+        """Transcribes a list of AudioData chunks and returns a (text, error) pair per chunk, in order."""
+        results = []
+        for audio in chunks:
+            try:
+                results.append((self.transcribe(audio, language), None))
+            except TranscriptionError as e:
+                results.append((None, str(e)))
+        return results
+
+# 102. with_transcript_cache: Wraps a transcription backend with the transcript cache
+def with_transcript_cache(backend, cache):
+    """Returns the backend wrapped with the transcript cache, or unchanged if there is no cache."""
+    if cache is None:
+        return backend
+    return CachedTranscriptionBackend(backend, cache)
+
+# 103. open_transcript_cache: Opens the transcript cache configured for the run
+def open_transcript_cache(cache_path=None, max_size=None):
+    """Opens the transcript cache at cache_path, by default the one set with --transcript_cache, or returns None."""
+    cache_path = cache_path or transcription_settings.get('cache_path')
+    if not cache_path:
+        return None
+    return TranscriptCache(cache_path, max_size or transcription_settings.get('cache_max_size'))
+
+# 104. CachedTranscriptionBackend: Sends to a backend only the chunks missing from the transcript cache
+class CachedTranscriptionBackend(TranscriptionBackend):
+    """Sends to a backend only the chunks missing from the transcript cache."""
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.name = backend.name
+
+    def transcribe(self, audio, language):
+        text, error = self.transcribe_batch([audio], language)[0]
+        if error is not None:
+            raise TranscriptionError(error)
+        return text
+
+    def transcribe_batch(self, chunks, language):
+        keys = [self.cache.key_for(audio, language, self.name) for audio in chunks]
+        cached = [self.cache.get(key) for key in keys]
+        results = [(text, None) for _, text in cached]
+        misses = [i for i, (found, _) in enumerate(cached) if not found]
+        if misses:
+            transcribed = run_transcription_batch(self.backend, [chunks[i] for i in misses], language)
+            for i, (text, error) in zip(misses, transcribed):
+                results[i] = (text, error)
+                # Failed requests are not cached
+                if error is None:
+                    self.cache.put(keys[i], text)
+        return results
+
+# 105. GoogleTranscriptionBackend: Google Speech Recognition
+class GoogleTranscriptionBackend(TranscriptionBackend):
+    """Google Speech Recognition, with one recognizer per thread."""
+
+    name = 'google'
+
+    def transcribe(self, audio, language):
+        return recognize_google_audio(audio, language)
+
+# 106. FakeTranscriptionBackend: Deterministic offline backend for tests and benchmarks
+class FakeTranscriptionBackend(TranscriptionBackend):
+    """Deterministic offline backend for tests and benchmarks: describes each chunk instead of recognizing it.
+
+    latency simulates the round trip of one request, in seconds.
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def describe(self, audio, language):
+        """Returns the fake transcript of a chunk: its language, fingerprint and duration."""
+        if not audio.frame_data:
+            return None
+        duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        return f"[{language}] {hashlib.sha256(audio.frame_data).hexdigest()[:12]} {duration:.2f}s"
+
+    def transcribe(self, audio, language):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.describe(audio, language)
+
+    def transcribe_batch(self, chunks, language):
+        # A batch costs a single round trip
+        if self.latency:
+            time.sleep(self.latency)
+        return [(self.describe(audio, language), None) for audio in chunks]
+
+TRANSCRIPTION_BACKENDS = {
+    'google': GoogleTranscriptionBackend,
+    'fake': FakeTranscriptionBackend
+}
+
+# 107. get_transcription_backend: Returns a transcription backend by name
+def get_transcription_backend(name=None):
+    """Returns a transcription backend by name, by default the one set with --transcription_backend."""
+    name = name or transcription_settings.get('backend', DEFAULT_TRANSCRIPTION_BACKEND)
+    return TRANSCRIPTION_BACKENDS[name]()
+
+# 108. get_transcription_language: Returns the transcription language to use
+def get_transcription_language(language=None):
+    """Returns the given transcription language, by default the one set with --transcription_lang."""
+    return language or transcription_settings.get('language', DEFAULT_TRANSCRIPTION_LANGUAGE)
+
+# 109. iter_batches: Groups the items of an iterable into lists
+def iter_batches(items, batch_size):
+    """Groups the items of an iterable into lists of at most batch_size items."""
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, max(batch_size, 1)))
+        if not batch:
+            return
+        yield batch
+
+# 110. get_s3_client: Returns the shared client of an S3-compatible provider
+def get_s3_client(config=None, provider='s3'):
+    """Returns the shared boto3 client of an S3-compatible provider ('s3' or 'aruba'), creating it on first use.
+
+    boto3 clients are thread-safe, so one client and its connection pool serve all the
+    concurrent transfers of the process. Credentials, region and endpoint (for Aruba, or a
+    local S3 stand-in) are read from the aws_* or aruba_* keys of the configuration, then
+    from the usual boto3 sources.
+    """
+    if provider not in cloud_clients:
+        import boto3
+        from botocore.config import Config
+        config = config or {}
+        prefix = 'aws' if provider == 's3' else provider
+        options = {}
+        for option, key in (('aws_access_key_id', 'access_key_id'), ('aws_secret_access_key', 'secret_access_key'),
+                            ('region_name', 'region'), ('endpoint_url', 'endpoint_url')):
+            if config.get(f'{prefix}_{key}'):
+                options[option] = config[f'{prefix}_{key}']
+        # Every object worker can have all of its multipart parts in flight
+        pool_size = (transfer_settings.get('workers', DEFAULT_TRANSFER_WORKERS) *
+                     transfer_settings.get('multipart_concurrency', DEFAULT_MULTIPART_CONCURRENCY))
+        cloud_clients[provider] = boto3.session.Session().client(
+            's3', config=Config(max_pool_connections=pool_size), **options)
+        log_message('storage_client_created', 'info', provider)
+    return cloud_clients[provider]
+
+# 111. get_transfer_config: Returns the boto3 multipart transfer settings
+def get_transfer_config(chunk_size=None, concurrency=None):
+    """Returns the boto3 multipart settings: chunk size and parts transferred at once within an object."""
+    from boto3.s3.transfer import TransferConfig
+    chunk_size = chunk_size or transfer_settings.get('multipart_chunk_size', DEFAULT_MULTIPART_CHUNK_SIZE)
+    concurrency = concurrency or transfer_settings.get('multipart_concurrency', DEFAULT_MULTIPART_CONCURRENCY)
+    return TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size, max_concurrency=concurrency)
+
+# 112. transfer_s3_object: Uploads or downloads one object, reporting failures instead of raising
+def transfer_s3_object(client, bucket_name, transfer_config, provider, direction, paths):
+    """Uploads or downloads one (file_key, file_path) pair and returns True on success."""
+    file_key, file_path = paths
+    try:
+        with run_metrics.measure(f'{direction}_{provider}') as stage:
+            if direction == 'download':
+                os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+                client.download_file(bucket_name, file_key, file_path, Config=transfer_config)
+                stage.bytes_out = os.path.getsize(file_path)
+                log_message(f'success_download_{provider}', 'debug', file_key, bucket_name, file_path)
+            else:
+                stage.bytes_in = os.path.getsize(file_path)
+                client.upload_file(file_path, bucket_name, file_key, Config=transfer_config)
+                log_message(f'success_upload_{provider}', 'debug', file_path, bucket_name)
+        return True
+    except Exception as e:
+        log_message(f'error_{direction}_{provider}', 'error', file_key if direction == 'download' else file_path,
+                    bucket_name, str(e))
+        return False
+
+# 113. iter_s3_objects: Yields the objects of a bucket, page by page
+def iter_s3_objects(client, bucket_name, prefix=''):
+    """Yields the objects of a bucket under a prefix, page by page, skipping folder placeholders."""
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            # Folders created with create_folder_on_s3/aruba are empty keys ending with '/'
+            if not obj['Key'].endswith('/'):
+                yield obj
+
+# 114. transfer_s3_objects: Transfers objects on a bounded thread pool
+def transfer_s3_objects(client, bucket_name, direction, paths, provider='s3', workers=None, transfer_config=None):
+    """Uploads or downloads (file_key, file_path) pairs on a bounded thread pool and returns (transferred, failed).
+
+    Objects are transferred workers at a time, and each large object in multipart chunks
+    with its own parts in flight, all through the same client.
+    """
+    transfer = functools.partial(transfer_s3_object, client, bucket_name, transfer_config or get_transfer_config(),
+                                 provider, direction)
+    return run_transfers(transfer, paths, direction, bucket_name, workers)
+
+# 115. iter_upload_paths: Pairs the files of a directory tree with their object keys
+def iter_upload_paths(directory_path, prefix=''):
+    """Yields (file_key, file_path) for the files of a directory tree, keeping their relative paths in the keys."""
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+    for file_path in iter_directory_files(directory_path):
+        yield prefix + os.path.relpath(file_path, directory_path).replace(os.sep, '/'), file_path
+
+# 116. upload_directory_to_s3: Uploads a directory to S3
+def upload_directory_to_s3(directory_path, bucket_name, s3_client, prefix='', workers=None):
+    """Uploads a directory to S3, several files at a time."""
+    return transfer_s3_objects(s3_client, bucket_name, 'upload', iter_upload_paths(directory_path, prefix), 's3', workers)
+
+# 117. upload_directory_to_aruba: Uploads a directory to Aruba Cloud Object Storage
+def upload_directory_to_aruba(directory_path, bucket_name, aruba_client, prefix='', workers=None):
+    """Uploads a directory to Aruba Cloud Object Storage, several files at a time."""
+    return transfer_s3_objects(aruba_client, bucket_name, 'upload', iter_upload_paths(directory_path, prefix), 'aruba',
+                               workers)
+
+# 118. get_azure_service_client: Returns the shared Azure Blob Storage client
+def get_azure_service_client(config=None):
+    """Returns the shared Azure BlobServiceClient, creating it on first use.
+
+    Its HTTP session, with a connection pool sized for the concurrent transfers, is shared
+    by every container and blob client. The connection string is read from the
+    azure_connection_string configuration key or from AZURE_STORAGE_CONNECTION_STRING (for
+    example the one of a local Azurite).
+    """
+    if 'azure' not in cloud_clients:
+        import requests
+        from azure.core.pipeline.transport import RequestsTransport
+        from azure.storage.blob import BlobServiceClient
+        config = config or {}
+        connection_string = config.get('azure_connection_string') or os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
+        pool_size = (transfer_settings.get('workers', DEFAULT_TRANSFER_WORKERS) *
+                     transfer_settings.get('multipart_concurrency', DEFAULT_MULTIPART_CONCURRENCY))
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        # Blobs larger than one chunk are split into blocks transferred max_concurrency at a time
+        chunk_size = transfer_settings.get('multipart_chunk_size', DEFAULT_MULTIPART_CHUNK_SIZE)
+        cloud_clients['azure'] = BlobServiceClient.from_connection_string(
+            connection_string, transport=RequestsTransport(session=session, session_owner=False),
+            max_block_size=chunk_size, max_single_put_size=chunk_size,
+            max_single_get_size=chunk_size, max_chunk_get_size=chunk_size)
+        log_message('storage_client_created', 'info', 'azure')
+    return cloud_clients['azure']
+
+# 119. run_transfers: Runs object transfers on a bounded thread pool
+def run_transfers(transfer, paths, direction, target, workers=None):
+    """Runs transfer on each (key, file_path) pair on a bounded thread pool and returns (transferred, failed).
+
+    In a batch job, the transfers completed by a previous run of the job are skipped.
+    """
+    workers = workers or transfer_settings.get('workers', DEFAULT_TRANSFER_WORKERS)
+    journal = transfer_settings.get('journal')
+    if journal:
+        paths = journal.iter_pending(paths, functools.partial(get_transfer_unit, direction))
+        transfer = functools.partial(run_journaled_transfer, journal, transfer, direction)
+    transferred = 0
+    failed = 0
+    for success in map_in_order(transfer, paths, workers, ThreadPoolExecutor):
+        if success:
+            transferred += 1
+        else:
+            failed += 1
+    log_message('transfer_completed', 'info', direction, transferred, failed, target)
+    return transferred, failed
+
+# 120. transfer_azure_blob: Uploads or downloads one blob, reporting failures instead of raising
+def transfer_azure_blob(container_client, max_concurrency, direction, paths):
+    """Uploads or downloads one (blob_name, file_path) pair through a container client and returns True on success."""
+    blob_name, file_path = paths
+    container_name = container_client.container_name
+    try:
+        with run_metrics.measure(f'{direction}_azure') as stage:
+            if direction == 'download':
+                os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+                tmp_path = f"{file_path}.tmp"
+                with open(tmp_path, 'wb') as file:
+                    stage.bytes_out = container_client.download_blob(blob_name, max_concurrency=max_concurrency).readinto(file)
+                os.replace(tmp_path, file_path)
+                log_message('success_download_azure', 'debug', blob_name, container_name, file_path)
+            else:
+                stage.bytes_in = os.path.getsize(file_path)
+                with open(file_path, 'rb') as data:
+                    container_client.upload_blob(blob_name, data, overwrite=True, max_concurrency=max_concurrency)
+                log_message('success_upload_azure', 'debug', file_path, container_name)
+        return True
+    except Exception as e:
+        log_message(f'error_{direction}_azure', 'error', blob_name if direction == 'download' else file_path,
+                    container_name, str(e))
+        if direction == 'download' and os.path.exists(f"{file_path}.tmp"):
+            os.remove(f"{file_path}.tmp")
+        return False
+
+# 121. transfer_azure_blobs: Transfers blobs of one container on a bounded thread pool
+def transfer_azure_blobs(container_client, direction, paths, workers=None, max_concurrency=None):
+    """Uploads or downloads (blob_name, file_path) pairs through one container client and returns (transferred, failed)."""
+    max_concurrency = max_concurrency or transfer_settings.get('multipart_concurrency', DEFAULT_MULTIPART_CONCURRENCY)
+    transfer = functools.partial(transfer_azure_blob, container_client, max_concurrency, direction)
+    return run_transfers(transfer, paths, direction, container_client.container_name, workers)
+
+# 122. iter_azure_blobs: Yields the blobs of a container, page by page
+def iter_azure_blobs(container_client, prefix=''):
+    """Yields the blobs of a container under a prefix, page by page, skipping folder placeholders."""
+    for blob in container_client.list_blobs(name_starts_with=prefix or None):
+        # Folders created with create_folder_on_azure are empty blobs ending with '/'
+        if not blob.name.endswith('/'):
+            yield blob
+
+# 123. TransferProgress: Thread-safe progress counters of a transfer
+class TransferProgress:
+    """Thread-safe file and byte counters of a transfer, logged at most once per interval."""
+
+    def __init__(self, target, interval=PROGRESS_LOG_INTERVAL):
+        self.target = target
+        self.interval = interval
+        self.files = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.last_log = time.monotonic()
+
+    def add_bytes(self, count):
+        """Counts transferred bytes, logging the progress if the interval has elapsed."""
+        with self.lock:
+            self.bytes += count
+            now = time.monotonic()
+            if now - self.last_log < self.interval:
+                return
+            self.last_log = now
+            files, size = self.files, self.bytes
+        log_message('transfer_progress', 'info', self.target, files, size / 1024 ** 2)
+
+    def add_file(self):
+        """Counts a completed file."""
+        with self.lock:
+            self.files += 1
+
+# 124. get_gdrive_http: Returns the Google Drive HTTP connection of the current thread
+def get_gdrive_http(service):
+    """Returns an authorized HTTP connection of the current thread, with the credentials of a Drive service."""
+    if getattr(gdrive_connections, 'service', None) is not service:
+        import httplib2
+        import google_auth_httplib2
+        gdrive_connections.http = google_auth_httplib2.AuthorizedHttp(service._http.credentials, http=httplib2.Http())
+        gdrive_connections.service = service
+    return gdrive_connections.http
+
+# 125. get_gdrive_chunk_size: Returns the chunk size of Google Drive downloads
+def get_gdrive_chunk_size():
+    """Returns the chunk size of Google Drive downloads, set with --multipart_chunk_size."""
+    return transfer_settings.get('multipart_chunk_size', DEFAULT_MULTIPART_CHUNK_SIZE)
+
+# 126. iter_gdrive_tree: Lists a Google Drive folder tree breadth-first
+def iter_gdrive_tree(service, folder_id, recursive=True, batch_size=GDRIVE_BATCH_SIZE):
+    """Lists a Google Drive folder tree breadth-first, yielding (relative_path, item) for files and subfolders.
+
+    Every folder is listed page by page, and the list calls of up to batch_size folders or
+    pages are sent together in one batch request.
+    """
+    pending = deque([(folder_id, '', None)])
+    while pending:
+        calls = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+        responses = {}
+
+        def collect(request_id, response, exception):
+            responses[request_id] = (response, exception)
+
+        batch = service.new_batch_http_request(callback=collect)
+        for index, (parent_id, _, page_token) in enumerate(calls):
+            batch.add(service.files().list(
+                q=f"'{parent_id}' in parents and trashed = false", spaces='drive', pageSize=GDRIVE_PAGE_SIZE,
+                pageToken=page_token, fields='nextPageToken, files(id, name, mimeType, size, md5Checksum)'),
+                request_id=str(index))
+        batch.execute()
+
+        for index, (parent_id, parent_path, _) in enumerate(calls):
+            response, exception = responses.get(str(index), (None, None))
+            if exception is not None or response is None:
+                log_message('error_list_gdrive', 'error', parent_id, str(exception))
+                continue
+            if response.get('nextPageToken'):
+                pending.append((parent_id, parent_path, response['nextPageToken']))
+            for item in response.get('files', []):
+                relative_path = os.path.join(parent_path, item['name'])
+                if item['mimeType'] == GDRIVE_FOLDER_MIME_TYPE and recursive:
+                    pending.append((item['id'], relative_path, None))
+                yield relative_path, item
+
+# 127. iter_gdrive_download_paths: Pairs the files of a Google Drive tree with their local paths
+def iter_gdrive_download_paths(service, folder_id, output_dir, recursive=True):
+    """Yields (file_id, file_path) for the files of a Google Drive tree, creating the local folders."""
+    for relative_path, item in iter_gdrive_tree(service, folder_id, recursive):
+        file_path = os.path.join(output_dir, relative_path)
+        if item['mimeType'] == GDRIVE_FOLDER_MIME_TYPE:
+            os.makedirs(file_path, exist_ok=True)
+        elif item['mimeType'].startswith('application/vnd.google-apps.'):
+            # Google Docs, Sheets and Slides have no binary content to download
+            log_message('warning_gdrive_native_file', 'warning', relative_path)
+        else:
+            yield item['id'], file_path
+
+# 128. download_gdrive_file: Downloads one Google Drive file, reporting failures instead of raising
+def download_gdrive_file(service, chunk_size, progress, paths):
+    """Downloads one (file_id, file_path) pair on the HTTP connection of the current thread and returns True on success."""
+    from googleapiclient.http import MediaIoBaseDownload
+    file_id, file_path = paths
+    tmp_path = f"{file_path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        request = service.files().get_media(fileId=file_id)
+        request.http = get_gdrive_http(service)
+        with run_metrics.measure('download_gdrive') as stage, open(tmp_path, 'wb') as file:
+            downloader = MediaIoBaseDownload(file, request, chunksize=chunk_size)
+            done = False
+            received = 0
+            while not done:
+                status, done = downloader.next_chunk(num_retries=TRANSFER_RETRIES)
+                progress.add_bytes(status.resumable_progress - received)
+                received = status.resumable_progress
+            stage.bytes_out = received
+        os.replace(tmp_path, file_path)
+        progress.add_file()
+        log_message('success_download_gdrive', 'debug', file_id, file_path)
+        return True
+    except Exception as e:
+        log_message('error_download_gdrive', 'error', file_id, str(e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+# 129. download_gdrive_files: Downloads Google Drive files on a bounded thread pool
+def download_gdrive_files(service, paths, target, workers=None):
+    """Downloads (file_id, file_path) pairs on a bounded thread pool and returns (transferred, failed)."""
+    progress = TransferProgress(target)
+    transfer = functools.partial(download_gdrive_file, service, get_gdrive_chunk_size(), progress)
+    return run_transfers(transfer, paths, 'download', target, workers)
+
+# 130. ChunkReader: Binary file-like object reading from an iterator of byte chunks
+class ChunkReader:
+    """Read-only binary file-like object over an iterator of byte chunks; read(size) returns size bytes until the end."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+        self.closed = False
+
+    def readable(self):
+        """Returns True: the object can be read."""
+        return True
+
+    def read(self, size=-1):
+        """Reads size bytes, or everything left if size is negative; fewer bytes are returned only at the end."""
+        while size is None or size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def close(self):
+        """Closes the underlying iterator."""
+        if not self.closed:
+            self.closed = True
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+# 131. StreamingUpload: Binary file-like object uploading what is written to it in a background thread
+class StreamingUpload:
+    """Write-only binary file-like object whose data is consumed by upload(reader) in a background thread.
+
+    At most max_buffers written blocks wait in memory. The object is stored when the writer
+    is closed; if the with block raises, the reader raises too, so the upload is aborted
+    instead of storing a truncated object.
+    """
+
+    def __init__(self, upload, max_buffers=STREAM_QUEUE_SIZE):
+        self.queue = queue.Queue(max_buffers)
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self._upload, args=(upload,), daemon=True)
+        self.thread.start()
+
+    def _chunks(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+
+    def _upload(self, upload):
+        try:
+            upload(ChunkReader(self._chunks()))
+        except BaseException as e:
+            self.error = e
+
+    def _put(self, item):
+        # The upload thread may have stopped reading after a failure: do not wait for it forever
+        while True:
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                if not self.thread.is_alive():
+                    raise self.error or OSError('upload stopped before the end of the data')
+
+    def writable(self):
+        """Returns True: the object can be written."""
+        return True
+
+    def write(self, data):
+        """Queues data for the upload and returns the number of bytes written."""
+        if self.error is not None:
+            raise self.error
+        if data:
+            self._put(bytes(data))
+        return len(data)
+
+    def close(self):
+        """Ends the data, waits for the upload to complete and raises its error, if any."""
+        if self.closed:
+            return
+        self.closed = True
+        self._put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self, error=None):
+        """Makes the upload fail, so that nothing is stored, and waits for it to stop."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._put(error or OSError('upload aborted'))
+        except BaseException:
+            pass
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort(exc)
+
+# 132. StorageBackend: Base class of the storage providers, addressed by URL
+class StorageBackend(ABC):
+    """Objects of one container (local root, bucket, Azure container or Google Drive folder), with '/'-separated keys.
+
+    Subclasses provide the listing and the streaming open_read/open_write; whole-file
+    transfers default to streaming and are overridden where the provider has a faster
+    native path.
+    """
+
+    scheme = None
+
+    def __init__(self, container, config=None):
+        self.container = container
+        self.config = config or {}
+
+    def url(self, key=''):
+        """Returns the storage URL of a key."""
+        return f"{self.scheme}://{self.container}/{key}"
+
+    @abstractmethod
+    def list_objects(self, prefix=''):
+        """Yields {'key', 'size', 'md5', 'version'} for the objects whose key starts with prefix.
+
+        md5 is the MD5 of the content when the provider reports it (None otherwise) and version
+        changes whenever the content does (mtime of local files, ETag of remote objects).
+        """
+
+    @abstractmethod
+    def stat(self, key):
+        """Returns the listing entry of an object, or None if it does not exist."""
+
+    @abstractmethod
+    def open_read(self, key):
+        """Returns a readable binary file-like object streaming an object."""
+
+    @abstractmethod
+    def open_write(self, key):
+        """Returns a writable binary file-like object; the object is stored when it is closed."""
+
+    @abstractmethod
+    def make_folder(self, key):
+        """Creates a folder."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Deletes an object."""
+
+    def upload_file(self, file_path, key):
+        """Stores a local file as an object."""
+        with open(file_path, 'rb') as source, self.open_write(key) as target:
+            shutil.copyfileobj(source, target, STREAM_BUFFER_SIZE)
+
+    def download_file(self, key, file_path):
+        """Writes an object to a local file, through a temporary file so that failures leave no partial file."""
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        tmp_path = f"{file_path}.tmp"
+        try:
+            with contextlib.closing(self.open_read(key)) as source, open(tmp_path, 'wb') as target:
+                shutil.copyfileobj(source, target, STREAM_BUFFER_SIZE)
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def read_bytes(self, key):
+        """Returns the content of an object."""
+        with run_metrics.measure(f'read_{self.scheme}') as stage, contextlib.closing(self.open_read(key)) as source:
+            data = source.read()
+            stage.bytes_out = len(data)
+        return data
+
+    def write_json(self, key, json_data, jsonl=False):
+        """Stores JSON data (or JSONL with jsonl) as an object, streamed as it is serialized."""
+        with self.open_write(key) as target:
+            for chunk in iter_json_chunks(json_data, jsonl):
+                target.write(chunk)
+
+# 133. LocalStorage: Local file system backend
+class LocalStorage(StorageBackend):
+    """Files under a local root directory (local:///absolute/path or local://relative/path)."""
+
+    scheme = 'local'
+
+    def url(self, key=''):
+        """Returns the storage URL of a key, with its absolute path."""
+        return f"local://{os.path.abspath(self.local_path(key))}"
+
+    def local_path(self, key):
+        """Returns the file path of a key."""
+        return os.path.join(self.container, key)
+
+    def list_objects(self, prefix=''):
+        """Yields the file at prefix, or the files of the directory tree at prefix or whose path starts with it."""
+        path = self.local_path(prefix)
+        if os.path.isfile(path):
+            yield self.stat(prefix)
+            return
+        directory = path if os.path.isdir(path) else os.path.dirname(path)
+        if not os.path.isdir(directory):
+            return
+        for file_path in iter_directory_files(directory):
+            key = os.path.relpath(file_path, self.container).replace(os.sep, '/')
+            if directory == path or key.startswith(prefix):
+                entry = self.stat(key)
+                if entry is not None:
+                    yield entry
+
+    def stat(self, key):
+        """Returns the size and mtime of a file."""
+        try:
+            stat = os.stat(self.local_path(key))
+        except FileNotFoundError:
+            return None
+        return {'key': key, 'size': stat.st_size, 'md5': None, 'version': str(stat.st_mtime_ns)}
+
+    def open_read(self, key):
+        """Opens a file for reading."""
+        return open(self.local_path(key), 'rb')
+
+    def open_write(self, key):
+        """Opens a file for writing, creating its directory."""
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return open(path, 'wb')
+
+    def make_folder(self, key):
+        """Creates a directory."""
+        os.makedirs(self.local_path(key), exist_ok=True)
+
+    def delete(self, key):
+        """Deletes a file."""
+        os.remove(self.local_path(key))
+
+    def upload_file(self, file_path, key):
+        """Copies a local file into the root."""
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        shutil.copyfile(file_path, path)
+
+    def download_file(self, key, file_path):
+        """Copies a file out of the root."""
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        shutil.copyfile(self.local_path(key), file_path)
+
+# 134. S3Storage: Amazon S3 backend
+class S3Storage(StorageBackend):
+    """Objects of an S3 bucket (s3://bucket/key), through the shared client of the provider."""
+
+    scheme = 's3'
+
+    def __init__(self, container, config=None):
+        super().__init__(container, config)
+        self.client = get_s3_client(self.config, self.scheme)
+
+    @staticmethod
+    def _entry(key, size, etag):
+        # The ETag of an object uploaded in one part is its MD5; multipart ETags end with -<parts>
+        etag = etag.strip('"')
+        return {'key': key, 'size': size, 'md5': None if '-' in etag else etag, 'version': etag}
+
+    def list_objects(self, prefix=''):
+        """Yields the objects under a prefix."""
+        for obj in iter_s3_objects(self.client, self.container, prefix):
+            yield self._entry(obj['Key'], obj['Size'], obj['ETag'])
+
+    def stat(self, key):
+        """Returns the size and ETag of an object."""
+        from botocore.exceptions import ClientError
+        try:
+            head = self.client.head_object(Bucket=self.container, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return self._entry(key, head['ContentLength'], head['ETag'])
+
+    def open_read(self, key):
+        """Returns the streaming body of an object."""
+        return self.client.get_object(Bucket=self.container, Key=key)['Body']
+
+    def open_write(self, key):
+        """Returns a writer uploading the object in multipart chunks while it is written."""
+        transfer_config = get_transfer_config()
+        return StreamingUpload(lambda reader: self.client.upload_fileobj(reader, self.container, key,
+                                                                         Config=transfer_config))
+
+    def make_folder(self, key):
+        """Creates a folder placeholder."""
+        self.client.put_object(Bucket=self.container, Key=key.rstrip('/') + '/')
+
+    def delete(self, key):
+        """Deletes an object."""
+        self.client.delete_object(Bucket=self.container, Key=key)
+
+    def upload_file(self, file_path, key):
+        """Uploads a local file, with its multipart chunks read from the file in parallel."""
+        self.client.upload_file(file_path, self.container, key, Config=get_transfer_config())
+
+    def download_file(self, key, file_path):
+        """Downloads an object, with its multipart chunks fetched in parallel."""
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        self.client.download_file(self.container, key, file_path, Config=get_transfer_config())
+
+# 135. ArubaStorage: Aruba Cloud Object Storage backend
+class ArubaStorage(S3Storage):
+    """Objects of an Aruba Cloud Object Storage bucket (aruba://bucket/key), an S3-compatible service."""
+
+    scheme = 'aruba'
+
+# 136. AzureStorage: Azure Blob Storage backend
+class AzureStorage(StorageBackend):
+    """Blobs of an Azure container (azure://container/blob), through one client of the shared service client."""
+
+    scheme = 'azure'
+
+    def __init__(self, container, config=None):
+        super().__init__(container, config)
+        self.container_client = get_azure_service_client(self.config).get_container_client(container)
+        self.max_concurrency = transfer_settings.get('multipart_concurrency', DEFAULT_MULTIPART_CONCURRENCY)
+
+    @staticmethod
+    def _entry(blob):
+        # Blobs uploaded in blocks have no Content-MD5
+        content_md5 = blob.content_settings.content_md5 if blob.content_settings else None
+        return {'key': blob.name, 'size': blob.size, 'md5': bytes(content_md5).hex() if content_md5 else None,
+                'version': blob.etag}
+
+    def list_objects(self, prefix=''):
+        """Yields the blobs under a prefix."""
+        for blob in iter_azure_blobs(self.container_client, prefix):
+            yield self._entry(blob)
+
+    def stat(self, key):
+        """Returns the size, Content-MD5 and ETag of a blob."""
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            return self._entry(self.container_client.get_blob_client(key).get_blob_properties())
+        except ResourceNotFoundError:
+            return None
+
+    def open_read(self, key):
+        """Returns a reader streaming a blob chunk by chunk."""
+        return ChunkReader(self.container_client.download_blob(key).chunks())
+
+    def open_write(self, key):
+        """Returns a writer uploading the blob in blocks while it is written."""
+        return StreamingUpload(lambda reader: self.container_client.upload_blob(
+            key, reader, overwrite=True, max_concurrency=self.max_concurrency))
+
+    def make_folder(self, key):
+        """Creates a folder placeholder."""
+        self.container_client.upload_blob(key.rstrip('/') + '/', b'', overwrite=True)
+
+    def delete(self, key):
+        """Deletes a blob."""
+        self.container_client.delete_blob(key)
+
+    def upload_file(self, file_path, key):
+        """Uploads a local file, with its blocks sent in parallel."""
+        with open(file_path, 'rb') as data:
+            self.container_client.upload_blob(key, data, overwrite=True, max_concurrency=self.max_concurrency)
+
+    def download_file(self, key, file_path):
+        """Downloads a blob, with its chunks fetched in parallel."""
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        tmp_path = f"{file_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as file:
+                self.container_client.download_blob(key, max_concurrency=self.max_concurrency).readinto(file)
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+# 137. GDriveStorage: Google Drive backend
+class GDriveStorage(StorageBackend):
+    """Files of a Google Drive folder tree (gdrive://folder_id/path/to/file), addressed by their path of names.
+
+    Requests are sent on the HTTP connection of the calling thread, and the ids of the
+    folders met along the paths are cached.
+    """
+
+    scheme = 'gdrive'
+
+    def __init__(self, container, config=None):
+        super().__init__(container, config)
+        self.service = get_gdrive_service(self.config)
+        self.folder_ids = {}
+        self.lock = threading.RLock()
+
+    def _execute(self, request):
+        return request.execute(http=get_gdrive_http(self.service), num_retries=TRANSFER_RETRIES)
+
+    def _child_id(self, parent_id, name, folder=False, create=False):
+        # Folders are looked up and created under the lock, so that concurrent writers do not create duplicates
+        with self.lock if folder else contextlib.nullcontext():
+            if folder and (parent_id, name) in self.folder_ids:
+                return self.folder_ids[(parent_id, name)]
+            escaped = name.replace('\\', '\\\\').replace("'", "\\'")
+            query = f"name = '{escaped}' and '{parent_id}' in parents and trashed = false"
+            if folder:
+                query += f" and mimeType = '{GDRIVE_FOLDER_MIME_TYPE}'"
+            files = self._execute(self.service.files().list(q=query, spaces='drive', pageSize=1,
+                                                            fields='files(id)')).get('files', [])
+            if files:
+                child_id = files[0]['id']
+            elif folder and create:
+                child_id = self._execute(self.service.files().create(
+                    body={'name': name, 'mimeType': GDRIVE_FOLDER_MIME_TYPE, 'parents': [parent_id]}, fields='id'))['id']
+            else:
+                return None
+            if folder:
+                self.folder_ids[(parent_id, name)] = child_id
+            return child_id
+
+    def _resolve(self, key, create=False):
+        """Returns (parent_id, file_id) of a key, with file_id None if the file does not exist."""
+        *folders, name = key.strip('/').split('/')
+        parent_id = self.container
+        for folder in folders:
+            parent_id = self._child_id(parent_id, folder, folder=True, create=create)
+            if parent_id is None:
+                return None, None
+        return parent_id, self._child_id(parent_id, name)
+
+    def _file_id(self, key):
+        file_id = self._resolve(key)[1]
+        if file_id is None:
+            raise FileNotFoundError(self.url(key))
+        return file_id
+
+    def _store(self, key, media):
+        parent_id, file_id = self._resolve(key, create=True)
+        if file_id:
+            request = self.service.files().update(fileId=file_id, media_body=media, fields='id')
+        else:
+            request = self.service.files().create(body={'name': key.rstrip('/').rsplit('/', 1)[-1], 'parents': [parent_id]},
+                                                  media_body=media, fields='id')
+        self._execute(request)
+
+    def _iter_media(self, file_id):
+        from googleapiclient.http import MediaIoBaseDownload
+        request = self.service.files().get_media(fileId=file_id)
+        request.http = get_gdrive_http(self.service)
+        buffer = io.BytesIO()
+        downloader = MediaIoBaseDownload(buffer, request, chunksize=get_gdrive_chunk_size())
+        done = False
+        while not done:
+            _, done = downloader.next_chunk(num_retries=TRANSFER_RETRIES)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def _upload_stream(self, key, reader):
+        from googleapiclient.http import MediaIoBaseUpload
+        # Resumable uploads need a seekable source: the stream is spooled, in memory up to one chunk
+        chunk_size = get_gdrive_chunk_size()
+        with tempfile.SpooledTemporaryFile(max_size=chunk_size, dir=temp_dir) as spool:
+            shutil.copyfileobj(reader, spool, STREAM_BUFFER_SIZE)
+            spool.seek(0)
+            self._store(key, MediaIoBaseUpload(spool, mimetype='application/octet-stream', chunksize=chunk_size,
+                                               resumable=True))
+
+    @staticmethod
+    def _entry(key, item):
+        return {'key': key, 'size': int(item.get('size', 0)), 'md5': item.get('md5Checksum'),
+                'version': item.get('md5Checksum')}
+
+    def list_objects(self, prefix=''):
+        """Yields the files of the tree whose path starts with prefix, skipping Google Docs."""
+        for relative_path, item in iter_gdrive_tree(self.service, self.container):
+            key = relative_path.replace(os.sep, '/')
+            if key.startswith(prefix) and not item['mimeType'].startswith('application/vnd.google-apps.'):
+                yield self._entry(key, item)
+
+    def stat(self, key):
+        """Returns the size and MD5 of a file."""
+        file_id = self._resolve(key)[1]
+        if file_id is None:
+            return None
+        return self._entry(key, self._execute(self.service.files().get(fileId=file_id, fields='size, md5Checksum')))
+
+    def open_read(self, key):
+        """Returns a reader downloading a file chunk by chunk."""
+        return ChunkReader(self._iter_media(self._file_id(key)))
+
+    def open_write(self, key):
+        """Returns a writer uploading the file, replacing the existing one, when it is closed."""
+        return StreamingUpload(functools.partial(self._upload_stream, key))
+
+    def make_folder(self, key):
+        """Creates the folders of a path that do not exist."""
+        parent_id = self.container
+        for folder in key.strip('/').split('/'):
+            parent_id = self._child_id(parent_id, folder, folder=True, create=True)
+
+    def delete(self, key):
+        """Deletes a file."""
+        self._execute(self.service.files().delete(fileId=self._file_id(key)))
+
+    def upload_file(self, file_path, key):
+        """Uploads a local file with a resumable upload."""
+        from googleapiclient.http import MediaFileUpload
+        self._store(key, MediaFileUpload(file_path, chunksize=get_gdrive_chunk_size(), resumable=True))
+
+STORAGE_BACKENDS = {
+    'local': LocalStorage,
+    's3': S3Storage,
+    'aruba': ArubaStorage,
+    'azure': AzureStorage,
+    'gdrive': GDriveStorage,
+}
+
+# 138. parse_storage_url: Splits a storage URL into scheme, container and key
+def parse_storage_url(url):
+    """Splits a storage URL into (scheme, container, key); paths without a scheme are local."""
+    scheme, separator, rest = url.partition('://')
+    if not separator:
+        scheme, rest = 'local', url
+    if scheme not in STORAGE_BACKENDS:
+        raise ValueError(f"Unsupported storage URL: {url}")
+    if scheme == 'local':
+        return scheme, '/' if rest.startswith('/') else '.', rest.lstrip('/')
+    container, _, key = rest.partition('/')
+    return scheme, container, key
+
+# 139. get_storage: Returns the storage backend and key of a URL
+def get_storage(url, config=None):
+    """Returns (backend, key) for a storage URL; backends are created once per container and reused."""
+    scheme, container, key = parse_storage_url(url)
+    if (scheme, container) not in storage_backends:
+        storage_backends[(scheme, container)] = STORAGE_BACKENDS[scheme](container, config)
+    return storage_backends[(scheme, container)], key
+
+# 140. iter_copy_keys: Pairs the source objects of a copy with their destination keys
+def iter_copy_keys(objects, source_key, destination_key):
+    """Yields (source_key, destination_key) pairs for the objects listed under the source key.
+
+    An object named exactly by the source key is copied to the destination key, or inside it
+    if it is empty or ends with '/'. Otherwise the source key is a folder, and the objects
+    keep their path relative to it.
+    """
+    folder = source_key.rstrip('/')
+    for obj in objects:
+        key = obj['key']
+        if key == source_key:
+            if not destination_key or destination_key.endswith('/'):
+                yield key, destination_key + key.rsplit('/', 1)[-1]
+            else:
+                yield key, destination_key
+        elif not folder or key.startswith(folder + '/'):
+            relative = key[len(folder):].lstrip('/')
+            yield key, f"{destination_key.rstrip('/')}/{relative}" if destination_key else relative
+
+# 141. copy_storage_object: Copies one object between two backends, reporting failures instead of raising
+def copy_storage_object(source, destination, keys):
+    """Copies one (source_key, destination_key) pair and returns True on success.
+
+    Local files go through the native upload and download of the other side; objects of two
+    remote backends are streamed from one to the other without touching the disk.
+    """
+    source_key, destination_key = keys
+    try:
+        with run_metrics.measure(f'copy_{source.scheme}_{destination.scheme}') as stage:
+            if isinstance(source, LocalStorage):
+                stage.bytes_in = os.path.getsize(source.local_path(source_key))
+                destination.upload_file(source.local_path(source_key), destination_key)
+            elif isinstance(destination, LocalStorage):
+                source.download_file(source_key, destination.local_path(destination_key))
+                stage.bytes_in = os.path.getsize(destination.local_path(destination_key))
+            else:
+                with contextlib.closing(source.open_read(source_key)) as reader, destination.open_write(destination_key) as writer:
+                    for block in iter(functools.partial(reader.read, STREAM_BUFFER_SIZE), b''):
+                        writer.write(block)
+                        stage.bytes_in += len(block)
+            stage.bytes_out = stage.bytes_in
+        log_message('success_copy_storage', 'debug', source.url(source_key), destination.url(destination_key))
+        return True
+    except Exception as e:
+        log_message('error_copy_storage', 'error', source.url(source_key), destination.url(destination_key), str(e))
+        return False
+
+# 142. copy_storage: Copies an object or a folder between two storage URLs
+def copy_storage(source_url, destination_url, workers=None, config=None):
+    """Copies an object, or every object under a folder, from one storage URL to another and returns (copied, failed)."""
+    source, source_key = get_storage(source_url, config)
+    destination, destination_key = get_storage(destination_url, config)
+    keys = iter_copy_keys(source.list_objects(source_key), source_key, destination_key)
+    copy = functools.partial(copy_storage_object, source, destination)
+    return run_transfers(copy, keys, 'copy', destination_url, workers)
+
+# 143. ChecksumManifest: SQLite record of the MD5 of local files and remote objects
+class ChecksumManifest:
+    """SQLite record of content MD5s by location, valid while the size and version of the location are unchanged.
+
+    The version is the mtime of a local file or the ETag of a remote object, so local files are
+    hashed again only when they change, and objects whose ETag is not an MD5 (multipart
+    uploads, Azure block blobs) can be compared once they have been synced. Without a path
+    the record only lasts for the run.
+    """
+
+    def __init__(self, manifest_path=None):
+        if manifest_path and os.path.dirname(manifest_path):
+            os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        self.connection = sqlite3.connect(manifest_path or ':memory:', check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS checksums (location TEXT PRIMARY KEY, size INTEGER, version TEXT, md5 TEXT)"
+        )
+        self.connection.commit()
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def get(self, location, size, version):
+        """Returns the recorded MD5 of a location, or None if it is unknown or the location changed."""
+        with self.lock:
+            row = self.connection.execute("SELECT size, version, md5 FROM checksums WHERE location = ?",
+                                          (location,)).fetchone()
+        if row and row[0] == size and row[1] == version:
+            return row[2]
+        return None
+
+    def put(self, location, size, version, md5):
+        """Records the MD5 of a location."""
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO checksums (location, size, version, md5) VALUES (?, ?, ?, ?)",
+                (location, size, version, md5)
+            )
+            self._written()
+
+    def delete(self, location):
+        """Forgets a location."""
+        with self.lock:
+            self.connection.execute("DELETE FROM checksums WHERE location = ?", (location,))
+            self._written()
+
+    def _written(self):
+        self.pending += 1
+        if self.pending >= MANIFEST_COMMIT_INTERVAL:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        """Commits the pending records and closes the manifest."""
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+# 144. file_md5: Returns the MD5 of a file
+def file_md5(file_path):
+    """Returns the hex MD5 of a file, read in blocks."""
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# 145. get_object_md5: Returns the content MD5 of a listed object, if it can be known
+def get_object_md5(backend, entry, manifest):
+    """Returns the MD5 of a listed object: reported by the provider, recorded in the manifest or, for local files, computed."""
+    if entry['md5']:
+        return entry['md5']
+    location = backend.url(entry['key'])
+    md5 = manifest.get(location, entry['size'], entry['version'])
+    if md5 is None and isinstance(backend, LocalStorage):
+        md5 = file_md5(backend.local_path(entry['key']))
+        manifest.put(location, entry['size'], entry['version'], md5)
+    return md5
+
+# 146. plan_sync_object: Decides whether an object of a sync must be transferred
+def plan_sync_object(source, destination, manifest, source_objects, destination_objects, keys):
+    """Returns (keys, md5) if the source object differs from its destination, None if it is up to date.
+
+    Objects match when their sizes are equal and so are their MD5s or, between two backends of
+    the same kind, their ETags. md5 is the MD5 of the source, None if it cannot be known.
+    """
+    source_key, destination_key = keys
+    source_entry = source_objects[source_key]
+    destination_entry = destination_objects.get(destination_key)
+    if destination_entry is None or destination_entry['size'] != source_entry['size']:
+        return keys, get_object_md5(source, source_entry, manifest)
+    if (type(source) is type(destination) and not isinstance(source, LocalStorage)
+            and source_entry['version'] == destination_entry['version']):
+        return None
+    md5 = get_object_md5(source, source_entry, manifest)
+    if md5 is not None and md5 == get_object_md5(destination, destination_entry, manifest):
+        return None
+    return keys, md5
+
+# 147. sync_storage_object: Transfers one object of a sync and records its MD5
+def sync_storage_object(source, destination, manifest, source_objects, plan):
+    """Copies one planned object and records the MD5 of both sides in the manifest; returns True on success."""
+    (source_key, destination_key), md5 = plan
+    if not copy_storage_object(source, destination, (source_key, destination_key)):
+        return False
+    try:
+        if md5 is None and isinstance(destination, LocalStorage):
+            # The provider did not report the MD5 of the source: take it from the downloaded copy
+            md5 = file_md5(destination.local_path(destination_key))
+            source_entry = source_objects[source_key]
+            manifest.put(source.url(source_key), source_entry['size'], source_entry['version'], md5)
+        destination_entry = destination.stat(destination_key)
+        if md5 is not None and destination_entry is not None:
+            manifest.put(destination.url(destination_key), destination_entry['size'], destination_entry['version'], md5)
+    except Exception as e:
+        log_message('error_sync_manifest', 'warning', destination.url(destination_key), str(e))
+    return True
+
+# 148. delete_storage_object: Deletes one object, reporting failures instead of raising
+def delete_storage_object(backend, manifest, key):
+    """Deletes one object, forgets its MD5 and returns True on success."""
+    try:
+        backend.delete(key)
+        manifest.delete(backend.url(key))
+        log_message('success_delete_storage', 'debug', backend.url(key))
+        return True
+    except Exception as e:
+        log_message('error_delete_storage', 'error', backend.url(key), str(e))
+        return False
+
+# 149. sync_storage: Transfers only the objects that differ between two storage URLs
+def sync_storage(source_url, destination_url, delete=False, manifest_path=None, workers=None, config=None):
+    """Makes a destination URL match a source URL, transferring only the objects that differ.
+
+    Both sides are listed once and compared by size and MD5 (or ETag), hashing local files
+    only when they are not in the checksum manifest. With delete, the destination objects
+    missing from the source are deleted. Returns (transferred, failed, deleted), failed counting
+    the failed deletions too.
+    """
+    source, source_key = get_storage(source_url, config)
+    destination, destination_key = get_storage(destination_url, config)
+    workers = workers or transfer_settings.get('workers', DEFAULT_TRANSFER_WORKERS)
+    manifest = ChecksumManifest(manifest_path)
+    try:
+        source_objects = {entry['key']: entry for entry in source.list_objects(source_key)}
+        destination_objects = {entry['key']: entry for entry in destination.list_objects(destination_key)}
+        keys = list(iter_copy_keys(source_objects.values(), source_key, destination_key))
+        # Comparing hashes local files: it runs on the pool too
+        plan = functools.partial(plan_sync_object, source, destination, manifest, source_objects, destination_objects)
+        plans = [item for item in map_in_order(plan, keys, workers, ThreadPoolExecutor) if item is not None]
+
+        extraneous = []
+        if delete and source_key not in source_objects:
+            targets = {target for _, target in keys}
+            folder = destination_key.rstrip('/')
+            extraneous = [key for key in destination_objects
+                          if key not in targets and (not folder or key.startswith(folder + '/'))]
+        log_message('sync_planned', 'info', source.url(source_key), destination.url(destination_key), len(plans),
+                    len(keys) - len(plans), len(extraneous))
+
+        transfer = functools.partial(sync_storage_object, source, destination, manifest, source_objects)
+        transferred, failed = run_transfers(transfer, plans, 'sync', destination_url, workers)
+        deleted = 0
+        if extraneous:
+            deleted, failed_deletions = run_transfers(functools.partial(delete_storage_object, destination, manifest),
+                                                      extraneous, 'delete', destination_url, workers)
+            failed += failed_deletions
+        return transferred, failed, deleted
+    finally:
+        manifest.close()
+
+# 150. iter_json_chunks: Serializes JSON data in blocks of UTF-8 bytes
+def iter_json_chunks(json_data, jsonl=False, block_size=STREAM_BUFFER_SIZE):
+    """Serializes JSON data in UTF-8 blocks of about block_size bytes, without building the whole document.
+
+    The output is the same as write_json (indented, non-ASCII characters kept); with jsonl, a
+    list is written as one compact record per line.
+    """
+    if jsonl:
+        records = json_data if isinstance(json_data, list) else [json_data]
+        pieces = (json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+    else:
+        pieces = json.JSONEncoder(indent=4, ensure_ascii=False).iterencode(json_data)
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= block_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+# 151. ByteBudget: Bounds the bytes held at once by concurrent tasks
+class ByteBudget:
+    """Thread-safe budget of bytes: acquire blocks until the requested bytes fit under the limit."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        """Reserves size bytes and returns the amount reserved (an item larger than the budget waits for all of it)."""
+        size = min(size, self.limit)
+        with self.condition:
+            self.condition.wait_for(lambda: self.used + size <= self.limit)
+            self.used += size
+        return size
+
+    def release(self, size):
+        """Returns reserved bytes to the budget."""
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+# 152. open_file_data: Opens the content of a file given as a path, bytes or a file-like object
+def open_file_data(file_path, data=None):
+    """Returns a context manager yielding a binary file-like object with the content of a file.
+
+    Without data the file is opened from file_path; bytes are wrapped in memory, and a
+    file-like object is used as it is and left open.
+    """
+    if data is None:
+        return open(file_path, 'rb')
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return io.BytesIO(data)
+    return contextlib.nullcontext(data)
+
+# 153. handler_accepts_data: Tells whether a handler reads bytes or file-like objects
+@functools.lru_cache(maxsize=None)
+def handler_accepts_data(handler):
+    """Returns True if a handler takes the content of the file through a data argument."""
+    return 'data' in inspect.signature(handler).parameters
+
+# 154. handle_spooled_data: Runs a path-only handler on file content through a temporary file
+def handle_spooled_data(handler, file_path, data):
+    """Writes file content to a temporary file with the same extension, runs handler on it and removes it.
+
+    Used for the handlers whose libraries only read paths, such as ffmpeg for audio and video.
+    """
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file_path)[1], dir=temp_dir, delete=False) as tmp_file:
+        with open_file_data(file_path, data) as source:
+            shutil.copyfileobj(source, tmp_file, STREAM_BUFFER_SIZE)
+    try:
+        content, original_path = handler(tmp_file.name)
+    finally:
+        os.remove(tmp_file.name)
+    return content, file_path if original_path == tmp_file.name else original_path
+
+# 155. extract_remote_object: Downloads one object within the byte budget and extracts its text
+def extract_remote_object(backend, budget, executor, entry):
+    """Downloads one listed object into memory and extracts its text; returns (url, (content, original_path)).
+
+    The bytes of the object are reserved in the budget until its extraction ends. Extraction
+    runs in the process pool, if any, while this thread waits and others keep downloading.
+    """
+    url = backend.url(entry['key'])
+    reserved = budget.acquire(entry['size'])
+    try:
+        try:
+            data = backend.read_bytes(entry['key'])
+        except Exception as e:
+            log_message('error_read_remote_object', 'error', url, str(e))
+            return url, (None, None)
+        if executor is None:
+            return url, handle_file(url, data)
+        return url, merge_worker_metrics(executor.submit(run_with_metrics, handle_file, url, data).result())
+    finally:
+        budget.release(reserved)
+
+# 156. handle_remote_prefix: Extracts the documents under a storage URL without staging them on disk
+def handle_remote_prefix(url, output_dir, workers=1, fetch_workers=None, output_format='txt', shard_size=None,
+                         max_in_flight=None, config=None):
+    """Extracts the supported documents under a storage URL into output_dir, like handle_directory.
+
+    Objects are downloaded into memory fetch_workers at a time, with at most max_in_flight
+    bytes held at once, and extracted by workers processes while the next ones download.
+    Returns (processed, failed): the objects that could not be read or extracted are skipped.
+    """
+    backend, prefix = get_storage(url, config)
+    fetch_workers = fetch_workers or transfer_settings.get('workers', DEFAULT_TRANSFER_WORKERS)
+    budget = ByteBudget(max_in_flight or DEFAULT_MAX_IN_FLIGHT)
+    writer = ShardedJsonlWriter(output_dir, shard_size) if output_format == 'jsonl' else None
+    os.makedirs(output_dir, exist_ok=True)
+    # Unsupported objects are skipped before they are downloaded
+    entries = (entry for entry in backend.list_objects(prefix) if get_handler(entry['key']))
+    executor = new_process_pool(workers) if workers and workers > 1 else None
+    processed = 0
+    failed = 0
+    file_index = 1
+    try:
+        extract = functools.partial(extract_remote_object, backend, budget, executor)
+        for object_url, (content, original_path) in map_in_order(extract, entries, fetch_workers, ThreadPoolExecutor):
+            if extraction_failed(content, original_path):
+                # The error is logged; the error message is not a document
+                failed += 1
+                continue
+            processed += 1
+            for record_path, handler_name, text in iter_extracted_records(object_url, content, original_path):
+                if text and not text.startswith("Unsupported"):
+                    if writer:
+                        writer.write(record_path, handler_name, text)
+                    else:
+                        file_index = write_to_output(text, output_dir, file_index, record_path)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if writer:
+            writer.close()
+    log_message('remote_prefix_processed', 'info', url, processed, failed)
+    return processed, failed
+
+# 157. iter_zip_members: Lists the members of a ZIP archive that are safe to process
+def iter_zip_members(archive, zip_path):
+    """Yields the supported members of an open ZIP archive, skipping those that look like a zip bomb.
+
+    The limits apply to the sizes declared in the archive, which zipfile enforces when the
+    members are read: a member larger than ZIP_MAX_MEMBER_SIZE or, above ZIP_RATIO_MIN_SIZE,
+    compressed more than ZIP_MAX_RATIO times is skipped, and the archive stops once its
+    members exceed ZIP_MAX_TOTAL_SIZE.
+    """
+    total_size = 0
+    for info in archive.infolist():
+        if info.is_dir() or get_handler(info.filename) is None:
+            continue
+        ratio = info.file_size / max(info.compress_size, 1)
+        if info.file_size > ZIP_MAX_MEMBER_SIZE or (info.file_size > ZIP_RATIO_MIN_SIZE and ratio > ZIP_MAX_RATIO):
+            log_message('warning_zip_member_skipped', 'warning', info.filename, zip_path, info.file_size, ratio)
+            continue
+        total_size += info.file_size
+        if total_size > ZIP_MAX_TOTAL_SIZE:
+            log_message('warning_zip_total_size', 'warning', zip_path, ZIP_MAX_TOTAL_SIZE // 1024 ** 2)
+            return
+        yield info
+
+# 158. extract_zip_member: Processes one member of an open ZIP archive
+def extract_zip_member(archive, zip_path, budget, depth, info):
+    """Reads one member within the byte budget and returns its records (several for a nested archive)."""
+    member_path = f"{zip_path}/{info.filename}"
+    handler = get_handler(info.filename)
+    if handler is handle_zip_file and depth >= ZIP_MAX_DEPTH:
+        log_message('warning_zip_depth', 'warning', member_path, ZIP_MAX_DEPTH)
+        return []
+    reserved = budget.acquire(info.file_size)
+    try:
+        with archive.open(info) as member:
+            data = member.read()
+        if handler is handle_zip_file:
+            content, original_path = handle_zip_file(member_path, data, depth=depth + 1)
+        else:
+            content, original_path = handle_file(member_path, data)
+    except Exception as e:
+        log_message('error_process_file', 'error', member_path, str(e))
+        return []
+    finally:
+        budget.release(reserved)
+    if original_path is None or not content:
+        return []
+    if isinstance(content, list):
+        return content
+    return [{'path': member_path, 'handler': handler.__name__, 'text': content}]
+
+# 159. iter_extracted_records: Splits the result of handle_file into output records
+def iter_extracted_records(file_path, content, original_path):
+    """Yields (path, handler, text) for the result of handle_file: one per member of an archive, else one."""
+    if isinstance(content, list):
+        for record in content:
+            yield record['path'], record['handler'], record['text']
+    else:
+        yield original_path, get_handler_name(file_path), content
+
+# 160. get_extracted_text: Returns the result of handle_file as a single text
+def get_extracted_text(content):
+    """Returns the text extracted by handle_file, joining the texts of the members of an archive."""
+    if isinstance(content, list):
+        return '\n'.join(record['text'] for record in content)
+    return content
+
+# 161. DocumentPipeline: Asyncio pipeline from a storage URL to a JSONL dataset
+class DocumentPipeline:
+    """Lists, downloads, extracts and writes (or uploads) documents with all the stages running at the same time.
+
+    The stages are connected by bounded asyncio queues, so a slow stage makes the previous ones
+    wait instead of letting documents pile up in memory. Listing, downloads and uploads run
+    on a thread pool, extraction on a process pool, and each stage has its own number of
+    concurrent tasks. With a remote destination the dataset is staged under temp/ and every
+    shard is uploaded as soon as it is complete.
+    """
+
+    def __init__(self, source_url, destination_url, fetch_workers=None, extract_workers=1, upload_workers=None,
+                 queue_size=None, shard_size=None, config=None):
+        self.source, self.prefix = get_storage(source_url, config)
+        self.destination, self.destination_key = get_storage(destination_url, config)
+        self.fetch_workers = fetch_workers or transfer_settings.get('workers', DEFAULT_TRANSFER_WORKERS)
+        self.extract_workers = max(extract_workers or 1, 1)
+        self.upload_workers = upload_workers or DEFAULT_PIPELINE_UPLOAD_WORKERS
+        self.queue_size = queue_size or DEFAULT_PIPELINE_QUEUE_SIZE
+        self.shard_size = shard_size
+        self.counts = {'listed': 0, 'fetched': 0, 'records': 0, 'uploaded': 0, 'failed': 0}
+
+    def _destination_key(self, name):
+        return f"{self.destination_key.rstrip('/')}/{name}" if self.destination_key else name
+
+    async def _in_executor(self, executor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    async def _close_after(self, tasks, queue, count):
+        # A stage ends when all the tasks feeding it are done: one end marker per consumer
+        await asyncio.gather(*tasks)
+        for _ in range(count):
+            await queue.put(None)
+
+    async def _list(self):
+        entries = iter(self.source.list_objects(self.prefix))
+        while True:
+            entry = await self._in_executor(self.io_executor, next, entries, None)
+            if entry is None:
+                break
+            # Unsupported objects are skipped before they are downloaded
+            if get_handler(entry['key']):
+                self.counts['listed'] += 1
+                await self.fetch_queue.put(entry)
+        for _ in range(self.fetch_workers):
+            await self.fetch_queue.put(None)
+
+    async def _fetch(self):
+        while (entry := await self.fetch_queue.get()) is not None:
+            url = self.source.url(entry['key'])
+            try:
+                data = await self._in_executor(self.io_executor, self.source.read_bytes, entry['key'])
+            except Exception as e:
+                log_message('error_read_remote_object', 'error', url, str(e))
+                self.counts['failed'] += 1
+                continue
+            self.counts['fetched'] += 1
+            await self.extract_queue.put((url, data))
+
+    async def _extract(self):
+        while (item := await self.extract_queue.get()) is not None:
+            url, data = item
+            try:
+                content, original_path = merge_worker_metrics(
+                    await self._in_executor(self.process_executor, run_with_metrics, handle_file, url, data))
+            except Exception as e:
+                log_message('error_process_file', 'error', url, str(e))
+                self.counts['failed'] += 1
+                continue
+            if extraction_failed(content, original_path):
+                # The handler logged the error: its message is not a record
+                self.counts['failed'] += 1
+                continue
+            for record in iter_extracted_records(url, content, original_path):
+                if record[2] and not record[2].startswith("Unsupported"):
+                    await self.write_queue.put(record)
+
+    async def _write(self):
+        shards = self.writer.index['shards']
+        # Shards of a previous run are already uploaded
+        first_shard = len(shards)
+        while (record := await self.write_queue.get()) is not None:
+            shard_count = len(shards)
+            await self._in_executor(self.write_executor, self.writer.write, *record)
+            self.counts['records'] += 1
+            if self.upload_queue is not None and first_shard < shard_count < len(shards):
+                # The writer rotated: the previous shard is complete
+                await self.upload_queue.put(shards[-2]['file'])
+        await self._in_executor(self.write_executor, self.writer.close)
+        if self.upload_queue is not None:
+            if len(shards) > first_shard:
+                await self.upload_queue.put(shards[-1]['file'])
+            for _ in range(self.upload_workers):
+                await self.upload_queue.put(None)
+
+    async def _upload(self):
+        while (name := await self.upload_queue.get()) is not None:
+            await self._upload_file(name)
+
+    async def _upload_file(self, name):
+        path = os.path.join(self.output_dir, name)
+        try:
+            with run_metrics.measure(f'upload_{self.destination.scheme}', bytes_in=os.path.getsize(path)):
+                await self._in_executor(self.io_executor, self.destination.upload_file, path, self._destination_key(name))
+            self.counts['uploaded'] += 1
+        except Exception as e:
+            log_message('error_copy_storage', 'error', path, self.destination.url(self._destination_key(name)), str(e))
+            self.counts['failed'] += 1
+
+    async def run(self):
+        """Runs the pipeline and returns the counters of its stages."""
+        local = isinstance(self.destination, LocalStorage)
+        self.output_dir = (self.destination.local_path(self.destination_key) if local
+                           else tempfile.mkdtemp(prefix='pipeline_', dir=temp_dir))
+        self.fetch_queue = asyncio.Queue(self.queue_size)
+        self.extract_queue = asyncio.Queue(self.queue_size)
+        self.write_queue = asyncio.Queue(self.queue_size)
+        self.upload_queue = None if local else asyncio.Queue()
+        self.io_executor = ThreadPoolExecutor(max_workers=self.fetch_workers + self.upload_workers + 1)
+        self.process_executor = new_process_pool(self.extract_workers)
+        # The writer is not thread-safe: one thread appends the records
+        self.write_executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            index_key = self._destination_key('shard_index.json')
+            if not local and self.destination.stat(index_key):
+                # Continue the shard numbering of the dataset already uploaded
+                self.destination.download_file(index_key, os.path.join(self.output_dir, 'shard_index.json'))
+            self.writer = ShardedJsonlWriter(self.output_dir, self.shard_size)
+            fetchers = [asyncio.create_task(self._fetch()) for _ in range(self.fetch_workers)]
+            extractors = [asyncio.create_task(self._extract()) for _ in range(self.extract_workers)]
+            uploaders = [asyncio.create_task(self._upload()) for _ in range(self.upload_workers if not local else 0)]
+            tasks = [asyncio.create_task(self._list()), *fetchers, *extractors, asyncio.create_task(self._write()),
+                     *uploaders, asyncio.create_task(self._close_after(fetchers, self.extract_queue, len(extractors))),
+                     asyncio.create_task(self._close_after(extractors, self.write_queue, 1))]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            if not local:
+                # The index goes last, once every shard it lists is uploaded
+                await self._upload_file('shard_index.json')
+        finally:
+            self.io_executor.shutdown()
+            self.process_executor.shutdown()
+            self.write_executor.shutdown()
+            if not local:
+                shutil.rmtree(self.output_dir, ignore_errors=True)
+        return self.counts
+
+# 162. run_pipeline: Builds a JSONL dataset from a storage URL with the asyncio pipeline
+def run_pipeline(source_url, destination_url, fetch_workers=None, extract_workers=1, upload_workers=None,
+                 queue_size=None, shard_size=None, config=None):
+    """Runs a DocumentPipeline from source_url to a JSONL dataset at destination_url and returns its counters."""
+    pipeline = DocumentPipeline(source_url, destination_url, fetch_workers, extract_workers, upload_workers,
+                                queue_size, shard_size, config)
+    counts = asyncio.run(pipeline.run())
+    log_message('pipeline_completed', 'info', source_url, destination_url, counts['listed'], counts['fetched'],
+                counts['records'], counts['uploaded'], counts['failed'])
+    return counts
+
+# 163. JobJournal: SQLite journal of the completed units of a batch job
+class JobJournal:
+    """Records the completed units of a batch job (files, SRT chunks, transferred objects) to resume it after a crash.
+
+    Units are committed together with the job state every MANIFEST_COMMIT_INTERVAL units or
+    JOURNAL_FLUSH_INTERVAL seconds, in one SQLite transaction; the before_flush callbacks
+    make the outputs of those units durable first, so a committed unit is never lost.
+    """
+
+    def __init__(self, job_id, journal_dir=None):
+        self.job_id = job_id
+        journal_dir = journal_dir or jobs_dir
+        os.makedirs(journal_dir, exist_ok=True)
+        self.path = os.path.join(journal_dir, f'{job_id}.sqlite')
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS units (unit TEXT PRIMARY KEY, output TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+        self.completed = dict(self.connection.execute("SELECT unit, output FROM units"))
+        self.before_flush = []
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def __contains__(self, unit):
+        return unit in self.completed
+
+    def get(self, key, default=None):
+        """Returns a value of the job state."""
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        """Stores a value of the job state, committed with the next units."""
+        with self.lock:
+            self._set(key, value)
+
+    def _set(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def record(self, unit, output=None, **state):
+        """Records a completed unit, its outputs (one per line) and the job state after it."""
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO units (unit, output) VALUES (?, ?)", (unit, output))
+            for key, value in state.items():
+                self._set(key, value)
+            self.completed[unit] = output
+            self.pending += 1
+            if self.pending >= MANIFEST_COMMIT_INTERVAL or time.monotonic() - self.last_flush >= JOURNAL_FLUSH_INTERVAL:
+                self._flush()
+
+    def iter_pending(self, items, unit):
+        """Yields the items whose unit (unit(item)) is not completed yet."""
+        skipped = 0
+        for item in items:
+            if unit(item) in self.completed:
+                skipped += 1
+            else:
+                yield item
+        if skipped:
+            log_message('job_units_skipped', 'info', self.job_id, skipped)
+
+    def flush(self):
+        """Makes the outputs durable and commits the recorded units."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        for callback in self.before_flush:
+            callback()
+        self.connection.commit()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self, completed=False):
+        """Commits the pending units and closes the journal; the journal of a completed job is deleted."""
+        with self.lock:
+            if self.connection is None:
+                return
+            if completed:
+                self._set('status', 'completed')
+            self._flush()
+            self.connection.close()
+            self.connection = None
+            if completed:
+                # Only interrupted jobs can be resumed: their journals are the only ones kept
+                os.remove(self.path)
+        if completed:
+            log_message('job_completed', 'info', self.job_id)
+
+# 164. sync_output_file: Flushes an output file to disk
+def sync_output_file(file):
+    """Flushes an open output file and its OS buffers, so that it survives a crash of the machine."""
+    if file is not None and not file.closed:
+        file.flush()
+        os.fsync(file.fileno())
+
+# 165. get_transfer_unit: Returns the journal unit of one object transfer
+def get_transfer_unit(direction, item):
+    """Returns the journal unit of a transfer item (a key/path pair, a sync plan or a key)."""
+    return f'{direction} {item!r}'
+
+# 166. run_journaled_transfer: Runs one transfer and records it in the job journal when it succeeds
+def run_journaled_transfer(journal, transfer, direction, item):
+    """Runs transfer on item and records its unit in the journal if it returns True."""
+    success = transfer(item)
+    if success:
+        journal.record(get_transfer_unit(direction, item))
+    return success
+
+# 167. start_job: Opens the journal of a new or resumed batch job
+def start_job(args, journal_dir=None):
+    """Opens the journal of the job run by args: a new one, or the one of --resume with its saved arguments.
+
+    Returns (journal, args), with journal None if the job to resume does not exist or is already completed.
+    """
+    if not args.resume:
+        journal = JobJournal(datetime.now().strftime('%Y%m%d-%H%M%S-') + os.urandom(3).hex(), journal_dir)
+        journal.set('arguments', vars(args))
+        journal.flush()
+        log_message('job_started', 'info', journal.job_id)
+        return journal, args
+    if not os.path.exists(os.path.join(journal_dir or jobs_dir, f'{args.resume}.sqlite')):
+        log_message('error_job_not_found', 'error', args.resume, journal_dir or jobs_dir)
+        return None, args
+    journal = JobJournal(args.resume, journal_dir)
+    if journal.get('status') == 'completed':
+        log_message('job_already_completed', 'info', journal.job_id)
+        journal.close()
+        return None, args
+    # The job goes on with the arguments it was started with; only the interface language comes from this run
+    arguments = journal.get('arguments', {})
+    arguments.update(language=args.language, resume=args.resume)
+    log_message('job_resumed', 'info', journal.job_id, len(journal.completed))
+    return journal, argparse.Namespace(**{**vars(args), **arguments})
+
+# 168. Metrics: Thread-safe counters of the stages of a run
+class Metrics:
+    """Calls, errors, durations, bytes in and out and RSS changes of the stages of a run.
+
+    Stages are the handlers, handle_file, audio extraction, transcription requests and
+    storage transfers. Worker processes send their counters back through run_with_metrics.
+    """
+
+    FIELDS = ('calls', 'errors', 'seconds', 'bytes_in', 'bytes_out', 'rss_delta')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.started = time.time()
+
+    def add(self, stage, calls=1, errors=0, seconds=0.0, bytes_in=0, bytes_out=0, rss_delta=0):
+        """Adds one measurement (or several, with calls) to a stage."""
+        with self.lock:
+            values = self.stages.setdefault(stage, dict.fromkeys(self.FIELDS, 0))
+            values['calls'] += calls
+            values['errors'] += errors
+            values['seconds'] += seconds
+            values['bytes_in'] += bytes_in
+            values['bytes_out'] += bytes_out
+            values['rss_delta'] += rss_delta
+
+    def measure(self, *stages, bytes_in=0):
+        """Returns a context manager that times a block and adds it to each of stages."""
+        return StageMeasure(self, stages, bytes_in)
+
+    def snapshot(self):
+        """Returns a copy of the counters of every stage."""
+        with self.lock:
+            return {stage: dict(values) for stage, values in self.stages.items()}
+
+    def merge(self, stages):
+        """Adds the counters of a snapshot, such as the one of a worker process."""
+        for stage, values in stages.items():
+            self.add(stage, **values)
+
+    def reset(self):
+        """Clears the counters."""
+        with self.lock:
+            self.stages = {}
+            self.started = time.time()
+
+    def summary(self):
+        """Returns the run duration, peak RSS and stages as a dictionary."""
+        return {'started': self.started, 'duration': time.time() - self.started, 'peak_rss': get_peak_rss(),
+                'stages': self.snapshot()}
+
+    def report(self):
+        """Logs the counters of every stage, slowest first."""
+        summary = self.summary()
+        log_message('metrics_summary', 'info', summary['duration'], summary['peak_rss'] / 1024 ** 2)
+        for stage, values in sorted(summary['stages'].items(), key=lambda item: -item[1]['seconds']):
+            log_message('metrics_stage', 'info', stage, values['calls'], values['errors'], values['seconds'],
+                        values['bytes_in'] / 1024 ** 2, values['bytes_out'] / 1024 ** 2, values['rss_delta'] / 1024 ** 2)
+
+    def write(self, metrics_path, metrics_format=None):
+        """Writes the counters as JSON or as a Prometheus textfile (by default, for a .prom path)."""
+        summary = self.summary()
+        metrics_format = metrics_format or ('prometheus' if metrics_path.endswith('.prom') else 'json')
+        metrics_dir = os.path.dirname(metrics_path)
+        if metrics_dir:
+            os.makedirs(metrics_dir, exist_ok=True)
+        # Written aside and renamed, so that the node exporter never reads a partial file
+        tmp_path = f'{metrics_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as metrics_file:
+            if metrics_format == 'prometheus':
+                metrics_file.write(format_prometheus_metrics(summary))
+            else:
+                json.dump(summary, metrics_file, indent=4)
+        os.replace(tmp_path, metrics_path)
+        log_message('metrics_written', 'info', metrics_path)
+
+# 169. StageMeasure: Times one call of a stage for Metrics
+class StageMeasure:
+    """Context manager timing one call of one or more stages; set bytes_out and failed inside the block."""
+
+    def __init__(self, metrics, stages, bytes_in=0):
+        self.metrics = metrics
+        self.stages = stages
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.failed = False
+
+    def __enter__(self):
+        self.rss = get_rss()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        rss_delta = get_rss() - self.rss
+        errors = int(self.failed or exc_type is not None)
+        for stage in self.stages:
+            self.metrics.add(stage, 1, errors, seconds, self.bytes_in, self.bytes_out, rss_delta)
+        return False
+
+# Metrics of the current run
+run_metrics = Metrics()
+
+# 170. get_rss: Returns the resident memory of the process
+def get_rss():
+    """Returns the resident set size of the process in bytes, or 0 where /proc is not available."""
+    try:
+        with open('/proc/self/statm', 'rb') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+# 171. get_peak_rss: Returns the peak resident memory of the process
+def get_peak_rss():
+    """Returns the peak resident set size of the process in bytes, or 0 where it is not available."""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+# Stage counters exported to Prometheus: (field, metric name, type, description)
+PROMETHEUS_METRICS = [
+    ('calls', 'stage_calls_total', 'counter', 'Calls of each stage of the run.'),
+    ('errors', 'stage_errors_total', 'counter', 'Failed calls of each stage of the run.'),
+    ('seconds', 'stage_seconds_total', 'counter', 'Time spent in each stage of the run.'),
+    ('bytes_in', 'stage_bytes_in_total', 'counter', 'Bytes read by each stage of the run.'),
+    ('bytes_out', 'stage_bytes_out_total', 'counter', 'Bytes (characters of text for the handlers) produced by each stage of the run.'),
+    ('rss_delta', 'stage_rss_delta_bytes', 'gauge', 'Sum of the changes of resident memory across the calls of each stage.'),
+]
+
+# 172. format_prometheus_metrics: Formats a metrics summary as a Prometheus textfile
+def format_prometheus_metrics(summary):
+    """Formats a Metrics summary in the Prometheus text exposition format."""
+    lines = []
+    for field, metric, metric_type, description in PROMETHEUS_METRICS:
+        lines.append(f'# HELP galora_{metric} {description}')
+        lines.append(f'# TYPE galora_{metric} {metric_type}')
+        for stage, values in sorted(summary['stages'].items()):
+            label = stage.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'galora_{metric}{{stage="{label}"}} {values[field]}')
+    lines.append('# HELP galora_run_duration_seconds Duration of the run.')
+    lines.append('# TYPE galora_run_duration_seconds gauge')
+    lines.append(f"galora_run_duration_seconds {summary['duration']}")
+    lines.append('# HELP galora_run_peak_rss_bytes Peak resident memory of the run.')
+    lines.append('# TYPE galora_run_peak_rss_bytes gauge')
+    lines.append(f"galora_run_peak_rss_bytes {summary['peak_rss']}")
+    lines.append('# HELP galora_run_start_time_seconds Start of the run, as a Unix timestamp.')
+    lines.append('# TYPE galora_run_start_time_seconds gauge')
+    lines.append(f"galora_run_start_time_seconds {summary['started']}")
+    return '\n'.join(lines) + '\n'
+
+# 173. run_with_metrics: Runs a task in a worker process and returns its metrics with the result
+def run_with_metrics(func, *args):
+    """Runs func(*args) and returns (result, metrics recorded by the call), for the parent process to merge."""
+    run_metrics.reset()
+    result = func(*args)
+    return result, run_metrics.snapshot()
+
+# 174. merge_worker_metrics: Merges the metrics returned by run_with_metrics
+def merge_worker_metrics(output):
+    """Adds the metrics of a run_with_metrics output to the run and returns the result of the task."""
+    result, stages = output
+    run_metrics.merge(stages)
+    return result
+
+# 175. get_data_size: Returns the size of the input of handle_file
+def get_data_size(file_path, data=None):
+    """Returns the size in bytes of a file or of its content given as bytes, 0 if it cannot be known."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data)
+    if data is None:
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+    return 0
+
+# 176. get_content_size: Returns the size of the text returned by a handler
+def get_content_size(content):
+    """Returns the number of characters of the text (or of the member texts) returned by a handler."""
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, list):
+        return sum(len(record.get('text') or '') for record in content)
+    return 0
+
+# 177. run_transcription_batch: Sends a batch of chunks to a transcription backend, recording its metrics
+def run_transcription_batch(backend, chunks, language):
+    """Transcribes a batch of AudioData chunks like backend.transcribe_batch, recording the request in the metrics.
+
+    With the transcript cache, only the chunks actually sent to the engine are recorded.
+    """
+    if isinstance(backend, CachedTranscriptionBackend):
+        return backend.transcribe_batch(chunks, language)
+    with run_metrics.measure(f'transcription_{backend.name}',
+                             bytes_in=sum(len(audio.frame_data) for audio in chunks)) as stage:
+        results = backend.transcribe_batch(chunks, language)
+        stage.failed = any(error is not None for _, error in results)
+        stage.bytes_out = sum(len(text) for text, _ in results if text)
+    return results
+
+# 178. LogSampler: Rate limits the progress messages of log_message
+class LogSampler:
+    """Lets through at most one message of each progress key (SAMPLED_LOG_KEYS) every interval seconds."""
+
+    def __init__(self, interval=DEFAULT_LOG_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = {}
+        self.suppressed = {}
+
+    def allow(self, key):
+        """Returns None if the message must be dropped, otherwise the messages of key dropped since the last one."""
+        if self.interval <= 0 or key not in SAMPLED_LOG_KEYS:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            if key in self.last and now - self.last[key] < self.interval:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return None
+            self.last[key] = now
+            return self.suppressed.pop(key, 0)
+
+log_sampler = LogSampler()
+
+# 179. JsonLogFormatter: Formats log records as JSON lines
+class JsonLogFormatter(logging.Formatter):
+    """Writes each record as one JSON object, with the translation key and arguments of log_message."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        if getattr(record, 'key', None) is not None:
+            entry['key'] = record.key
+            entry['args'] = record.params
+        if getattr(record, 'suppressed', None):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+# 180. use_direct_logging: Writes the log records to the handlers without the queue
+def use_direct_logging():
+    """Replaces the queue handler with the handlers of configure_logger, for forked workers and the end of the run."""
+    if log_settings.pop('listener', None) is None:
+        return
+    for handler in list(logging.root.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logging.root.removeHandler(handler)
+    for handler in log_settings['handlers']:
+        logging.root.addHandler(handler)
+
+# 181. stop_logging: Writes the queued log records and stops the listener thread
+def stop_logging():
+    """Stops the listener of the log queue once it has written every record; later records are written directly."""
+    listener = log_settings.get('listener')
+    if listener is None:
+        return
+    # New records go to the handlers while the listener writes those already queued
+    use_direct_logging()
+    listener.stop()
+
+# 182. get_log_handlers: Returns the log file and console handlers of configure_logger
+def get_log_handlers(log_file, log_format='json', console=True):
+    """Returns the handler of the log file (JSON lines or text) and, if console, the one of the console echo."""
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setFormatter(JsonLogFormatter() if log_format == 'json'
+                              else logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter('Log message: %(message)s'))
+        handlers.append(console_handler)
+    return handlers
+
+# 183. get_worker_settings: Returns the settings of the run that worker processes must share
+def get_worker_settings():
+    """Returns a picklable copy of the translations and of the transcription, transfer and logging settings."""
+    return {
+        'lang': dict(lang),
+        'transcription': dict(transcription_settings),
+        # The job journal belongs to the parent process
+        'transfer': {key: value for key, value in transfer_settings.items() if key != 'journal'},
+        'log': log_settings.get('options'),
+    }
+
+# 184. init_worker: Applies the settings of the parent process in a worker process
+def init_worker(settings):
+    """Applies get_worker_settings() of the parent in a worker process.
+
+    Spawned workers (Windows, macOS) start with empty settings; forked ones already have them
+    and keep the log handlers inherited from the parent.
+    """
+    lang.update(settings['lang'])
+    transcription_settings.update(settings['transcription'])
+    transfer_settings.update(settings['transfer'])
+    options = settings['log']
+    if options and 'handlers' not in log_settings:
+        # Workers write to the log file directly: the listener thread lives in the parent
+        handlers = get_log_handlers(options['log_file'], options['log_format'], options['console'])
+        logging.basicConfig(handlers=handlers, level=LOG_LEVELS.get(options['log_level'], logging.DEBUG))
+        log_settings.update(handlers=handlers, options=options)
+        log_sampler.interval = options['sample_interval']
+
+# 185. new_process_pool: Creates a process pool whose workers share the settings of the run
+def new_process_pool(workers):
+    """Returns a ProcessPoolExecutor of workers processes initialized with init_worker."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(get_worker_settings(),))
+
+# 186. extraction_failed: Tells whether handle_file failed on a file
+def extraction_failed(content, original_path):
+    """Returns True if (content, original_path) is the result of a failed handle_file: the content is then an error."""
+    return original_path is None and not isinstance(content, list)
+
+# 187. main: Main function to parse arguments and initiate processing
+def main():
+    print("Starting main function...")  # Stampa di debug
+    parser = argparse.ArgumentParser(description="CLI Tool")
+    parser.add_argument("--language", type=str, default="eng", help="Language code for localization")  # Funzione 4: load_translations
+    parser.add_argument("--operation", type=str, help="Operation to perform")  # Funzioni varie, specificate sotto
+    parser.add_argument("--file_path", type=str, help="Path to the file")  # Funzioni 6-15, 25-28
+    parser.add_argument("--directory_path", type=str, help="Path to the directory")  # Funzioni 21, 22, 40, 51-53, 58
+    parser.add_argument("--bucket_name", type=str, help="Bucket name for cloud storage")  # Funzioni 36-39, 45-48, 52
+    parser.add_argument("--folder_id", type=str, help="Folder ID for Google Drive")  # Funzioni 30-35
+    parser.add_argument("--file_id", type=str, help="File ID for Google Drive")  # Funzione 34
+    parser.add_argument("--blob_name", type=str, help="Blob name for Azure Blob storage")  # Funzioni 42, 44
+    parser.add_argument("--file_key", type=str, help="File key for S3/Aruba")  # Funzioni 37, 46
+    parser.add_argument("--download_path", type=str, help="Path to download the file")  # Funzioni 34, 37, 42, 46
+    parser.add_argument("--output_dir", type=str, help="Output directory")  # Funzioni 18, 21, 23, 58
+    parser.add_argument("--keywords", nargs='*', help="Keywords for processing text files")  # Funzione 23
+    parser.add_argument("--limit_search", type=str, default="noLimit", help="Limit file search criteria")  # Funzione 22
+    parser.add_argument("--download_audio_only", action='store_true', help="Download audio only from video")  # Funzione 25
+    parser.add_argument("--gui", action='store_true', help="Launch GUI interface")  # Funzione 59
+    parser.add_argument("--play_video", action='store_true', help="Play video with SRT")  # Funzioni 49, 50
+    parser.add_argument("--video_path", type=str, help="Path to the video file")  # Funzioni 15, 27, 49, 50
+    parser.add_argument("--srt_path", type=str, help="Path to the SRT file")  # Funzione 49
+    parser.add_argument("--file_name", type=str, help="Name of the file to read")  # Funzioni 53-56
+    parser.add_argument("--folder_name", type=str, help="Name of the folder to create")  # Funzioni 31, 38, 43, 47
+    parser.add_argument("--source", type=str, help="Source storage URL for copy, sync, pipeline and handle_remote_prefix (local path, s3://, aruba://, azure:// or gdrive://)")  # Funzioni 138-142
+    parser.add_argument("--destination", type=str, help="Destination storage URL for copy, sync and pipeline")  # Funzioni 138-142, 149
+    parser.add_argument("--delete", action="store_true", help="Delete the destination objects missing from the source during sync")  # Funzione 149
+    parser.add_argument("--max_in_flight", type=int, default=DEFAULT_MAX_IN_FLIGHT // 1024 ** 2, help="Maximum MB of remote documents held in memory at once by handle_remote_prefix")  # Funzioni 151, 156
+    parser.add_argument("--upload_workers", type=int, default=DEFAULT_PIPELINE_UPLOAD_WORKERS, help="Number of dataset shards uploaded at the same time by pipeline")  # Funzione 161
+    parser.add_argument("--pipeline_queue_size", type=int, default=DEFAULT_PIPELINE_QUEUE_SIZE, help="Maximum number of documents waiting between two stages of pipeline")  # Funzione 161
+    parser.add_argument("--sync_manifest", type=str, help="Path of the SQLite checksum manifest used by sync")  # Funzione 143
+    parser.add_argument("--upload_directory_to_azure", action="store_true", help="Upload directory to Azure Blob Storage")  # Funzione 58
+    parser.add_argument("--download_directory_from_azure", action="store_true", help="Download directory from Azure Blob Storage")  # Funzione 51
+    parser.add_argument("--container_name", type=str, help="Container name for Azure Blob storage")  # Funzioni 41, 43, 44, 51, 58
+    parser.add_argument("--azure_directory", type=str, help="Directory path in Azure Blob storage")  # Funzione 51
+    parser.add_argument("--url", type=str, help="URL of the video to download")  # Funzioni 25, 26
+    parser.add_argument("--prefix", type=str, default="", help="Key prefix of the objects in the bucket or container for directory transfers")  # Funzioni 40, 51, 52, 58, 115-117
+    parser.add_argument("--transfer_workers", type=int, default=DEFAULT_TRANSFER_WORKERS, help="Number of objects transferred at the same time")  # Funzione 114
+    parser.add_argument("--multipart_chunk_size", type=int, default=DEFAULT_MULTIPART_CHUNK_SIZE // 1024 ** 2, help="Multipart chunk (block) size in MB for S3/Aruba/Azure transfers and Google Drive downloads")  # Funzione 111
+    parser.add_argument("--multipart_concurrency", type=int, default=DEFAULT_MULTIPART_CONCURRENCY, help="Number of chunks of one object transferred at the same time")  # Funzione 111
+    parser.add_argument("--transcription_lang", type=str, default=DEFAULT_TRANSCRIPTION_LANGUAGE, help="Language for transcription")  # Funzioni 14, 17, 28
+    parser.add_argument("--min_silence_len", type=int, default=500, help="Minimum silence length in ms used to split audio for generate_srt")  # Funzione 90
+    parser.add_argument("--silence_offset", type=float, default=14, help="Silence threshold for generate_srt, in dB below the average loudness")  # Funzione 90
+    parser.add_argument("--keep_silence", type=int, default=500, help="Silence in ms kept around each chunk for generate_srt")  # Funzione 91
+    parser.add_argument("--transcription_workers", type=int, default=1, help="Number of concurrent transcription requests for generate_srt")  # Funzione 88
+    parser.add_argument("--transcription_backend", type=str, default=DEFAULT_TRANSCRIPTION_BACKEND, choices=sorted(TRANSCRIPTION_BACKENDS), help="Speech recognition engine (fake = offline stand-in for tests and benchmarks)")  # Funzioni 101-107
+    parser.add_argument("--transcription_batch_size", type=int, default=1, help="Number of audio chunks sent to the transcription backend in one request")  # Funzioni 87, 88
+    parser.add_argument("--transcript_cache", type=str, help="Path of the SQLite cache of chunk transcripts")  # Funzioni 100-103
+    parser.add_argument("--transcript_cache_max_size", type=int, default=DEFAULT_TRANSCRIPT_CACHE_MAX_SIZE // 1024 ** 2, help="Maximum size of the transcript cache in MB")  # Funzione 100
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes for file extraction (1 = sequential)")  # Funzioni 21, 63
+    parser.add_argument("--cache_dir", "--cache-dir", dest="cache_dir", type=str, help="Directory of the persistent extraction cache")  # Funzioni 64-66
+    parser.add_argument("--cache_max_size", type=int, default=DEFAULT_CACHE_MAX_SIZE // 1024 ** 2, help="Maximum size of the extraction cache in MB")  # Funzione 64
+    parser.add_argument("--manifest", type=str, help="Path of the SQLite manifest used for incremental directory runs")  # Funzione 67
+    parser.add_argument("--output_format", type=str, default="txt", choices=["txt", "jsonl"], help="Output format of handle_directory and of the upload_json_to_* operations")  # Funzioni 18, 32, 39, 44, 48, 70
+    parser.add_argument("--shard_size", type=int, default=DEFAULT_SHARD_SIZE // 1024 ** 2, help="Maximum size of a JSONL shard in MB")  # Funzione 70
+    parser.add_argument("--stream", action="store_true", help="Stream documents through keyword segmentation in chunks")  # Funzioni 77-82
+    parser.add_argument("--metrics_file", type=str, help="File where the metrics of the run are written at the end (JSON, or a Prometheus textfile for .prom)")  # Funzioni 168-172
+    parser.add_argument("--metrics_format", type=str, choices=["json", "prometheus"], help="Format of --metrics_file (default: from its extension)")  # Funzioni 168, 172
+    parser.add_argument("--resume", type=str, metavar="JOB_ID", help="Resume an interrupted batch job, skipping its completed work")  # Funzioni 163-167
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_STREAM_CHUNK_SIZE // 1024, help="Chunk size in KB for --stream")  # Funzioni 77-80
+    parser.add_argument("--log_level", type=str, default="debug", choices=list(LOG_LEVELS), help="Lowest level of the logged messages")  # Funzioni 1, 2
+    parser.add_argument("--log_format", type=str, default="json", choices=["json", "text"], help="Format of the log file: JSON lines or text")  # Funzioni 1, 179
+    parser.add_argument("--log_sample_interval", type=float, default=DEFAULT_LOG_SAMPLE_INTERVAL, help="Minimum seconds between two per-file or per-chunk progress messages of the same kind (0 logs them all)")  # Funzione 178
+    parser.add_argument("--no_console", action="store_true", help="Do not echo the log messages on the console")  # Funzione 1
+
+    args = parser.parse_args()
+
+    # Logging is set up before any work, so that every message goes through the log queue
+    configure_logger("cli_tool", args.log_level, args.log_format, not args.no_console, args.log_sample_interval)  # Funzione 1
+    print("Logger configured in main.")  # Stampa di debug
+    
+    global translations
+    translations = load_translations(args.language)  # Funzione 4
+    lang.update(translations)
+    print("Translations loaded.")  # Stampa di debug
+
+    global config
+    config = load_config("cli_tool")  # Funzione 3
+    print("Config loaded.")  # Stampa di debug
+
+    # Set the GOOGLE_APPLICATION_CREDENTIALS environment variable
+    if config and 'google_application_credentials' in config:  # Funzioni 32-35
+        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config['google_application_credentials']
+        log_message('Google application credentials set: {}', 'info', config['google_application_credentials'])  # Funzione 2
+        print("Google application credentials set.")  # Stampa di debug
+
+    # Batch jobs journal their completed work, so that an interrupted run can be resumed
+    journal = None
+    # The units that failed are not journaled: the journal is kept, so that --resume retries them
+    job_completed = True
+    failed = 0
+    if args.resume or args.operation in JOURNALED_OPERATIONS or args.upload_directory_to_azure or args.download_directory_from_azure:
+        journal, args = start_job(args)  # Funzione 167
+        if journal is None and args.resume:
+            return
+        atexit.register(journal.close)  # Funzione 163
+
+    # Cloud transfer options
+    transfer_settings['workers'] = args.transfer_workers  # Funzione 114
+    transfer_settings['multipart_chunk_size'] = args.multipart_chunk_size * 1024 ** 2  # Funzione 111
+    transfer_settings['multipart_concurrency'] = args.multipart_concurrency  # Funzione 111
+    transfer_settings['journal'] = journal  # Funzioni 119, 163-166
+
+    # Transcription options used by generate_srt and by the audio and video handlers
+    transcription_settings['language'] = args.transcription_lang  # Funzione 108
+    transcription_settings['backend'] = args.transcription_backend  # Funzione 107
+    transcription_settings['batch_size'] = args.transcription_batch_size  # Funzione 88
+    transcription_settings['cache_path'] = args.transcript_cache  # Funzione 103
+    transcription_settings['cache_max_size'] = args.transcript_cache_max_size * 1024 ** 2
+    # Launch GUI if --gui argument is passed
+    if args.gui:
+        launch_gui()  # Funzione 59
+        return
+
+    if args.operation == "process_video":  # Funzione 61
+        process_video(
+            url=args.url,
+            file_path=args.file_path,
+            download_audio_only=args.download_audio_only,
+            transcription_lang=args.transcription_lang
+        )
+    else:
+        print(f"Unknown operation: {args.operation}")
+        logging.error(f"Unknown operation: {args.operation}")
+
+    # Handle the play video operation
+    if args.play_video:  # Funzioni 49, 50
+        if args.video_path and args.srt_path:
+            play_video_from_command_line(args.video_path, args.srt_path)  # Funzione 50
+        else:
+            log_message('Video or SRT path missing', 'error')  # Funzione 2
+        return
+
+    # Check that --operation is provided if --play_video is not specified
+    if not args.operation and not args.upload_directory_to_azure and not args.download_directory_from_azure:
+        parser.error('--operation is required unless --play_video is specified or --upload_directory_to_azure or --download_directory_from_azure is used')
+
+    print(f"Operation: {args.operation}")  # Stampa di debug
+    print(f"Upload to Azure: {args.upload_directory_to_azure}")  # Stampa di debug
+    print(f"Download from Azure: {args.download_directory_from_azure}")  # Stampa di debug
+
+    if args.upload_directory_to_azure:  # Funzione 58
+        if config.get('use_azure', False):
+            print(f"Uploading directory {args.directory_path} to Azure container {args.container_name}")  # Stampa di debug
+            _, failed = upload_directory_to_azure(args.directory_path, args.container_name, get_azure_service_client(config), args.prefix)  # Funzioni 58, 118-121
+        else:
+            log_message('Azure integration is disabled', 'error')  # Funzione 2
+    elif args.download_directory_from_azure:  # Funzione 51
+        if config.get('use_azure', False):
+            print(f"Downloading directory {args.azure_directory} from Azure container {args.container_name} to {args.download_path}")  # Stampa di debug
+            _, failed = download_directory_from_azure(args.container_name, get_azure_service_client(config), args.download_path, args.azure_directory or args.prefix)  # Funzioni 51, 118-122
+        else:
+            log_message('Azure integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "upload_gdrive":  # Funzione 30
+        if config.get('use_gdrive', False):
+            upload_to_gdrive(args.file_path, args.folder_id, get_gdrive_service(config))  # Funzioni 30, 73
+        else:
+            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "download_gdrive":  # Funzione 34
+        if config.get('use_gdrive', False):
+            download_from_gdrive(args.file_id, get_gdrive_service(config), args.download_path)  # Funzioni 34, 128
+        else:
+            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "download_all_gdrive":  # Funzione 35
+        if config.get('use_gdrive', False):
+            _, failed = download_all_files_from_gdrive(args.folder_id, get_gdrive_service(config), args.output_dir)  # Funzioni 35, 123-129
+        else:
+            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "create_gdrive_folder":  # Funzione 31
+        if config.get('use_gdrive', False):
+            folder_id = create_folder_on_gdrive(args.folder_name, args.folder_id, get_gdrive_service(config))  # Funzioni 31, 73
+            if folder_id:
+                print(f"{folder_id}")
+            else:
+                log_message('Failed to create folder on Google Drive', 'error')  # Funzione 2
+        else:
+            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "upload_json_to_gdrive":  # Funzione 32
+        if config.get('use_gdrive', False):
+            with open(args.file_path, 'r', encoding='utf-8') as json_file:
+                json_data = json.load(json_file)
+            upload_json_to_gdrive(json_data, args.file_name or os.path.basename(args.file_path), args.folder_id, get_gdrive_service(config), args.output_format == 'jsonl')  # Funzioni 32, 73, 150
+        else:
+            log_message('Google Drive integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "upload_s3":  # Funzione 36
+        if config.get('use_s3', False):
+            upload_to_s3(args.file_path, args.bucket_name, get_s3_client(config))  # Funzioni 36, 110
+        else:
+            log_message('S3 integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "download_s3":  # Funzione 37
+        if config.get('use_s3', False):
+            download_from_s3(args.file_key, args.bucket_name, args.download_path, get_s3_client(config))  # Funzioni 37, 110
+        else:
+            log_message('S3 integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "create_s3_folder":  # Funzione 38
+        if config.get('use_s3', False):
+            create_folder_on_s3(args.folder_name, args.bucket_name, get_s3_client(config))  # Funzioni 38, 110
+        else:
+            log_message('S3 integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "upload_json_to_s3":  # Funzione 39
+        if config.get('use_s3', False):
+            with open(args.file_path, 'r', encoding='utf-8') as json_file:
+                json_data = json.load(json_file)
+            upload_json_to_s3(json_data, args.file_name or os.path.basename(args.file_path), args.bucket_name, get_s3_client(config), args.output_format == 'jsonl')  # Funzioni 39, 110, 150
+        else:
+            log_message('S3 integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "upload_azure":  # Funzione 41
         if config.get('use_azure', False):
-            create_folder_on_azure(args.container_name, args.folder_id)  # Funzione 43
+            upload_to_azure(args.file_path, args.container_name, get_azure_service_client(config))  # Funzioni 41, 118
+        else:
+            log_message('Azure integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "download_azure":  # Funzione 42
+        if config.get('use_azure', False):
+            download_from_azure(args.blob_name, args.container_name, args.download_path, get_azure_service_client(config))  # Funzioni 42, 118
+        else:
+            log_message('Azure integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "create_azure_folder":  # Funzione 43
+        if config.get('use_azure', False):
+            create_folder_on_azure(args.folder_name, args.container_name, get_azure_service_client(config))  # Funzioni 43, 118
         else:
             log_message('Azure integration is disabled', 'error')  # Funzione 2
     elif args.operation == "upload_json_to_azure":  # Funzione 44
         if config.get('use_azure', False):
-            upload_json_to_azure(args.directory_path, args.container_name, args.folder_id)  # Funzione 44
+            with open(args.file_path, 'r', encoding='utf-8') as json_file:
+                json_data = json.load(json_file)
+            upload_json_to_azure(json_data, args.file_name or os.path.basename(args.file_path), args.container_name, get_azure_service_client(config), args.output_format == 'jsonl')  # Funzioni 44, 118, 150
         else:
             log_message('Azure integration is disabled', 'error')  # Funzione 2
     elif args.operation == "upload_aruba":  # Funzione 45
         if config.get('use_aruba', False):
-            upload_to_aruba(args.file_path, args.bucket_name)  # Funzione 45
+            upload_to_aruba(args.file_path, args.bucket_name, get_s3_client(config, 'aruba'))  # Funzioni 45, 110
         else:
             log_message('Aruba integration is disabled', 'error')  # Funzione 2
     elif args.operation == "download_aruba":  # Funzione 46
         if config.get('use_aruba', False):
-            download_from_aruba(args.file_key, args.bucket_name, args.download_path)  # Funzione 46
+            download_from_aruba(args.file_key, args.bucket_name, args.download_path, get_s3_client(config, 'aruba'))  # Funzioni 46, 110
         else:
             log_message('Aruba integration is disabled', 'error')  # Funzione 2
     elif args.operation == "create_aruba_folder":  # Funzione 47
         if config.get('use_aruba', False):
-            create_folder_on_aruba(args.bucket_name, args.folder_id)  # Funzione 47
+            create_folder_on_aruba(args.folder_name, args.bucket_name, get_s3_client(config, 'aruba'))  # Funzioni 47, 110
         else:
             log_message('Aruba integration is disabled', 'error')  # Funzione 2
     elif args.operation == "upload_json_to_aruba":  # Funzione 48
         if config.get('use_aruba', False):
-            upload_json_to_aruba(args.directory_path, args.bucket_name, args.folder_id)  # Funzione 48
+            with open(args.file_path, 'r', encoding='utf-8') as json_file:
+                json_data = json.load(json_file)
+            upload_json_to_aruba(json_data, args.file_name or os.path.basename(args.file_path), args.bucket_name, get_s3_client(config, 'aruba'), args.output_format == 'jsonl')  # Funzioni 48, 110, 150
         else:
             log_message('Aruba integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "copy":  # Funzione 142
+        _, failed = copy_storage(args.source, args.destination, args.transfer_workers, config)  # Funzioni 130-142
+    elif args.operation == "handle_remote_prefix":  # Funzione 156
+        handle_remote_prefix(args.source, args.output_dir, args.workers, args.transfer_workers, args.output_format,
+                             args.shard_size * 1024 ** 2, args.max_in_flight * 1024 ** 2, config)  # Funzioni 151-156
+    elif args.operation == "pipeline":  # Funzione 162
+        run_pipeline(args.source, args.destination, args.transfer_workers, args.workers, args.upload_workers,
+                     args.pipeline_queue_size, args.shard_size * 1024 ** 2, config)  # Funzioni 161, 162
+    elif args.operation == "sync":  # Funzione 149
+        _, failed, _ = sync_storage(args.source, args.destination, args.delete, args.sync_manifest, args.transfer_workers, config)  # Funzioni 130-149
     elif args.operation == "download_youtube":  # Funzione 25
         download_youtube_video(args.file_path, args.download_audio_only)  # Funzione 25
     elif args.operation == "download_vimeo":  # Funzione 26
         download_vimeo_video(args.file_path)  # Funzione 26
     elif args.operation == "generate_srt":  # Funzione 28
-        generate_srt(args.file_path, args.output_dir)  # Funzione 28
+        job_completed = generate_srt(args.file_path, args.output_dir, args.transcription_lang, workers=args.transcription_workers,
+                                     min_silence_len=args.min_silence_len, silence_offset=args.silence_offset,
+                                     keep_silence=args.keep_silence, journal=journal)  # Funzioni 28, 163
     elif args.operation == "handle_directory":  # Funzione 21
-        handle_directory(args.directory_path, args.output_dir)  # Funzione 21
+        job_completed = handle_directory(args.directory_path, args.output_dir, args.workers, args.cache_dir,
+                                         args.cache_max_size * 1024 ** 2, args.manifest,
+                                         args.output_format, args.shard_size * 1024 ** 2, journal)  # Funzioni 21, 163
     elif args.operation == "download_s3_directory":  # Funzione 40
         if config.get('use_s3', False):
-            download_directory_from_s3(args.bucket_name, args.directory_path, args.download_path)  # Funzione 40
+            _, failed = download_directory_from_s3(args.bucket_name, get_s3_client(config), args.download_path, args.prefix)  # Funzioni 40, 110-114
+        else:
+            log_message('S3 integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "upload_s3_directory":  # Funzione 116
+        if config.get('use_s3', False):
+            _, failed = upload_directory_to_s3(args.directory_path, args.bucket_name, get_s3_client(config), args.prefix)  # Funzioni 110-116
         else:
             log_message('S3 integration is disabled', 'error')  # Funzione 2
     elif args.operation == "download_azure_directory":  # Funzione 51
         if config.get('use_azure', False):
-            download_directory_from_azure(args.container_name, args.directory_path, args.download_path)  # Funzione 51
+            _, failed = download_directory_from_azure(args.container_name, get_azure_service_client(config), args.download_path, args.prefix)  # Funzioni 51, 118-122
         else:
             log_message('Azure integration is disabled', 'error')  # Funzione 2
     elif args.operation == "download_aruba_directory":  # Funzione 52
         if config.get('use_aruba', False):
-            download_directory_from_aruba(args.bucket_name, args.directory_path, args.download_path)  # Funzione 52
+            _, failed = download_directory_from_aruba(args.bucket_name, get_s3_client(config, 'aruba'), args.download_path, args.prefix)  # Funzioni 52, 110-114
+        else:
+            log_message('Aruba integration is disabled', 'error')  # Funzione 2
+    elif args.operation == "upload_aruba_directory":  # Funzione 117
+        if config.get('use_aruba', False):
+            _, failed = upload_directory_to_aruba(args.directory_path, args.bucket_name, get_s3_client(config, 'aruba'), args.prefix)  # Funzioni 110-117
         else:
             log_message('Aruba integration is disabled', 'error')  # Funzione 2
     elif args.operation == "read_gdrive_file":  # Funzione 53
         if config.get('use_gdrive', False):
-            file_content = read_file_from_gdrive(credentials, args.folder_id, args.file_name)  # Funzione 53
+            file_content = read_file_from_gdrive(args.file_id, get_gdrive_service(config))  # Funzioni 53, 73
             if file_content:
                 with open(args.download_path, 'wb') as f:
                     f.write(file_content)
@@ -1047,7 +4393,7 @@ def main():
             log_message('Google Drive integration is disabled', 'error')  # Funzione 2
     elif args.operation == "read_s3_file":  # Funzione 54
         if config.get('use_s3', False):
-            file_content = read_file_from_s3(args.bucket_name, args.directory_path, args.file_name)  # Funzione 54
+            file_content = read_file_from_s3(args.file_key, args.bucket_name, get_s3_client(config))  # Funzioni 54, 110
             if file_content:
                 with open(args.download_path, 'wb') as f:
                     f.write(file_content)
@@ -1055,7 +4401,7 @@ def main():
             log_message('S3 integration is disabled', 'error')  # Funzione 2
     elif args.operation == "read_azure_file":  # Funzione 55
         if config.get('use_azure', False):
-            file_content = read_file_from_azure(args.container_name, args.directory_path, args.file_name)  # Funzione 55
+            file_content = read_file_from_azure(args.blob_name, args.container_name, get_azure_service_client(config))  # Funzioni 55, 118
             if file_content:
                 with open(args.download_path, 'wb') as f:
                     f.write(file_content)
@@ -1063,7 +4409,7 @@ def main():
             log_message('Azure integration is disabled', 'error')  # Funzione 2
     elif args.operation == "read_aruba_file":  # Funzione 56
         if config.get('use_aruba', False):
-            file_content = read_file_from_aruba(args.bucket_name, args.directory_path, args.file_name)  # Funzione 56
+            file_content = read_file_from_aruba(args.file_key, args.bucket_name, get_s3_client(config, 'aruba'))  # Funzioni 56, 110
             if file_content:
                 with open(args.download_path, 'wb') as f:
                     f.write(file_content)
@@ -1072,30 +4418,34 @@ def main():
     elif args.upload_directory_to_azure:  # Funzione 58
         if config.get('use_azure', False):
             print(f"Uploading directory {args.directory_path} to Azure container {args.container_name}")  # Stampa di debug
-            upload_directory_to_azure(args.directory_path, args.container_name)  # Funzione 58
+            _, failed = upload_directory_to_azure(args.directory_path, args.container_name, get_azure_service_client(config), args.prefix)  # Funzioni 58, 118-121
         else:
             log_message('Azure integration is disabled', 'error')  # Funzione 2
     elif args.download_directory_from_azure:  # Funzione 51
         if config.get('use_azure', False):
             print(f"Downloading directory {args.azure_directory} from Azure container {args.container_name} to {args.download_path}")  # Stampa di debug
-            download_directory_from_azure(args.container_name, args.azure_directory, args.download_path)  # Funzione 51
+            _, failed = download_directory_from_azure(args.container_name, get_azure_service_client(config), args.download_path, args.azure_directory or args.prefix)  # Funzioni 51, 118-122
         else:
             log_message('Azure integration is disabled', 'error')  # Funzione 2
     elif args.operation == "process_keywords":  # Funzioni 21, 23
         if args.directory_path and args.output_dir and args.keywords:
-            for root, _, files in os.walk(args.directory_path):
-                for file_name in files:
-                    file_path = os.path.join(root, file_name)
-                    content, _ = handle_file(file_path)  # Funzione 20
-                    if content and not content.startswith("Unsupported"):
-                        json_data = process_text_with_keywords(content, args.keywords)  # Funzione 23
-                        output_file = os.path.join(args.output_dir, f'{os.path.splitext(file_name)[0]}.json')
-                        write_json(json_data, output_file)  # Funzione 24
+            process_keywords(args.directory_path, args.output_dir, args.keywords, args.workers,
+                             args.cache_dir, args.cache_max_size * 1024 ** 2, args.manifest,
+                             args.stream, args.chunk_size * 1024)  # Funzione 68
         else:
             parser.error('--directory_path, --output_dir, and --keywords are required for process_keywords operation')
     else:
         log_message('Unknown operation: {}', 'error', args.operation)  # Funzione 2
 
+    if journal:
+        journal.close(completed=job_completed and not failed)  # Funzione 163
+
+    # Time, bytes and memory of each stage of the run
+    run_metrics.report()  # Funzione 168
+    if args.metrics_file:
+        run_metrics.write(args.metrics_file, args.metrics_format)  # Funzioni 168, 172
+
+    stop_logging()  # Funzione 181
     logging.shutdown()  # Assicurarsi che i log vengano scritti nel file
     print("Logging shutdown.")  # Stampa di debug
 